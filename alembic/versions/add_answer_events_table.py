@@ -0,0 +1,39 @@
+"""add answer_events table
+
+Revision ID: add_answer_events_table
+Revises: add_answers_history_index
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_answer_events_table'
+down_revision: Union[str, None] = 'add_answers_history_index'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Append-only answer change log (no FKs: events must outlive deleted answers/questions/groups)
+    op.create_table('answer_events',
+        sa.Column('id', sa.BigInteger(), primary_key=True),
+        sa.Column('answer_id', sa.Integer(), nullable=True),
+        sa.Column('question_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('group_id', sa.Integer(), nullable=False),
+        sa.Column('event_type', sa.String(16), nullable=False),
+        sa.Column('old_value', sa.Integer(), nullable=True),
+        sa.Column('new_value', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index('ix_answer_events_group_id', 'answer_events', ['group_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_answer_events_group_id', table_name='answer_events')
+    op.drop_table('answer_events')
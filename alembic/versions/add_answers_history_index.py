@@ -0,0 +1,27 @@
+"""add answers (user_id, created_at, id) index for answered history paging
+
+Revision ID: add_answers_history_index
+Revises: add_member_city_id
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_answers_history_index'
+down_revision: Union[str, None] = 'add_member_city_id'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keyset pagination of answered questions orders by (created_at, id) per user
+    op.create_index('ix_answers_user_created', 'answers', ['user_id', 'created_at', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_answers_user_created', table_name='answers')
@@ -0,0 +1,47 @@
+"""add gazetteer city_id to group_members
+
+Revision ID: add_member_city_id
+Revises: add_member_geohash
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_member_city_id'
+down_revision: Union[str, None] = 'add_member_geohash'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Canonical city id from the bundled gazetteer (src/data)
+    op.add_column('group_members', sa.Column('city_id', sa.Integer(), nullable=True))
+
+    # Resolve existing free-text cities; text-only members also get a geohash of the city centre
+    from src.utils.gazetteer import resolve_location
+    from src.utils.geo import geohash_for_member
+    conn = op.get_bind()
+    rows = conn.execute(sa.text(
+        "SELECT id, city, country, geolocation_lat FROM group_members WHERE city IS NOT NULL"
+    )).fetchall()
+    for member_id, city, country, lat in rows:
+        resolved = resolve_location(f"{city}, {country}" if country else city)
+        if not resolved:
+            continue
+        params = {"id": member_id, "city_id": resolved.id}
+        if lat is None:
+            conn.execute(
+                sa.text("UPDATE group_members SET city_id = :city_id, geohash = :geohash WHERE id = :id"),
+                dict(params, geohash=geohash_for_member(resolved.lat, resolved.lon))
+            )
+        else:
+            conn.execute(sa.text("UPDATE group_members SET city_id = :city_id WHERE id = :id"), params)
+
+
+def downgrade() -> None:
+    op.drop_column('group_members', 'city_id')
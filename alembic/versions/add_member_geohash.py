@@ -0,0 +1,43 @@
+"""add geohash to group_members
+
+Revision ID: add_member_geohash
+Revises: abc123_migrate_old_questions
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_member_geohash'
+down_revision: Union[str, None] = 'abc123_migrate_old_questions'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Geohash bucket of member coordinates, used to prefilter match candidates by distance
+    op.add_column('group_members', sa.Column('geohash', sa.String(12), nullable=True))
+    op.create_index('ix_group_members_group_geohash', 'group_members', ['group_id', 'geohash'])
+
+    # Backfill members who already shared their location
+    from src.utils.geo import geohash_for_member
+    conn = op.get_bind()
+    rows = conn.execute(sa.text(
+        "SELECT id, geolocation_lat, geolocation_lon FROM group_members "
+        "WHERE geolocation_lat IS NOT NULL AND geolocation_lon IS NOT NULL"
+    )).fetchall()
+    if rows:
+        # One executemany for all members instead of a statement per member
+        conn.execute(
+            sa.text("UPDATE group_members SET geohash = :geohash WHERE id = :id"),
+            [{"geohash": geohash_for_member(lat, lon), "id": member_id} for member_id, lat, lon in rows]
+        )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_group_members_group_geohash', table_name='group_members')
+    op.drop_column('group_members', 'geohash')
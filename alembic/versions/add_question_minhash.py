@@ -0,0 +1,37 @@
+"""add minhash signature to questions
+
+Revision ID: add_question_minhash
+Revises: add_answer_events_table
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_question_minhash'
+down_revision: Union[str, None] = 'add_answer_events_table'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # MinHash signature for near-duplicate detection (64 x uint32)
+    op.add_column('questions', sa.Column('minhash', sa.LargeBinary(), nullable=True))
+
+    # Backfill live questions; anything missed is computed on the next index rebuild
+    from src.utils.near_duplicates import minhash_signature, signature_to_bytes
+    conn = op.get_bind()
+    rows = conn.execute(sa.text("SELECT id, text FROM questions WHERE is_deleted = 0")).fetchall()
+    for question_id, text in rows:
+        conn.execute(
+            sa.text("UPDATE questions SET minhash = :minhash WHERE id = :id"),
+            {"id": question_id, "minhash": signature_to_bytes(minhash_signature(text))}
+        )
+
+
+def downgrade() -> None:
+    op.drop_column('questions', 'minhash')
@@ -0,0 +1,29 @@
+"""add moderation flags to questions
+
+Revision ID: add_question_moderation_flags
+Revises: question_embedding_binary
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_question_moderation_flags'
+down_revision: Union[str, None] = 'question_embedding_binary'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # NULL = not scored yet by the batch moderation
+    op.add_column('questions', sa.Column('moderation_flags', sa.String(length=255), nullable=True))
+    # Questions already waiting for the admin go to the review queue instead of being auto-moderated
+    op.execute("UPDATE questions SET moderation_flags = 'review' WHERE status = 'pending' AND is_deleted = 0")
+
+
+def downgrade() -> None:
+    op.drop_column('questions', 'moderation_flags')
@@ -0,0 +1,27 @@
+"""store question embeddings as binary
+
+Revision ID: question_embedding_binary
+Revises: add_question_minhash
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'question_embedding_binary'
+down_revision: Union[str, None] = 'add_question_minhash'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Column was never populated; packed vectors are filled by `python -m src.utils.embeddings run`
+    op.alter_column('questions', 'embedding', type_=sa.LargeBinary(), existing_nullable=True, postgresql_using='NULL')
+
+
+def downgrade() -> None:
+    op.alter_column('questions', 'embedding', type_=sa.String(), existing_nullable=True, postgresql_using='NULL')
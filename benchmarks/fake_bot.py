@@ -0,0 +1,33 @@
+"""
+In-process stand-in for aiogram.Bot: records outgoing calls instead of hitting the Bot API.
+Only what the benchmarked delivery paths call is implemented.
+"""
+import itertools
+from collections import Counter
+from types import SimpleNamespace
+
+
+class FakeBot:
+    def __init__(self):
+        self.calls = Counter()
+        self._message_ids = itertools.count(1)
+
+    def _message(self, chat_id):
+        return SimpleNamespace(message_id=next(self._message_ids), chat=SimpleNamespace(id=chat_id))
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.calls["send_message"] += 1
+        return self._message(chat_id)
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        self.calls["send_photo"] += 1
+        return self._message(chat_id)
+
+    async def delete_message(self, chat_id, message_id, **kwargs):
+        self.calls["delete_message"] += 1
+        return True
+
+    def reset(self) -> int:
+        total = sum(self.calls.values())
+        self.calls.clear()
+        return total
@@ -0,0 +1,124 @@
+"""
+Stand-in Telegram Bot API server (aiohttp)
+Serves /bot<token>/<method> like api.telegram.org: send*/edit* return a message, the rest return true.
+Every call is recorded per chat, so a load generator can find the buttons the bot sent and press them.
+Latency, 429 flood waits and server errors can be injected to see how the bot behaves under them.
+
+    python -m benchmarks.fake_telegram --port 8081 --latency-ms 50 --rate-429 0.01
+    TELEGRAM_API_URL=http://127.0.0.1:8081 python -m src.bot
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Allkinds", "username": "allkinds_fake_bot"}
+MESSAGE_METHODS = {"sendmessage", "sendphoto", "editmessagetext", "editmessagecaption", "editmessagereplymarkup"}
+RECENT_MESSAGES = 50  # kept per chat
+
+
+@dataclass
+class Faults:
+    latency_ms: float = 0
+    jitter_ms: float = 0
+    rate_429: float = 0  # share of calls answered with a flood wait
+    retry_after: int = 1
+    error_rate: float = 0  # share of calls answered with a 500
+
+
+class FakeTelegram:
+    def __init__(self, faults: Optional[Faults] = None, seed: int = 0):
+        self.faults = faults or Faults()
+        self.rng = random.Random(seed)
+        self.calls = Counter()
+        self.injected = Counter()
+        self.chats: Dict[int, List[dict]] = defaultdict(list)
+        self._message_ids = defaultdict(lambda: itertools.count(1))
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        self.calls[method] += 1
+        faults = self.faults
+        if faults.latency_ms or faults.jitter_ms:
+            await asyncio.sleep(max(0.0, faults.latency_ms + self.rng.uniform(-faults.jitter_ms, faults.jitter_ms)) / 1000)
+        roll = self.rng.random()
+        if roll < faults.rate_429:
+            self.injected["429"] += 1
+            return web.json_response({
+                "ok": False, "error_code": 429, "description": f"Too Many Requests: retry after {faults.retry_after}",
+                "parameters": {"retry_after": faults.retry_after},
+            })
+        if roll < faults.rate_429 + faults.error_rate:
+            self.injected["500"] += 1
+            return web.json_response({"ok": False, "error_code": 500, "description": "Internal Server Error"}, status=500)
+        return web.json_response({"ok": True, "result": self.result(method.lower(), params)})
+
+    def result(self, method: str, params: dict):
+        if method == "getme":
+            return BOT_USER
+        if method not in MESSAGE_METHODS or "chat_id" not in params:
+            return True
+        chat_id = int(params["chat_id"])
+        markup = params.get("reply_markup")
+        if isinstance(markup, str):
+            markup = json.loads(markup)
+        if method.startswith("send"):
+            message_id = next(self._message_ids[chat_id])
+        else:
+            message_id = int(params.get("message_id", 0))
+        message = {
+            "message_id": message_id, "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"}, "from": BOT_USER,
+            "text": params.get("text") or params.get("caption") or "",
+        }
+        history = self.chats[chat_id]
+        history.append({"message": message, "markup": markup or {}})
+        del history[:-RECENT_MESSAGES]
+        return message
+
+    def find_button(self, chat_id: int, prefix: str, skip=()) -> Optional[tuple]:
+        """(message, callback_data) of the most recent inline button starting with prefix."""
+        for entry in reversed(self.chats.get(chat_id, [])):
+            for row in entry["markup"].get("inline_keyboard", []):
+                for button in row:
+                    data = button.get("callback_data") or ""
+                    if data.startswith(prefix) and data not in skip:
+                        return entry["message"], data
+        return None
+
+    def stats(self) -> dict:
+        return {"calls": dict(self.calls), "injected": dict(self.injected)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--rate-429", type=float, default=0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--error-rate", type=float, default=0)
+    args = parser.parse_args()
+    server = FakeTelegram(Faults(args.latency_ms, args.jitter_ms, args.rate_429, args.retry_after, args.error_rate))
+    web.run_app(server.app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
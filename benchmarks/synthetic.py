@@ -0,0 +1,133 @@
+"""
+Seeded synthetic data for benchmarks
+Groups with members spread over a few gazetteer cities (GPS for most, city-only for some), a gender /
+looking_for mix, approved/pending/rejected questions and answers at a configurable density with
+per-member correlated values, so similarities are spread like in real groups.
+The same seed and tier always produce the same rows.
+"""
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta, UTC
+from typing import Dict, List
+
+from sqlalchemy import insert, text, update
+
+from src.models import Answer, Group, GroupMember, Question, User
+from src.utils.gazetteer import CITIES
+from src.utils.geo import geohash_for_member
+
+
+@dataclass(frozen=True)
+class Tier:
+    name: str
+    groups: int
+    members_per_group: int
+    questions_per_group: int
+    answer_density: float  # share of approved questions answered by a member
+
+
+TIERS = {
+    "small": Tier("small", groups=2, members_per_group=100, questions_per_group=50, answer_density=0.6),
+    "medium": Tier("medium", groups=4, members_per_group=1000, questions_per_group=200, answer_density=0.5),
+    "large": Tier("large", groups=4, members_per_group=3000, questions_per_group=500, answer_density=0.4),
+}
+
+GENDERS = [("male", 0.48), ("female", 0.52)]
+LOOKING_FOR = [("male", 0.4), ("female", 0.45), ("all", 0.15)]
+QUESTION_STATUSES = [("approved", 0.9), ("pending", 0.07), ("rejected", 0.03)]
+GPS_SHARE = 0.8  # members with coordinates, the rest only picked a city
+CITY_COUNT = 5  # cities per group
+CITY_SPREAD_DEG = 0.15  # ~15 km jitter around the city centre
+
+
+def _choice(rng: random.Random, weighted):
+    values, weights = zip(*weighted)
+    return rng.choices(values, weights)[0]
+
+
+def generate(tier: Tier, seed: int = 42, id_base: int = 0, code_prefix: str = "B") -> Dict[str, List[dict]]:
+    """
+    Rows per table (ids assigned here, so answers can reference them without a round trip).
+    id_base and code_prefix keep several datasets apart in one database.
+    """
+    rng = random.Random(seed)
+    now = datetime.now(UTC).replace(microsecond=0)
+    cities = sorted(CITIES.values(), key=lambda c: c.id)
+    data = {"users": [], "groups": [], "group_members": [], "questions": [], "answers": []}
+    user_id = question_id = answer_id = member_id = id_base
+    for group_index in range(tier.groups):
+        group_id = id_base + group_index + 1
+        group_cities = rng.sample(cities, min(CITY_COUNT, len(cities)))
+        member_ids = []
+        for i in range(tier.members_per_group):
+            user_id += 1
+            member_id += 1
+            member_ids.append(user_id)
+            data["users"].append({"id": user_id, "current_group_id": group_id, "language": rng.choice(["en", "ru"])})
+            city = rng.choice(group_cities)
+            lat = lon = None
+            if rng.random() < GPS_SHARE:
+                lat = city.lat + rng.gauss(0, CITY_SPREAD_DEG)
+                lon = city.lon + rng.gauss(0, CITY_SPREAD_DEG)
+            data["group_members"].append({
+                "id": member_id, "group_id": group_id, "user_id": user_id,
+                "nickname": f"member{user_id}", "photo_url": f"photo-{user_id}",
+                "geolocation_lat": lat, "geolocation_lon": lon, "geohash": geohash_for_member(lat, lon),
+                "city": city.name, "country": city.country, "city_id": city.id,
+                "role": "creator" if i == 0 else "member", "balance": rng.randint(0, 500),
+                "gender": _choice(rng, GENDERS), "looking_for": _choice(rng, LOOKING_FOR),
+                "intro": f"Intro of member {user_id}",
+                "joined_at": now - timedelta(days=rng.randint(0, 365)),
+            })
+        data["groups"].append({
+            "id": group_id, "name": f"Group {group_id}", "description": "Synthetic benchmark group",
+            "invite_code": f"{code_prefix}{group_index + 1:04d}", "creator_user_id": member_ids[0],
+            "created_at": now - timedelta(days=400),
+        })
+        approved = []
+        for i in range(tier.questions_per_group):
+            question_id += 1
+            status = _choice(rng, QUESTION_STATUSES)
+            data["questions"].append({
+                "id": question_id, "group_id": group_id, "author_id": rng.choice(member_ids),
+                "text": f"Synthetic question {question_id}: do you like option {rng.randint(1, 10_000)}?",
+                "status": status, "is_deleted": 0,
+                "created_at": now - timedelta(minutes=tier.questions_per_group - i),
+            })
+            if status == "approved":
+                approved.append(question_id)
+        # Each question has a "popular" answer, members lean towards it with their own bias
+        popular = {qid: rng.choice([-2, -1, 0, 1, 2]) for qid in approved}
+        for uid in member_ids:
+            bias = rng.random()
+            for qid in approved:
+                if rng.random() >= tier.answer_density:
+                    continue
+                answer_id += 1
+                value = popular[qid] if rng.random() < bias else rng.choice([-2, -1, 0, 1, 2])
+                data["answers"].append({
+                    "id": answer_id, "question_id": qid, "user_id": uid, "value": value, "status": "answered",
+                    "created_at": now - timedelta(seconds=rng.randint(0, 30 * 86400)),
+                })
+    return data
+
+
+LOAD_ORDER = [(User, "users"), (Group, "groups"), (GroupMember, "group_members"), (Question, "questions"), (Answer, "answers")]
+LOAD_CHUNK = 5000
+
+
+async def load(session, data: Dict[str, List[dict]]) -> None:
+    """Bulk inserts the rows (users first without current group, it references groups)."""
+    current_groups = {row["id"]: row["current_group_id"] for row in data["users"]}
+    for model, table in LOAD_ORDER:
+        rows = data[table]
+        if table == "users":
+            rows = [{**row, "current_group_id": None} for row in rows]
+        for start in range(0, len(rows), LOAD_CHUNK):
+            await session.execute(insert(model), rows[start:start + LOAD_CHUNK])
+    await session.execute(update(User), [{"id": uid, "current_group_id": gid} for uid, gid in current_groups.items()])
+    if session.bind.dialect.name == "postgresql":
+        # Explicit ids don't advance the serial sequences
+        for model, table in LOAD_ORDER:
+            await session.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), coalesce(max(id), 1)) FROM {table}"))
+    await session.commit()
@@ -0,0 +1,133 @@
+"""
+Streaming exports of raw analytics data (CSV or NDJSON)
+Rows are read through a server-side cursor in batches of EXPORT_BATCH_SIZE and encoded batch by
+batch, so memory stays bounded whatever the table size; gzip is applied on the fly.
+
+Every export is ordered by its id column. Answers are exported from the append-only answer_events
+log, so changed and deleted answers show up as new rows, and can be exported incrementally: the
+response carries the highest id included in X-Export-Watermark, pass it back as `since` to get only
+the rows added afterwards. Ids are assigned at insert, not at commit, so the watermark only covers
+rows older than EXPORT_SAFETY_LAG: every lower id has committed by then (transactions are short).
+Members, matches and match_statuses rows are updated in place, so those datasets are full snapshots
+only (`since` is rejected). Member exports leave out nicknames, photos, exact coordinates and intros.
+"""
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import UTC, datetime, timedelta
+from typing import AsyncIterator, Iterable, List, NamedTuple, Optional, Sequence
+
+from sqlalchemy import func, select
+
+from ..db import AsyncSessionLocal
+from ..models import AnswerEvent, GroupMember, Match, MatchStatus
+
+EXPORT_BATCH_SIZE = int(os.getenv("ANALYTICS_EXPORT_BATCH_SIZE", 1000))
+EXPORT_SAFETY_LAG = int(os.getenv("ANALYTICS_EXPORT_SAFETY_LAG", 60))  # seconds
+EXPORT_FORMATS = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+
+class ExportSpec(NamedTuple):
+    id_column: object
+    group_column: object
+    columns: Sequence
+    created_column: object = None  # set for append-only datasets, the only ones exported incrementally
+
+    @property
+    def incremental(self) -> bool:
+        return self.created_column is not None
+
+
+EXPORTS = {
+    "answers": ExportSpec(AnswerEvent.id, AnswerEvent.group_id, [
+        AnswerEvent.id, AnswerEvent.group_id, AnswerEvent.question_id, AnswerEvent.user_id, AnswerEvent.answer_id,
+        AnswerEvent.event_type, AnswerEvent.old_value, AnswerEvent.new_value, AnswerEvent.created_at,
+    ], AnswerEvent.created_at),
+    "members": ExportSpec(GroupMember.id, GroupMember.group_id, [
+        GroupMember.id, GroupMember.group_id, GroupMember.user_id, GroupMember.role, GroupMember.joined_at,
+        GroupMember.city_id, GroupMember.city, GroupMember.country, GroupMember.gender, GroupMember.looking_for,
+        GroupMember.balance,
+    ]),
+    "matches": ExportSpec(Match.id, Match.group_id, [
+        Match.id, Match.group_id, Match.user1_id, Match.user2_id, Match.status, Match.created_at,
+    ]),
+    "match_statuses": ExportSpec(MatchStatus.id, MatchStatus.group_id, [
+        MatchStatus.id, MatchStatus.group_id, MatchStatus.user_id, MatchStatus.match_user_id, MatchStatus.status,
+        MatchStatus.created_at,
+    ]),
+}
+
+
+def _filters(spec: ExportSpec, group_id: Optional[int], since: int) -> List:
+    filters = [spec.id_column > since]
+    if group_id is not None:
+        filters.append(spec.group_column == group_id)
+    return filters
+
+
+async def export_watermark(session, spec: ExportSpec, group_id: Optional[int], since: int) -> int:
+    """Highest id the export will include, fixed before streaming starts (`since` if nothing is new)."""
+    filters = _filters(spec, group_id, since)
+    if spec.incremental:
+        filters.append(spec.created_column < datetime.now(UTC) - timedelta(seconds=EXPORT_SAFETY_LAG))
+    watermark = await session.execute(select(func.max(spec.id_column)).where(*filters))
+    return watermark.scalar() or since
+
+
+async def stream_rows(spec: ExportSpec, group_id: Optional[int], since: int, until: int) -> AsyncIterator[list]:
+    """Batches of rows with since < id <= until, read through a server-side cursor."""
+    query = (
+        select(*spec.columns)
+        .where(*_filters(spec, group_id, since), spec.id_column <= until)
+        .order_by(spec.id_column)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    # Own session: the request's one is closed before a streaming response is sent
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(query)
+        async for rows in result.partitions():
+            yield rows
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def encode_csv(header: Sequence[str], batch: Iterable, with_header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if with_header:
+        writer.writerow(header)
+    writer.writerows([_plain(value) for value in row] for row in batch)
+    return buffer.getvalue().encode()
+
+
+def encode_ndjson(header: Sequence[str], batch: Iterable, with_header: bool = False) -> bytes:
+    return "".join(
+        json.dumps(dict(zip(header, (_plain(value) for value in row))), ensure_ascii=False) + "\n" for row in batch
+    ).encode()
+
+
+ENCODERS = {"csv": encode_csv, "ndjson": encode_ndjson}
+
+
+async def encode_export(spec: ExportSpec, fmt: str, batches: AsyncIterator[list]) -> AsyncIterator[bytes]:
+    header = [column.key for column in spec.columns]
+    encode = ENCODERS[fmt]
+    first = True
+    async for batch in batches:
+        yield encode(header, batch, first)
+        first = False
+    if first and fmt == "csv":
+        yield encode(header, [], True)
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -1,5 +1,8 @@
-from fastapi import FastAPI, APIRouter, Depends, HTTPException, Query
-from fastapi.responses import HTMLResponse
+import hmac
+import os
+
+from fastapi import FastAPI, APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
@@ -7,6 +10,7 @@ from ..db import get_session
 from .services import AnalyticsService
 from .schemas import GroupSummary, GroupStats, GlobalStats
 from .dashboard import DASHBOARD_HTML
+from .exports import EXPORTS, EXPORT_FORMATS, encode_export, export_watermark, gzip_chunks, stream_rows
 
 # Create FastAPI app
 app = FastAPI(
@@ -17,6 +21,16 @@ app = FastAPI(
 
 router = APIRouter()
 
+# Raw per-user rows: exports need this token in X-Export-Token, and are disabled when it is not set
+EXPORT_TOKEN = os.getenv("ANALYTICS_EXPORT_TOKEN")
+
+
+async def require_export_token(x_export_token: Optional[str] = Header(None)) -> None:
+    if not EXPORT_TOKEN:
+        raise HTTPException(status_code=403, detail="Exports are disabled, ANALYTICS_EXPORT_TOKEN is not set")
+    if not x_export_token or not hmac.compare_digest(x_export_token.encode(), EXPORT_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid export token")
+
 
 @router.get("/", response_model=List[GroupSummary])
 async def get_groups_summary(
@@ -36,6 +50,32 @@ async def get_global_stats(
     return await service.get_global_stats()
 
 
+@router.get("/export/{dataset}", dependencies=[Depends(require_export_token)])
+async def export_dataset(
+    dataset: str,
+    request: Request,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    group_id: Optional[int] = None,
+    since: int = Query(0, ge=0),
+    session: AsyncSession = Depends(get_session)
+):
+    """Stream answers rows with id > since, or a full snapshot of members, matches or match_statuses (gzip if accepted)"""
+    spec = EXPORTS.get(dataset)
+    if not spec:
+        raise HTTPException(status_code=404, detail=f"Unknown dataset, one of: {', '.join(EXPORTS)}")
+    if since and not spec.incremental:
+        raise HTTPException(status_code=400, detail=f"{dataset} rows are updated in place, export a full snapshot without since")
+    until = await export_watermark(session, spec, group_id, since)
+    body = encode_export(spec, format, stream_rows(spec, group_id, since, until))
+    headers = {"Content-Disposition": f'attachment; filename="{dataset}_{since}_{until}.{format}"'}
+    if spec.incremental:
+        headers["X-Export-Watermark"] = str(until)
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        body = gzip_chunks(body)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type=EXPORT_FORMATS[format], headers=headers)
+
+
 @router.get("/{group_id}/stats", response_model=GroupStats)
 async def get_group_stats(
     group_id: int,
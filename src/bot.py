@@ -1,45 +1,82 @@
+import time
+_IMPORT_STARTED = time.perf_counter()
 import os
-print("[DEBUG] DATABASE_URL:", os.getenv("DATABASE_URL"))
+import hashlib
+import json
 import logging
 import asyncio
 from aiohttp import web
-from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
-from src.loader import bot, dp, set_bot_version
+from src.loader import bot, dp, redis, set_bot_version
 from src.routers import all_routers
+from src.handlers.moderation import start_moderation_sweeper
 from src.services.groups import ensure_admin_in_db
+from src.utils.update_queue import UPDATE_WORKERS, QueueRequestHandler
+from src.utils.question_catalog import start_catalog_listener
+from src.utils.rate_limit import render_metrics
+from src.utils.invite_code import start_invite_code_refiller
+from src.utils.startup import run_startup
+from src.utils.version_gate import start_version_listener
+from src.utils.redis_manager import render_metrics as render_redis_metrics
 from aiogram import types
 
-# Register all routers
+# Register all routers (module may be imported twice in spawned worker processes)
 for router in all_routers:
-    dp.include_router(router)
+    if router.parent_router is None:
+        dp.include_router(router)
 
 WEBHOOK_PATH = "/webhook"
 WEBHOOK_URL = os.getenv("WEBHOOK_URL")
 PORT = int(os.getenv("PORT", 8000))
+_IMPORTS_DONE = time.perf_counter()
+
+BOT_COMMANDS = [
+    types.BotCommand(command="start", description="Start the bot"),
+    types.BotCommand(command="instructions", description="Show instructions"),
+    types.BotCommand(command="mygroups", description="Show your groups"),
+    types.BotCommand(command="language", description="Change language / Сменить язык"),
+]
+
+async def sync_bot_commands():
+    """Registers BOT_COMMANDS only if they differ from what the last start registered."""
+    digest = hashlib.sha256(json.dumps([c.model_dump() for c in BOT_COMMANDS], sort_keys=True).encode()).hexdigest()
+    key = f"bot_commands:{bot.id}"
+    try:
+        if await redis.get(key) == digest:
+            return "unchanged"
+    except Exception as e:
+        logging.warning(f"[sync_bot_commands] Redis unavailable, registering commands: {e}")
+    await bot.set_my_commands(BOT_COMMANDS)
+    try:
+        await redis.set(key, digest)
+    except Exception:
+        pass
+    return "updated"
 
 async def on_startup(app):
     print(f"[INFO] Setting webhook: {WEBHOOK_URL}")
     await bot.set_webhook(WEBHOOK_URL)
-    
-    # Register bot commands
-    commands = [
-        types.BotCommand(command="start", description="Start the bot"),
-        types.BotCommand(command="instructions", description="Show instructions"),
-        types.BotCommand(command="mygroups", description="Show your groups"),
-        types.BotCommand(command="language", description="Change language / Сменить язык"),
-    ]
-    await bot.set_my_commands(commands)
+
+async def metrics(request):
+    text = await render_metrics() + await render_redis_metrics()
+    return web.Response(text=text, content_type="text/plain")
 
 async def on_shutdown(app):
     print("[INFO] Shutting down webhook")
     await bot.delete_webhook()
 
 def create_app():
+    # Only webhook mode needs aiogram's aiohttp integration
+    from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
     app = web.Application()
-    SimpleRequestHandler(
-        dispatcher=dp,
-        bot=bot,
-    ).register(app, path=WEBHOOK_PATH)
+    if UPDATE_WORKERS:
+        # Webhook only validates and enqueues updates, worker processes handle them
+        QueueRequestHandler(redis, UPDATE_WORKERS).register(app, path=WEBHOOK_PATH)
+    else:
+        SimpleRequestHandler(
+            dispatcher=dp,
+            bot=bot,
+        ).register(app, path=WEBHOOK_PATH)
+    app.router.add_get("/metrics", metrics)
     app.on_startup.append(on_startup)
     app.on_shutdown.append(on_shutdown)
     setup_application(app, dp, bot=bot)
@@ -47,18 +84,13 @@ def create_app():
 
 async def main():
     logging.basicConfig(level=logging.INFO)
-    await set_bot_version()
-    await ensure_admin_in_db()
-    
-    # Register bot commands
-    commands = [
-        types.BotCommand(command="start", description="Start the bot"),
-        types.BotCommand(command="instructions", description="Show instructions"),
-        types.BotCommand(command="mygroups", description="Show your groups"),
-        types.BotCommand(command="language", description="Change language / Сменить язык"),
-    ]
-    await bot.set_my_commands(commands)
-    
+    # Independent of each other: run together, log one timing line
+    await run_startup(set_bot_version, ensure_admin_in_db, sync_bot_commands, imports_ms=(_IMPORTS_DONE - _IMPORT_STARTED) * 1000)
+    catalog_listener = start_catalog_listener()
+    version_listener = start_version_listener()
+    invite_code_refiller = start_invite_code_refiller()
+    moderation_sweeper = start_moderation_sweeper(bot)
+
     if WEBHOOK_URL:
         print(f"[INFO] Starting bot in WEBHOOK mode: {WEBHOOK_URL}")
         app = create_app()
@@ -67,6 +99,11 @@ async def main():
         site = web.TCPSite(runner, "0.0.0.0", PORT)
         await site.start()
         print(f"[INFO] Webhook server started on port {PORT}")
+        if UPDATE_WORKERS:
+            from src.worker import start_worker_pool, supervise_worker_pool
+            print(f"[INFO] Starting {UPDATE_WORKERS} update workers")
+            ctx, processes = start_worker_pool(UPDATE_WORKERS)
+            await supervise_worker_pool(ctx, processes)
         while True:
             await asyncio.sleep(3600)
     else:
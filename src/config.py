@@ -9,6 +9,11 @@ POSTGRES_DB = os.getenv('POSTGRES_DB', 'allkinds')
 POSTGRES_HOST = os.getenv('POSTGRES_HOST', 'localhost')
 POSTGRES_PORT = int(os.getenv('POSTGRES_PORT', 5432))
 BOT_TOKEN = os.getenv('BOT_TOKEN')
+# Base URL of a local Bot API server (or the benchmarks' stand-in), unset = api.telegram.org
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL')
 ADMIN_USER_ID = int(os.getenv('ADMIN_USER_ID', 0))
 ALLKINDS_CHAT_BOT_USERNAME = os.getenv("ALLKINDS_CHAT_BOT_USERNAME", "AllkindsChatBot")
-WELCOME_BONUS = int(os.getenv('WELCOME_BONUS', 100)) 
\ No newline at end of file
+WELCOME_BONUS = int(os.getenv('WELCOME_BONUS', 100)) 
+# Optional radius (km) to limit match scoring to nearby members in large groups, unset = whole group
+MATCH_WITHIN_KM = float(os.getenv('MATCH_WITHIN_KM')) if os.getenv('MATCH_WITHIN_KM') else None
+MATCH_PREFILTER_MIN_MEMBERS = int(os.getenv('MATCH_PREFILTER_MIN_MEMBERS', 500))
@@ -1,5 +1,5 @@
 # Business logic constants for points
-from src.config import WELCOME_BONUS
+from src.config import WELCOME_BONUS, MATCH_WITHIN_KM, MATCH_PREFILTER_MIN_MEMBERS
 
 POINTS_FOR_NEW_QUESTION = 10
 POINTS_FOR_ANSWER = 1
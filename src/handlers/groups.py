@@ -1,7 +1,8 @@
 import os
+import json
 import logging
 from src.db import AsyncSessionLocal
-from sqlalchemy import select, and_, text
+from sqlalchemy import select, text
 from src.models import Group, GroupMember, User, Answer, Question, MatchStatus, Match
 # Handlers for group management
 # Imports and service calls will be added after extracting business logic 
@@ -9,32 +10,34 @@ from src.models import Group, GroupMember, User, Answer, Question, MatchStatus,
 from aiogram import types, F, Router
 from aiogram.fsm.context import FSMContext
 from src.loader import bot
-from src.keyboards.groups import get_admin_keyboard, get_user_keyboard, go_to_group_keyboard, get_group_main_keyboard, get_confirm_delete_keyboard, get_confirm_leave_keyboard, location_keyboard, get_group_reply_keyboard
+from src.keyboards.groups import get_admin_keyboard, get_user_keyboard, go_to_group_keyboard, get_group_main_keyboard, get_confirm_delete_keyboard, get_confirm_leave_keyboard, location_keyboard, get_group_reply_keyboard, get_match_keyboard
 from src.fsm.states import CreateGroup, JoinGroup
 from src.services.groups import (
     get_user_groups, is_group_creator, get_group_members, create_group_service,
-    join_group_by_code_service, leave_group_service, delete_group_service, switch_group_service, find_best_match, set_match_status, get_group_balance
+    join_group_by_code_service, leave_group_service, delete_group_service, switch_group_service, find_best_match, set_match_status, get_group_balance, charge_balance
 )
 from src.constants import WELCOME_BONUS, MIN_ANSWERS_FOR_MATCH, POINTS_FOR_MATCH, POINTS_TO_CONNECT
 import asyncio
 from src.config import ALLKINDS_CHAT_BOT_USERNAME
 from urllib.parse import quote
 from src.texts.messages import (
-    get_message,
+    get_message, get_language,
     GROUPS_NOT_IN_ANY, GROUPS_LEAVE_CONFIRM, GROUPS_DELETE_CONFIRM, GROUPS_NAME_EMPTY, GROUPS_DESC_EMPTY, GROUPS_CREATED,
     GROUPS_JOIN_INVALID_CODE, GROUPS_JOIN_NOT_FOUND, GROUPS_JOIN_ONBOARDING, GROUPS_JOINED, GROUPS_NO_NEW_QUESTIONS,
     GROUPS_PROFILE_SETUP, GROUPS_REVIEW_ANSWERED, GROUPS_FIND_MATCH, GROUPS_SELECT, GROUPS_WELCOME_ADMIN, GROUPS_WELCOME,
     GROUPS_SWITCH_TO, GROUPS_INVITE_LINK, BTN_CREATE_GROUP, BTN_JOIN_GROUP, BTN_SWITCH_TO, BTN_DELETE_GROUP, BTN_LEAVE_GROUP,
     BTN_DELETE, BTN_CANCEL, BTN_WHO_IS_VIBING,
-    MATCH_FOUND, MATCH_NO_VALID, MATCH_AI_CHEMISTRY, MATCH_SHOW_AGAIN, MATCH_DONT_SHOW, MATCH_PREV, MATCH_NEXT, MATCH_NOT_ENOUGH_POINTS,
+    MATCH_FOUND, MATCH_NO_VALID, MATCH_AI_CHEMISTRY, MATCH_NOT_ENOUGH_POINTS,
     MATCH_REQUEST_SENT, MATCH_INCOMING_REQUEST, MATCH_REQUEST_ACCEPTED, MATCH_REQUEST_REJECTED, MATCH_REQUEST_BLOCKED,
     BTN_ACCEPT_MATCH, BTN_REJECT_MATCH, BTN_BLOCK_MATCH, BTN_GO_TO_CHAT,
     QUESTION_LOAD_ANSWERED, NO_AVAILABLE_ANSWERED_QUESTIONS, BTN_LOAD_UNANSWERED, UNANSWERED_QUESTIONS_MSG,
     MATCH_NO_OTHERS, QUEUE_LOAD_UNANSWERED,
     GROUPS_LEFT_SUCCESS, GROUPS_LEFT_ERROR, GROUPS_DELETED_SUCCESS, GROUPS_DELETED_ERROR
 )
-from src.utils.redis import get_or_restore_internal_user_id, get_telegram_user_id
+from src.utils.redis import get_or_restore_internal_user_id, get_telegram_user_id, redis
+from src.utils.redis_manager import batch
 from src.utils.badges import send_badge_notification, log_badge_decrement
+from src.utils.callback_codec import callback_table, MatchNavCallback, MatchActionCallback
 
 router = Router()
 
@@ -106,26 +109,19 @@ async def show_group_main_flow(message, user_id, group_id):
     """
     After welcome: shows history button, unanswered counter and first unanswered question.
     """
-    from src.services.questions import get_next_unanswered_question
+    from src.services.questions import get_next_unanswered_question, count_answered_history
     from src.handlers.questions import send_question_to_user
     from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
     from src.texts.messages import get_message, QUESTION_LOAD_ANSWERED, GROUPS_REVIEW_ANSWERED
-    from src.models import User, Answer, Question
-    from sqlalchemy import select, and_
+    from src.models import User
+    from sqlalchemy import select
     async with AsyncSessionLocal() as session:
         user = await session.execute(select(User).where(User.id == user_id))
         user = user.scalar()
         # No longer creating delivered answers - using dynamic queue
         
         # Count answers for history button
-        answers_count = await session.execute(
-            select(Answer).where(
-                Answer.user_id == user.id,
-                Answer.value.isnot(None),
-                Answer.question_id.in_(select(Question.id).where(Question.group_id == group_id, Question.is_deleted == 0, Question.status == "approved"))
-            )
-        )
-        answers_count = len(answers_count.scalars().all())
+        answers_count = await count_answered_history(session, user.id, group_id)
         
         # 2. Load answered questions button (if there's something to load)
         if answers_count > 0:
@@ -141,32 +137,17 @@ async def show_group_main_flow(message, user_id, group_id):
         else:
             # Debug: check what questions exist in this group
             import logging
-            all_questions = await session.execute(
-                select(Question).where(
-                Question.group_id == group_id,
-                Question.is_deleted == 0
-            )
-            )
-            all_questions_list = all_questions.scalars().all()
-            approved_questions = [q for q in all_questions_list if q.status == "approved"]
-            pending_questions = [q for q in all_questions_list if q.status == "pending"]
-            rejected_questions = [q for q in all_questions_list if q.status == "rejected"]
-            
-            # Check user's answers
-            user_answers = await session.execute(
-                select(Answer).where(Answer.user_id == user.id)
-            )
-            user_answer_count = len(user_answers.scalars().all())
+            from src.utils.question_catalog import get_group_catalog, get_answered_ids
+            catalog = await get_group_catalog(group_id, session)
+            counts = catalog.count_by_status()
+            answered_ids = await get_answered_ids(session, user.id, [q.id for q in catalog.approved[:3]])
             
             logging.warning(f"[show_group_main_flow] No questions for user_id={user.id}, group_id={group_id}")
-            logging.warning(f"  Total questions: {len(all_questions_list)}")
-            logging.warning(f"  Approved: {len(approved_questions)}, Pending: {len(pending_questions)}, Rejected: {len(rejected_questions)}")
-            logging.warning(f"  User answers: {user_answer_count}")
+            logging.warning(f"  Total questions: {len(catalog.questions)}")
+            logging.warning(f"  Approved: {counts.get('approved', 0)}, Pending: {counts.get('pending', 0)}, Rejected: {counts.get('rejected', 0)}")
             
-            for q in approved_questions[:3]:  # Show first 3 approved
-                ans = await session.execute(select(Answer).where(and_(Answer.question_id == q.id, Answer.user_id == user.id)))
-                has_answer = ans.scalar() is not None
-                logging.warning(f"    Approved Q{q.id}: '{q.text[:30]}...' - User answered: {has_answer}")
+            for q in catalog.approved[:3]:  # Show first 3 approved
+                logging.warning(f"    Approved Q{q.id}: '{q.text[:30]}...' - User answered: {q.id in answered_ids}")
             
             await message.answer(get_message("GROUPS_NO_NEW_QUESTIONS", user=user))
 
@@ -587,47 +568,25 @@ async def cb_find_match(callback: types.CallbackQuery, state: FSMContext):
             if 'distance_info' in matches[0]:
                 logging.warning(f"[cb_find_match] First match distance_info: {matches[0]['distance_info']}")
         
-        # Clear old cached data to ensure fresh results (more aggressive)
-        from src.utils.redis import redis
-        import json
-        logging.warning(f"[cb_find_match] Clearing all cache for user {user_id}")
-        
-        # Clear multiple possible cache keys
-        await redis.delete(f"matches_{user_id}")
-        await redis.delete(f"viewed_matches_{user_id}_{group_id}")
-        
-        # Also clear any Redis keys that might be lingering
-        cursor = 0
-        while True:
-            cursor, keys = await redis.scan(cursor, match=f"*{user_id}*", count=100)
-            if keys:
-                logging.warning(f"[cb_find_match] Found {len(keys)} Redis keys for user {user_id}: {keys}")
-                for key in keys:
-                    # Decode bytes key to string for comparison
-                    key_str = key.decode('utf-8') if isinstance(key, bytes) else str(key)
-                    if 'matches' in key_str or 'viewed' in key_str:
-                        await redis.delete(key)
-                        logging.warning(f"[cb_find_match] Deleted Redis key: {key}")
-            if cursor == 0:
-                break
-        
-        logging.warning(f"[cb_find_match] Cache clearing completed for user {user_id}")
-        
-        # Deduct points for first match
-        member.balance -= POINTS_FOR_MATCH
+        # Deduct points for first match (conditional atomic update, fails if balance dropped meanwhile)
+        new_balance = await charge_balance(session, user.id, group_id, POINTS_FOR_MATCH)
         await session.commit()
+        if new_balance is None:
+            # Only these two keys hold match state (a keyspace SCAN here cost O(all keys) per search)
+            await redis.delete(f"matches_{user_id}", f"viewed_matches_{user_id}_{group_id}")
+            await callback.message.answer(get_message(MATCH_NOT_ENOUGH_POINTS, user=user))
+            return
         
-        # Mark first match as viewed
-        first_match_user_id = matches[0]['user_id']
-        viewed_matches = {first_match_user_id}
-        await redis.setex(f"viewed_matches_{user_id}_{group_id}", 
-                        3600, json.dumps(list(viewed_matches)))  # 1 hour TTL
+        # Fresh match state in one round trip: first match viewed (1 hour TTL), the list for navigation
+        async with batch() as pipe:
+            pipe.setex(f"viewed_matches_{user_id}_{group_id}", 3600, json.dumps([matches[0]['user_id']]))
+            pipe.set(f"matches_{user_id}", json.dumps(matches), ex=300)  # 5 min expiry
         
         # Show first match with navigation
-        await show_match_with_navigation(callback, user, matches, 0)
+        await show_match_with_navigation(callback, user, matches, 0, stored=True)
 
-async def show_match_with_navigation(callback_or_message, user, matches: list, index: int):
-    """Display match with navigation buttons"""
+async def show_match_with_navigation(callback_or_message, user, matches: list, index: int, stored: bool = False):
+    """Display match with navigation buttons (stored: the caller already cached matches for navigation)"""
     import logging
     logging.warning(f"[show_match_with_navigation] Called with {len(matches)} matches, index {index}")
     
@@ -636,11 +595,6 @@ async def show_match_with_navigation(callback_or_message, user, matches: list, i
         return
     
     match = matches[index]
-    logging.warning(f"[show_match_with_navigation] Match data keys: {list(match.keys())}")
-    logging.warning(f"[show_match_with_navigation] Match has distance_info: {'distance_info' in match}")
-    if 'distance_info' in match:
-        logging.warning(f"[show_match_with_navigation] Distance info: {match['distance_info']}")
-    
     # Format intro text
     intro_text = ""
     if match.get('intro'):
@@ -653,38 +607,12 @@ async def show_match_with_navigation(callback_or_message, user, matches: list, i
                       common_questions=match['common_questions'], 
                       distance_info=match.get('distance_info', '📍 Location not specified'))
     
-    logging.warning(f"[show_match_with_navigation] Final message text: {text[:100]}...")
-    
-    # Build navigation buttons
-    nav_buttons = []
-    if len(matches) > 1:
-        nav_row = []
-        if index > 0:
-            nav_row.append(types.InlineKeyboardButton(
-                text=get_message(MATCH_PREV, user=user), 
-                callback_data=f"match_nav_{index-1}"))
-        if index < len(matches) - 1:
-            nav_row.append(types.InlineKeyboardButton(
-                text=get_message(MATCH_NEXT, user=user), 
-                callback_data=f"match_nav_{index+1}"))
-        if nav_row:
-            nav_buttons.append(nav_row)
-    
-    # Create keyboard with navigation buttons (if any) and action buttons
-    kb = types.InlineKeyboardMarkup(inline_keyboard=[
-        *nav_buttons,
-        # [types.InlineKeyboardButton(text=get_message(MATCH_AI_CHEMISTRY, user=user, points=POINTS_TO_CONNECT), callback_data=f"match_chat_{match['user_id']}")],  # Commented out - will return later
-        [types.InlineKeyboardButton(text=get_message("BTN_CONNECT", user=user), callback_data=f"connect_{match['user_id']}")],
-        [types.InlineKeyboardButton(text=get_message(MATCH_SHOW_AGAIN, user=user), callback_data=f"match_postpone_{match['user_id']}")],
-        [types.InlineKeyboardButton(text=get_message(MATCH_DONT_SHOW, user=user), callback_data=f"match_hide_{match['user_id']}")]
-    ])
+    kb = get_match_keyboard(match['user_id'], index, len(matches), get_language(user))
     
     if hasattr(callback_or_message, 'message'):  # It's a callback
         # Store matches in state for navigation
-        from src.utils.redis import redis
-        import json
-        matches_data = json.dumps(matches)
-        await redis.set(f"matches_{user.id}", matches_data, ex=300)  # 5 min expiry
+        if not stored:
+            await redis.set(f"matches_{user.id}", json.dumps(matches), ex=300)  # 5 min expiry
         
         if match['photo_url']:
             if callback_or_message.message.photo:
@@ -713,26 +641,15 @@ async def show_match_with_navigation(callback_or_message, user, matches: list, i
         else:
             await callback_or_message.answer(text, reply_markup=kb, parse_mode="HTML")
 
-@router.callback_query(F.data.startswith("match_nav_"))
-async def cb_match_nav(callback: types.CallbackQuery, state: FSMContext):
+@callback_table.handler(MatchNavCallback)
+async def cb_match_nav(callback: types.CallbackQuery, callback_data: MatchNavCallback, state: FSMContext):
     """Handle match navigation"""
-    from src.utils.redis import get_or_restore_internal_user_id, redis
-    import json
-    
     internal_user_id = await get_or_restore_internal_user_id(state, callback.from_user.id)
     if not internal_user_id:
         await callback.answer(get_message("Please start the bot to use this feature.", user=callback.from_user))
         return
     
-    new_index = int(callback.data.split("_")[-1])
-    
-    # Get stored matches
-    matches_data = await redis.get(f"matches_{internal_user_id}")
-    if not matches_data:
-        await callback.answer("Session expired. Please search for matches again.")
-        return
-    
-    matches = json.loads(matches_data)
+    new_index = callback_data.index
     
     async with AsyncSessionLocal() as session:
         user = await session.execute(select(User).where(User.id == internal_user_id))
@@ -740,6 +657,17 @@ async def cb_match_nav(callback: types.CallbackQuery, state: FSMContext):
         if not user:
             await callback.answer("User not found.")
             return
+        group_id = user.current_group_id
+        
+        # Stored matches and the ones already paid for, one round trip
+        async with batch() as pipe:
+            pipe.get(f"matches_{internal_user_id}")
+            pipe.get(f"viewed_matches_{internal_user_id}_{group_id}")
+        matches_data, viewed_matches_data = pipe.results
+        if not matches_data:
+            await callback.answer("Session expired. Please search for matches again.")
+            return
+        matches = json.loads(matches_data)
         
         # Check if cached matches have distance_info (new feature)
         import logging
@@ -768,7 +696,6 @@ async def cb_match_nav(callback: types.CallbackQuery, state: FSMContext):
         elif matches:
             logging.warning(f"[cb_match_nav] Using existing matches, distance_info: {matches[0].get('distance_info', 'MISSING')}")
         
-        group_id = user.current_group_id
         member = await session.execute(select(GroupMember).where(
             GroupMember.user_id == user.id, 
             GroupMember.group_id == group_id))
@@ -776,13 +703,13 @@ async def cb_match_nav(callback: types.CallbackQuery, state: FSMContext):
         
         # Check if going forward (need to charge points)
         current_index = 0
+        # The last row of a match card is "don't show" for the match on screen
+        shown = callback_table.decode(callback.message.reply_markup.inline_keyboard[-1][0].callback_data)
         for i, match_data in enumerate(matches):
-            if str(match_data['user_id']) in callback.message.reply_markup.inline_keyboard[-1][0].callback_data:
+            if isinstance(shown, MatchActionCallback) and match_data['user_id'] == shown.user_id:
                 current_index = i
                 break
         
-        # Get viewed matches from Redis
-        viewed_matches_data = await redis.get(f"viewed_matches_{internal_user_id}_{group_id}")
         viewed_matches = set()
         if viewed_matches_data:
             viewed_matches = set(json.loads(viewed_matches_data))
@@ -793,12 +720,11 @@ async def cb_match_nav(callback: types.CallbackQuery, state: FSMContext):
             is_new_match = target_match_user_id not in viewed_matches
             
             if is_new_match:  # Charge points only for new matches
-                if member.balance < POINTS_FOR_MATCH:
+                new_balance = await charge_balance(session, user.id, group_id, POINTS_FOR_MATCH)
+                await session.commit()
+                if new_balance is None:
                     await callback.answer(get_message(MATCH_NOT_ENOUGH_POINTS, user=callback.from_user))
                     return
-                old_balance = member.balance
-                member.balance -= POINTS_FOR_MATCH
-                await session.commit()
                 
                 # Mark this match as viewed
                 viewed_matches.add(target_match_user_id)
@@ -806,7 +732,7 @@ async def cb_match_nav(callback: types.CallbackQuery, state: FSMContext):
                                 3600, json.dumps(list(viewed_matches)))  # 1 hour TTL
                 
                 # Show balance change popup
-                await callback.answer(f"💎 Balance: {member.balance} (-{POINTS_FOR_MATCH})", show_alert=False)
+                await callback.answer(f"💎 Balance: {new_balance} (-{POINTS_FOR_MATCH})", show_alert=False)
             else:
                 # Already viewed - free navigation
                 await callback.answer(f"💎 Balance: {member.balance}", show_alert=False)
@@ -816,17 +742,14 @@ async def cb_match_nav(callback: types.CallbackQuery, state: FSMContext):
         
         await show_match_with_navigation(callback, user, matches, new_index)
 
-@router.callback_query(F.data.startswith("match_hide_"))
-async def cb_match_hide(callback: types.CallbackQuery, state: FSMContext):
-    from src.utils.redis import get_or_restore_internal_user_id
+async def cb_match_hide(callback: types.CallbackQuery, callback_data: MatchActionCallback, state: FSMContext):
     user_id = await get_or_restore_internal_user_id(state, callback.from_user.id)
     if not user_id or user_id > 2_147_483_647:
         import logging
         logging.error(f"[cb_match_hide] Invalid user_id: {user_id}")
         await callback.answer("Internal error: invalid user id.", show_alert=True)
         return
-    data = callback.data.split("_")
-    match_user_id = int(data[-1])
+    match_user_id = callback_data.user_id
     # Get group_id from user's current group
     async with AsyncSessionLocal() as session:
         user = await session.execute(select(User).where(User.id == user_id))
@@ -848,17 +771,14 @@ async def cb_match_hide(callback: types.CallbackQuery, state: FSMContext):
             pass
     await callback.answer()
 
-@router.callback_query(F.data.startswith("match_postpone_"))
-async def cb_match_postpone(callback: types.CallbackQuery, state: FSMContext):
-    from src.utils.redis import get_or_restore_internal_user_id
+async def cb_match_postpone(callback: types.CallbackQuery, callback_data: MatchActionCallback, state: FSMContext):
     user_id = await get_or_restore_internal_user_id(state, callback.from_user.id)
     if not user_id or user_id > 2_147_483_647:
         import logging
         logging.error(f"[cb_match_postpone] Invalid user_id: {user_id}")
         await callback.answer("Internal error: invalid user id.", show_alert=True)
         return
-    data = callback.data.split("_")
-    match_user_id = int(data[-1])
+    match_user_id = callback_data.user_id
     # Get group_id from user's current group
     async with AsyncSessionLocal() as session:
         user = await session.execute(select(User).where(User.id == user_id))
@@ -1031,10 +951,17 @@ async def cb_match_chat(callback: types.CallbackQuery, state: FSMContext):
     
     await callback.answer()
 
-@router.callback_query(F.data.startswith("connect_"))
-async def cb_connect(callback: types.CallbackQuery, state: FSMContext):
+@callback_table.handler(MatchActionCallback)
+async def cb_match_action(callback: types.CallbackQuery, callback_data: MatchActionCallback, state: FSMContext):
+    """Connect / show later / don't show again buttons of a match card"""
+    handler = {"c": cb_connect, "p": cb_match_postpone, "h": cb_match_hide}.get(callback_data.action)
+    if handler is None:
+        await callback.answer()
+        return
+    return await handler(callback, callback_data, state)
+
+async def cb_connect(callback: types.CallbackQuery, callback_data: MatchActionCallback, state: FSMContext):
     """Инициировать запрос на подключение к матчу (новая упрощенная логика)"""
-    from src.utils.redis import get_or_restore_internal_user_id, get_telegram_user_id
     from src.services.groups import find_best_match
     
     internal_user_id = await get_or_restore_internal_user_id(state, callback.from_user.id)
@@ -1043,7 +970,7 @@ async def cb_connect(callback: types.CallbackQuery, state: FSMContext):
         await callback.answer()
         return
     
-    match_user_id = int(callback.data.split("_")[-1])
+    match_user_id = callback_data.user_id
     from src.models import MatchStatus, GroupMember, Match
     
     async with AsyncSessionLocal() as session:
@@ -1160,7 +1087,7 @@ async def cb_connect(callback: types.CallbackQuery, state: FSMContext):
 
 async def send_connection_request_to_user(bot, initiator_user_id: int, target_user_id: int, group_id: int):
     """Send connection request notification to target user"""
-    from src.services.groups import find_best_match
+    from src.services.match_requests import build_request_card, request_similarities
     
     try:
         async with AsyncSessionLocal() as session:
@@ -1187,51 +1114,17 @@ async def send_connection_request_to_user(bot, initiator_user_id: int, target_us
             # Send badge notification for incoming match request
             await send_badge_notification(bot, target_user_id, "💝 Someone wants to connect with you!")
             
-            # Send incoming request message
-            # Get match data for display
-            reverse_match = await find_best_match(target_user_id, group_id, exclude_user_ids=[])
-            if reverse_match and reverse_match.get('user_id') == initiator_user_id:
-                similarity = reverse_match['similarity']
-                common_questions = reverse_match['common_questions']
-                distance_info = reverse_match['distance_info']
-            else:
-                # Fallback values
-                similarity = 85
-                common_questions = 3
-                # Calculate distance info manually
-                from src.utils.distance import get_match_distance_info
-                target_member = await session.execute(select(GroupMember).where(
-                    GroupMember.user_id == target_user_id,
-                    GroupMember.group_id == group_id
-                ))
-                target_member = target_member.scalar()
-                distance_info = get_match_distance_info(target_member, initiator_member) if target_member else "📍 Location not specified"
-            
-            # First message about connection request
+            # Send incoming request message: the card shows the pair's own similarity (one answers query)
+            target_member = await session.execute(select(GroupMember).where(
+                GroupMember.user_id == target_user_id,
+                GroupMember.group_id == group_id
+            ))
+            target_member = target_member.scalar()
+            scores = await request_similarities(session, group_id, target_user_id, [initiator_user_id])
+            similarity, common_questions = scores[initiator_user_id]
             request_text = get_message("MATCH_INCOMING_REQUEST", user=target, 
                                      nickname=initiator_member.nickname if initiator_member else "Unknown")
-            
-            # Then match card
-            intro_text = initiator_member.intro if initiator_member and initiator_member.intro else ""
-            match_text = get_message("MATCH_FOUND", user=target, 
-                                   nickname=initiator_member.nickname if initiator_member else "Unknown", 
-                                   intro=intro_text, similarity=similarity, 
-                                   common_questions=common_questions, 
-                                   distance_info=distance_info if 'distance_info' in locals() else "📍 Location not specified")
-            
-            # Buttons for accept/decline/block
-            kb = types.InlineKeyboardMarkup(inline_keyboard=[
-                [
-                    types.InlineKeyboardButton(text=get_message("BTN_ACCEPT_MATCH", user=target), 
-                                             callback_data=f"accept_match_{initiator_user_id}"),
-                    types.InlineKeyboardButton(text=get_message("BTN_DECLINE_MATCH", user=target), 
-                                             callback_data=f"decline_match_{initiator_user_id}")
-                ],
-                [
-                    types.InlineKeyboardButton(text=get_message("BTN_BLOCK_MATCH", user=target), 
-                                             callback_data=f"block_match_{initiator_user_id}")
-                ]
-            ])
+            match_text, kb = build_request_card(target, target_member, initiator_member, similarity, common_questions)
             
             # Send notification to target user
             await bot.send_message(target_telegram_id, request_text, parse_mode="HTML")
@@ -1253,7 +1146,6 @@ async def send_connection_request_to_user(bot, initiator_user_id: int, target_us
 
 async def notify_successful_match_and_exchange_contacts(bot, user1, user2, member1, member2):
     """Уведомить об успешном мэтче и обменяться контактами"""
-    from src.utils.redis import get_telegram_user_id
     
     # Get telegram user IDs
     user1_telegram_id = await get_telegram_user_id(user1.id)
@@ -1309,7 +1201,6 @@ async def notify_successful_match_and_exchange_contacts(bot, user1, user2, membe
 @router.callback_query(F.data.startswith("accept_match_"))
 async def cb_accept_match(callback: types.CallbackQuery, state: FSMContext):
     """Принять запрос на подключение к матчу (новая упрощенная логика)"""
-    from src.utils.redis import get_or_restore_internal_user_id
     
     user_id = await get_or_restore_internal_user_id(state, callback.from_user.id)
     if not user_id:
@@ -1389,7 +1280,6 @@ async def cb_accept_match(callback: types.CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("decline_match_"))
 async def cb_decline_match(callback: types.CallbackQuery, state: FSMContext):
     """Отклонить запрос на подключение к матчу"""
-    from src.utils.redis import get_or_restore_internal_user_id, get_telegram_user_id
     
     user_id = await get_or_restore_internal_user_id(state, callback.from_user.id)
     if not user_id:
@@ -1461,7 +1351,6 @@ async def cb_decline_match(callback: types.CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("block_match_"))
 async def cb_block_match(callback: types.CallbackQuery, state: FSMContext):
     """Заблокировать пользователя"""
-    from src.utils.redis import get_or_restore_internal_user_id, get_telegram_user_id
     
     user_id = await get_or_restore_internal_user_id(state, callback.from_user.id)
     if not user_id:
@@ -1526,7 +1415,6 @@ async def cb_block_match(callback: types.CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("block_match_"))
 async def cb_block_match(callback: types.CallbackQuery, state: FSMContext):
     """Заблокировать пользователя (больше не показывать матчи)"""
-    from src.utils.redis import get_or_restore_internal_user_id, get_telegram_user_id
     
     user_id = await get_or_restore_internal_user_id(state, callback.from_user.id)
     if not user_id:
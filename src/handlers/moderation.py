@@ -0,0 +1,267 @@
+"""
+Moderation pipeline handlers
+New questions are moderated in batches per group (MODERATION_BATCH_DELAY after the first submission),
+the admin gets one paginated review queue with per-question and bulk approve/reject.
+Batches that never ran (the process restarted or the task failed) are picked up by a sweeper that
+scores every group still holding unscored pending questions older than MODERATION_SWEEP_AGE.
+"""
+import asyncio
+import logging
+import os
+from datetime import UTC, datetime, timedelta
+from typing import List, Optional
+
+from aiogram import types
+from aiogram.fsm.context import FSMContext
+from sqlalchemy import select
+
+from src.db import AsyncSessionLocal
+from src.models import Group, GroupMember, Question, User
+from src.services.moderation import (
+    REVIEW_PAGE_SIZE, apply_admin_decision, describe_flags, get_review_page, score_pending_questions
+)
+from src.texts.messages import (
+    get_message, QUESTION_APPROVED_AUTHOR, QUESTION_REJECTED_AUTHOR,
+    MODERATION_REVIEW_HEADER, MODERATION_REVIEW_EMPTY, MODERATION_REVIEW_SIMILAR
+)
+from src.constants import POINTS_FOR_NEW_QUESTION
+from src.handlers.questions import deliver_approved_questions
+from src.utils.callback_codec import (
+    callback_table, pack_ints, unpack_ints, ReviewDecisionCallback, ReviewPageCallback
+)
+from src.utils.near_duplicates import follow_group_version, unindex_questions
+from src.utils.question_catalog import get_group_catalog, invalidate_group_catalog
+from src.utils.redis import get_or_restore_internal_user_id, get_telegram_user_id, redis
+
+MODERATION_BATCH_DELAY = int(os.getenv("MODERATION_BATCH_DELAY", 30))  # seconds to collect a batch
+MODERATION_SWEEP_INTERVAL = int(os.getenv("MODERATION_SWEEP_INTERVAL", 60))  # seconds
+MODERATION_SWEEP_AGE = MODERATION_BATCH_DELAY * 3  # older unscored questions missed their batch
+SWEEP_LOCK_KEY = "moderation:sweep_lock"
+
+_batch_tasks = set()  # strong references, the loop only keeps weak ones
+
+
+async def schedule_group_moderation(bot, group_id: int) -> None:
+    """Runs the group's moderation batch once after MODERATION_BATCH_DELAY (one replica wins the slot)."""
+    try:
+        scheduled = await redis.set(f"moderation:scheduled:{group_id}", 1, nx=True, ex=MODERATION_BATCH_DELAY * 2)
+    except Exception as e:
+        logging.warning(f"[schedule_group_moderation] Redis unavailable, scheduling locally: {e}")
+        scheduled = True
+    if scheduled:
+        task = asyncio.create_task(_run_after_delay(bot, group_id), name=f"moderation-batch-{group_id}")
+        _batch_tasks.add(task)
+        task.add_done_callback(_batch_tasks.discard)
+
+
+async def _run_after_delay(bot, group_id: int) -> None:
+    await asyncio.sleep(MODERATION_BATCH_DELAY)
+    try:
+        await redis.delete(f"moderation:scheduled:{group_id}")
+    except Exception:
+        pass
+    try:
+        await run_group_moderation(bot, group_id)
+    except Exception as e:
+        logging.exception(f"[run_group_moderation] Group {group_id} failed: {e}")
+
+
+async def run_group_moderation(bot, group_id: int) -> dict:
+    """Scores the batch, notifies authors, delivers auto-approved questions and sends the admin the review queue."""
+    async with AsyncSessionLocal() as session:
+        result = await score_pending_questions(session, group_id)
+        await session.commit()
+        group = await session.execute(select(Group).where(Group.id == group_id))
+        group = group.scalar()
+        admin_user = None
+        if group:
+            admin_user = await session.execute(select(User).where(User.id == group.creator_user_id))
+            admin_user = admin_user.scalar()
+    if result["approve"] or result["reject"]:
+        # Approved questions were already indexed while pending, rejected ones leave the index
+        version = await invalidate_group_catalog(group_id)
+        unindex_questions(group_id, [q.id for q in result["reject"]], version)
+    logging.info(
+        f"[run_group_moderation] group_id={group_id}: approved={len(result['approve'])}, "
+        f"rejected={len(result['reject'])}, review={len(result['review'])}"
+    )
+    await notify_authors(bot, result["approve"], result["reject"])
+    if result["approve"]:
+        await deliver_approved_questions(bot, group_id, result["approve"])
+    if result["review"] and admin_user:
+        await send_review_queue(bot, admin_user, group_id)
+    return result
+
+
+async def groups_with_unscored_questions(session, older_than: datetime) -> List[int]:
+    rows = await session.execute(
+        select(Question.group_id).distinct()
+        .where(Question.status == "pending", Question.is_deleted == 0, Question.moderation_flags.is_(None),
+               Question.created_at < older_than)
+    )
+    return rows.scalars().all()
+
+
+async def sweep_unscored_questions(bot) -> List[int]:
+    """Runs the moderation batch of every group whose unscored questions missed it, returns their ids."""
+    try:
+        if not await redis.set(SWEEP_LOCK_KEY, 1, nx=True, ex=MODERATION_SWEEP_INTERVAL):
+            return []  # another replica sweeps this round
+    except Exception as e:
+        logging.warning(f"[sweep_unscored_questions] Redis unavailable, sweeping anyway: {e}")
+    async with AsyncSessionLocal() as session:
+        group_ids = await groups_with_unscored_questions(session, datetime.now(UTC) - timedelta(seconds=MODERATION_SWEEP_AGE))
+    for group_id in group_ids:
+        try:
+            await run_group_moderation(bot, group_id)
+        except Exception as e:
+            logging.exception(f"[sweep_unscored_questions] Group {group_id} failed: {e}")
+    return group_ids
+
+
+async def keep_moderation_swept(bot, stop_event: Optional[asyncio.Event] = None) -> None:
+    while not (stop_event and stop_event.is_set()):
+        try:
+            group_ids = await sweep_unscored_questions(bot)
+            if group_ids:
+                logging.info(f"[keep_moderation_swept] Moderated missed batches of groups {group_ids}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.warning(f"[keep_moderation_swept] Sweep failed: {e}")
+        await asyncio.sleep(MODERATION_SWEEP_INTERVAL)
+
+
+def start_moderation_sweeper(bot) -> asyncio.Task:
+    return asyncio.create_task(keep_moderation_swept(bot), name="moderation-sweeper")
+
+
+async def notify_authors(bot, approved, rejected) -> None:
+    for question, key in [(q, QUESTION_APPROVED_AUTHOR) for q in approved] + [(q, QUESTION_REJECTED_AUTHOR) for q in rejected]:
+        telegram_id = await get_telegram_user_id(question.author_id)
+        if not telegram_id:
+            continue
+        try:
+            await bot.send_message(telegram_id, get_message(key, user={"language_code": "en"}, points=POINTS_FOR_NEW_QUESTION))
+        except Exception as e:
+            logging.error(f"[notify_authors] Failed to notify author {question.author_id}: {e}")
+
+
+async def build_review_queue(admin_user, group_id: int, page: int = 0):
+    """Text and keyboard of one review page (or the 'empty' text and no keyboard)."""
+    async with AsyncSessionLocal() as session:
+        questions, total = await get_review_page(session, group_id, page)
+        if not questions and page > 0:
+            page = max(0, (total - 1) // REVIEW_PAGE_SIZE)
+            questions, total = await get_review_page(session, group_id, page)
+        if not questions:
+            return get_message(MODERATION_REVIEW_EMPTY, user=admin_user), None
+        group = await session.execute(select(Group.name).where(Group.id == group_id))
+        group_name = group.scalar() or ""
+        members = await session.execute(
+            select(GroupMember.user_id, GroupMember.nickname)
+            .where(GroupMember.group_id == group_id, GroupMember.user_id.in_({q.author_id for q in questions}))
+        )
+        nicknames = dict(members.all())
+        catalog = await get_group_catalog(group_id, session)
+    pages = (total + REVIEW_PAGE_SIZE - 1) // REVIEW_PAGE_SIZE
+    lines = [get_message(MODERATION_REVIEW_HEADER, user=admin_user, group_name=group_name, total=total, page=page + 1, pages=pages)]
+    keyboard = []
+    for n, question in enumerate(questions, start=1):
+        author_name = nicknames.get(question.author_id) or f"User {question.author_id}"
+        flags = describe_flags(question.moderation_flags)
+        plain = [flag for flag in flags if not flag.startswith(("similar:", "duplicate:"))]
+        lines.append(f"\n{n}. {question.text}\n   — {author_name}" + (f" [{', '.join(plain)}]" if plain else ""))
+        for flag in flags:
+            if flag.startswith(("similar:", "duplicate:")):
+                similar = catalog.by_id.get(int(flag.split(":", 1)[1]))
+                if similar:
+                    lines.append("   " + get_message(MODERATION_REVIEW_SIMILAR, user=admin_user, text=similar.text))
+        keyboard.append([
+            types.InlineKeyboardButton(text=f"✅ {n}", callback_data=ReviewDecisionCallback(approve=True, page=page, ids=pack_ints([question.id])).pack()),
+            types.InlineKeyboardButton(text=f"❌ {n}", callback_data=ReviewDecisionCallback(approve=False, page=page, ids=pack_ints([question.id])).pack()),
+            types.InlineKeyboardButton(text=f"🚫 {n}", callback_data=f"ban_user_{question.id}"),
+        ])
+    ids = pack_ints(q.id for q in questions)
+    keyboard.append([
+        types.InlineKeyboardButton(text="✅ All", callback_data=ReviewDecisionCallback(approve=True, page=page, ids=ids).pack()),
+        types.InlineKeyboardButton(text="❌ All", callback_data=ReviewDecisionCallback(approve=False, page=page, ids=ids).pack()),
+    ])
+    nav = []
+    if page > 0:
+        nav.append(types.InlineKeyboardButton(text="◀️", callback_data=ReviewPageCallback(group_id=group_id, page=page - 1).pack()))
+    if page + 1 < pages:
+        nav.append(types.InlineKeyboardButton(text="▶️", callback_data=ReviewPageCallback(group_id=group_id, page=page + 1).pack()))
+    if nav:
+        keyboard.append(nav)
+    return "\n".join(lines), types.InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+async def send_review_queue(bot, admin_user, group_id: int, page: int = 0) -> None:
+    admin_telegram_id = await get_telegram_user_id(admin_user.id)
+    if not admin_telegram_id:
+        return
+    text, kb = await build_review_queue(admin_user, group_id, page)
+    try:
+        await bot.send_message(admin_telegram_id, text, reply_markup=kb)
+    except Exception as e:
+        logging.error(f"[send_review_queue] Failed to send to admin: {e}")
+
+
+async def _load_admin_and_group(state, callback, group_id=None, question_id=None):
+    """Admin user and group id if the callback sender created the group, else (None, None)."""
+    admin_user_id = await get_or_restore_internal_user_id(state, callback.from_user.id)
+    if not admin_user_id:
+        return None, None
+    async with AsyncSessionLocal() as session:
+        if group_id is None:
+            group_id = await session.execute(select(Question.group_id).where(Question.id == question_id))
+            group_id = group_id.scalar()
+        group = await session.execute(select(Group).where(Group.id == group_id))
+        group = group.scalar()
+        if not group or group.creator_user_id != admin_user_id:
+            return None, None
+        admin_user = await session.execute(select(User).where(User.id == admin_user_id))
+        return admin_user.scalar(), group_id
+
+
+@callback_table.handler(ReviewPageCallback)
+async def cb_review_page(callback: types.CallbackQuery, callback_data: ReviewPageCallback, state: FSMContext):
+    admin_user, group_id = await _load_admin_and_group(state, callback, group_id=callback_data.group_id)
+    if not admin_user:
+        await callback.answer("❌ Access denied.", show_alert=True)
+        return
+    text, kb = await build_review_queue(admin_user, group_id, callback_data.page)
+    await callback.message.edit_text(text, reply_markup=kb)
+    await callback.answer()
+
+
+@callback_table.handler(ReviewDecisionCallback)
+async def cb_review_decision(callback: types.CallbackQuery, callback_data: ReviewDecisionCallback, state: FSMContext):
+    """Approve/reject one question or the whole page, then one merged delivery for the approved ones."""
+    question_ids = unpack_ints(callback_data.ids)
+    approve = callback_data.approve
+    admin_user, group_id = await _load_admin_and_group(state, callback, question_id=question_ids[0])
+    if not admin_user:
+        await callback.answer("❌ Access denied.", show_alert=True)
+        return
+    async with AsyncSessionLocal() as session:
+        changed = await apply_admin_decision(session, group_id, question_ids, approve)
+        await session.commit()
+    if changed:
+        version = await invalidate_group_catalog(group_id)
+        if approve:
+            follow_group_version(group_id, version)
+        else:
+            unindex_questions(group_id, [q.id for q in changed], version)
+    text, kb = await build_review_queue(admin_user, group_id, callback_data.page)
+    try:
+        await callback.message.edit_text(text, reply_markup=kb)
+    except Exception:
+        pass
+    await callback.answer(f"{'✅' if approve else '❌'} {len(changed)}")
+    if approve:
+        await notify_authors(callback.bot, changed, [])
+        await deliver_approved_questions(callback.bot, group_id, changed)
+    else:
+        await notify_authors(callback.bot, [], changed)
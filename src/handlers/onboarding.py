@@ -8,7 +8,7 @@ from src.services.onboarding import save_nickname_service, save_photo_service, s
 from src.fsm.states import Onboarding
 from src.db import AsyncSessionLocal
 from src.models import User, Answer, Question
-from src.services.questions import get_next_unanswered_question
+from src.services.questions import get_next_unanswered_question, count_answered_history
 from src.handlers.questions import send_question_to_user, update_badge_after_answer
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from sqlalchemy import select, and_
@@ -20,6 +20,7 @@ from src.texts.messages import (
     get_message
 )
 from src.constants import WELCOME_BONUS
+from src.utils.gazetteer import resolve_location, resolve_country
 
 router = Router()
 
@@ -163,8 +164,8 @@ async def onboarding_location(message: types.Message, state: FSMContext):
             await save_location_service(user_id, group_id, lat, lon)
         elif message.text and len(message.text.strip()) > 2:
             city_raw = message.text.strip()
-            city, country = await normalize_city_country(city_raw)
-            await save_location_service(user_id, group_id, None, None, city=city, country=country)
+            city, country, city_id = await normalize_city_country(city_raw)
+            await save_location_service(user_id, group_id, None, None, city=city, country=country, city_id=city_id)
         else:
             await message.answer(get_message("ONBOARDING_LOCATION_REQUIRED", user or message.from_user))
             return
@@ -194,18 +195,16 @@ async def onboarding_location(message: types.Message, state: FSMContext):
             await message.answer(get_message("ONBOARDING_SOMETHING_WRONG", user or message.from_user))
             await state.clear()
 
-# Stub for city/country normalization via OpenAI
 async def normalize_city_country(text: str):
-    # Without OpenAI: just split by comma if present
+    """Resolve free-text location via offline gazetteer: (city, country, city_id), city_id is None if unknown."""
+    city = resolve_location(text)
+    if city:
+        return city.name, city.country, city.id
+    # Unknown place: keep user's text, split by comma if present
     if "," in text:
         parts = [p.strip() for p in text.split(",", 1)]
-        city = parts[0]
-        country = parts[1] if len(parts) > 1 else None
-    else:
-        city = text
-        country = None
-    print("Parsed city:", city, "country:", country)
-    return city, country
+        return parts[0], resolve_country(parts[1]) or parts[1] or None, None
+    return text, None, None
 
 async def show_group_main_flow_after_onboarding(message, telegram_user_id, group_id):
     """After onboarding: show first question or message, and Load answered questions button only if there are answers."""
@@ -216,14 +215,7 @@ async def show_group_main_flow_after_onboarding(message, telegram_user_id, group
             await message.answer(get_message("ONBOARDING_INTERNAL_ERROR", message.from_user))
             return
         # Check if there's at least one answer in this group
-        answers_count = await session.execute(
-            select(Answer).where(
-                Answer.user_id == user.id,
-                Answer.value.isnot(None),
-                Answer.question_id.in_(select(Question.id).where(Question.group_id == group_id, Question.is_deleted == 0, Question.status == "approved"))
-            )
-        )
-        answers_count = len(answers_count.scalars().all())
+        answers_count = await count_answered_history(session, user.id, group_id)
         # Find first unanswered question
         next_q = await get_next_unanswered_question(session, group_id, user.id)
         if next_q:
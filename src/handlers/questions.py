@@ -4,35 +4,58 @@
 from aiogram import types, F, Router
 from aiogram.fsm.context import FSMContext
 from src.loader import bot
-from src.keyboards.questions import get_answer_keyboard, get_delete_keyboard, get_load_more_keyboard, ANSWER_VALUE_TO_EMOJI, ANSWER_VALUES
+from src.keyboards.questions import get_question_keyboard, get_load_more_keyboard, ANSWER_VALUE_TO_EMOJI
 from src.services.questions import (
-    get_next_unanswered_question,
     is_duplicate_question,
     moderate_question,
     get_group_members,
     ensure_user_exists,
+    get_answered_history_page,
+    get_answer_context,
+    commit_answer,
+    get_history_cursor_for_offset,
+    decode_history_cursor,
+    delete_answers_logged,
+    ANSWERED_PAGE_SIZE,
 )
+from src.services.groups import add_to_balance
 from src.constants import POINTS_FOR_NEW_QUESTION, POINTS_FOR_ANSWER
 from src.db import AsyncSessionLocal
-from sqlalchemy import select, and_, delete
+from sqlalchemy import select, delete, func
 from src.models import User, GroupMember, Question, Answer, Group, BannedUser, MatchStatus, Match
 from src.texts.messages import (
-    get_message,
+    get_message, get_language,
     QUESTION_TOO_SHORT, QUESTION_MUST_JOIN_GROUP, QUESTION_DUPLICATE, QUESTION_REJECTED, QUESTION_ADDED, QUESTION_DELETED,
     QUESTION_ALREADY_DELETED, QUESTION_ONLY_AUTHOR_OR_CREATOR, QUESTION_ANSWER_SAVED, QUESTION_NO_ANSWERED, QUESTION_MORE_ANSWERED,
     QUESTION_NO_MORE_ANSWERED, QUESTION_CAN_CHANGE_ANSWER, QUESTION_INTERNAL_ERROR, QUESTION_LOAD_ANSWERED, QUESTION_LOAD_MORE,
     QUESTION_DELETE, UNANSWERED_QUESTIONS_MSG, BTN_LOAD_UNANSWERED, GROUPS_NO_NEW_QUESTIONS, NEW_QUESTION_NOTIFICATION,
-    QUESTION_PENDING_APPROVAL, QUESTION_ADMIN_APPROVAL, QUESTION_APPROVED_ADMIN, QUESTION_REJECTED_ADMIN, 
+    QUESTION_PENDING_APPROVAL, QUESTION_RATE_LIMITED, QUESTION_GROUP_RATE_LIMITED, QUESTION_APPROVED_ADMIN, QUESTION_REJECTED_ADMIN, 
     QUESTION_APPROVED_AUTHOR, QUESTION_REJECTED_AUTHOR, USER_BANNED_ADMIN, USER_BANNED_NOTIFICATION
 )
 import logging
+from types import SimpleNamespace
 from src.utils.redis import get_telegram_user_id, get_or_restore_internal_user_id, set_telegram_mapping
 from src.utils.badges import send_badge_notification, get_unanswered_questions_count, log_badge_decrement
+from src.utils.answer_events import publish_answer_events
+from src.utils.rate_limit import check_question_submission
+from src.utils.join_cache import add_banned_user
+from src.utils.callback_codec import callback_table, AnswerCallback, DeleteQuestionCallback, HistoryMoreCallback
+from src.utils.question_catalog import invalidate_group_catalog, get_unanswered, get_group_catalog
+from src.utils.near_duplicates import index_question, unindex_question, follow_group_version, drop_group_index, minhash_signature, signature_to_bytes
 
 router = Router()
 
 # --- Handlers for questions/answers ---
 
+async def _question_rate_limited(message: types.Message, user_id: int, group_id: int, user) -> bool:
+    """Counts the submission against the rate limits, answers and returns True if it's over one."""
+    limit = await check_question_submission(user_id, group_id)
+    if limit.allowed:
+        return False
+    key = QUESTION_GROUP_RATE_LIMITED if limit.scope == "group_queue" else QUESTION_RATE_LIMITED
+    await message.answer(get_message(key, user=user, minutes=(limit.retry_after + 59) // 60))
+    return True
+
 @router.message(F.text & ~F.text.startswith('/'))
 async def handle_new_question(message: types.Message, state: FSMContext):
     """Create new question: save question, award points to author."""
@@ -43,17 +66,27 @@ async def handle_new_question(message: types.Message, state: FSMContext):
     if not user_id:
         await message.answer(get_message("Please start the bot to use this feature.", user=message.from_user))
         return
+    # Group and language of the last submission, kept in FSM data so bursts are throttled before any DB work
+    # (after a group switch one submission still counts against the previous group)
+    group_id = data.get('question_group_id')
+    if group_id:
+        hinted = SimpleNamespace(language=data.get('question_language'))
+        if len(text) < 5:
+            await message.answer(get_message(QUESTION_TOO_SHORT, user=hinted))
+            return
+        if await _question_rate_limited(message, user_id, group_id, hinted):
+            return
     async with AsyncSessionLocal() as session:
-        await ensure_user_exists(session, user_id)
-        user = await session.execute(select(User).where(User.id == user_id))
-        user = user.scalar()
-    if len(text) < 5:
-        await message.answer(get_message(QUESTION_TOO_SHORT, user=user))
-        return
-    async with AsyncSessionLocal() as session:
-        user = await session.execute(select(User).where(User.id == user_id))
-        user = user.scalar()
-        if not user or not user.current_group_id:
+        user = await ensure_user_exists(session, user_id)
+        if not group_id:
+            if len(text) < 5:
+                await message.answer(get_message(QUESTION_TOO_SHORT, user=user))
+                return
+            if user.current_group_id and await _question_rate_limited(message, user.id, user.current_group_id, user):
+                return
+        if user.current_group_id != group_id or user.language != data.get('question_language'):
+            await state.update_data(question_group_id=user.current_group_id, question_language=user.language)
+        if not user.current_group_id:
             await message.answer(get_message(QUESTION_MUST_JOIN_GROUP, user=user))
             return
         # Check for duplicates
@@ -66,16 +99,13 @@ async def handle_new_question(message: types.Message, state: FSMContext):
         if not ok:
             await message.answer(reason or get_message(QUESTION_REJECTED, user=user))
             return
-        # Save question with pending status (awaiting admin approval)
-        q = Question(group_id=user.current_group_id, author_id=user.id, text=text, status="pending")
+        # Save question with pending status, it is moderated with the rest of the group's batch
+        signature = minhash_signature(text)
+        q = Question(group_id=user.current_group_id, author_id=user.id, text=text, status="pending", minhash=signature_to_bytes(signature))
         session.add(q)
         await session.commit()
-        
-        # Get group admin/creator
-        group = await session.execute(select(Group).where(Group.id == user.current_group_id))
-        group = group.scalar()
-        admin_user = await session.execute(select(User).where(User.id == group.creator_user_id))
-        admin_user = admin_user.scalar()
+        version = await invalidate_group_catalog(q.group_id)
+        index_question(q.group_id, q.id, signature, version)
         
         try:
             await message.delete()
@@ -90,27 +120,16 @@ async def handle_new_question(message: types.Message, state: FSMContext):
         except Exception:
             pass
         
-        # Send question to admin for approval
-        if admin_user:
-            await send_question_for_approval(message.bot, admin_user, q, user)
+        from src.handlers.moderation import schedule_group_moderation
+        await schedule_group_moderation(message.bot, q.group_id)
 
-@router.callback_query(F.data.startswith("answer_"))
-async def cb_answer_question(callback: types.CallbackQuery, state: FSMContext):
-    parts = callback.data.split("_")
-    qid = int(parts[1])
+@callback_table.handler(AnswerCallback)
+async def cb_answer_question(callback: types.CallbackQuery, callback_data: AnswerCallback, state: FSMContext):
+    qid, value = callback_data.question_id, callback_data.value
     user_id = await get_or_restore_internal_user_id(state, callback.from_user.id)
     if not user_id:
         await callback.answer(get_message("Please start the bot to use this feature.", user=callback.from_user), show_alert=True)
         return
-    try:
-        value = int(parts[2])
-    except Exception:
-        logging.error(f"[cb_answer_question] Invalid answer value (not int): {parts[2]}")
-        async with AsyncSessionLocal() as session:
-            user = await session.execute(select(User).where(User.id == user_id))
-            user = user.scalar()
-        await callback.answer(get_message(QUESTION_INTERNAL_ERROR, user=user, show_alert=True))
-        return
     allowed_values = set(ANSWER_VALUE_TO_EMOJI.keys())
     if value not in allowed_values:
         logging.error(f"[cb_answer_question] Invalid answer value: {value}")
@@ -120,86 +139,47 @@ async def cb_answer_question(callback: types.CallbackQuery, state: FSMContext):
         await callback.answer(get_message(QUESTION_INTERNAL_ERROR, user=user, show_alert=True))
         return
     async with AsyncSessionLocal() as session:
-        user = await session.execute(select(User).where(User.id == user_id))
-        user = user.scalar()
-        question = await session.execute(select(Question).where(Question.id == qid, Question.is_deleted == 0))
-        question = question.scalar()
+        # Round trip 1: user + question + group in one query
+        context = await get_answer_context(session, user_id, qid)
+        user = context["user"] if context else None
+        question = context["question"] if context else None
         if not question:
-            await callback.answer(get_message(QUESTION_ALREADY_DELETED, user=user, show_alert=True))
+            await callback.answer(get_message(QUESTION_ALREADY_DELETED, user=user or callback.from_user, show_alert=True))
             await callback.message.delete()
             return
-        group_obj = await session.execute(select(Group).where(Group.id == question.group_id))
-        group_obj = group_obj.scalar()
-        creator_user_id = group_obj.creator_user_id if group_obj else None
-        ans = await session.execute(select(Answer).where(and_(Answer.question_id == qid, Answer.user_id == user.id)))
-        ans = ans.scalar()
-        if ans and ans.status == 'answered' and ans.value == value:
-            # Don't change status back to delivered, just show message
-            await show_question_with_all_buttons(callback, question, user, creator_user_id)
-            await callback.answer(get_message(QUESTION_CAN_CHANGE_ANSWER, user=user))
-            return
-        is_new_answer = not ans
-        if not ans:
-            ans = Answer(question_id=qid, user_id=user.id, status='answered', value=value)
-            session.add(ans)
-            # Award points for new answer
-            member = await session.execute(select(GroupMember).where(GroupMember.user_id == user.id, GroupMember.group_id == question.group_id))
-            member = member.scalar()
-            if member:
-                member.balance += POINTS_FOR_ANSWER
-        else:
-            ans.value = value
-            ans.status = 'answered'
-        await session.commit()
-        
-        # Get updated balance
-        updated_member = await session.execute(select(GroupMember).where(GroupMember.user_id == user.id, GroupMember.group_id == question.group_id))
-        updated_member = updated_member.scalar()
-        balance = updated_member.balance if updated_member else 0
-        
-        await show_question_with_selected_button(callback, question, user, value, creator_user_id)
-        if is_new_answer:
-            await callback.answer(f"💎 Balance: {balance} (+{POINTS_FOR_ANSWER})")
-        else:
-            await callback.answer(f"💎 Balance: {balance} (updated)")
-        # Пушим следующий неотвеченный вопрос, если есть (через сервис)
-        next_q = await get_next_unanswered_question(session, question.group_id, user.id)
-        if next_q:
-            logging.warning(f"[cb_answer_question] Push next unanswered: user_id={user.id}, question_id={next_q.id}, text={next_q.text[:50]}...")
-            await send_question_to_user(callback.bot, user, next_q)
-        else:
-            # Debug: check if there are any approved questions at all
-            all_questions = await session.execute(
-                select(Question).where(
-            Question.group_id == question.group_id,
-                    Question.is_deleted == 0,
-                    Question.status == "approved"
-                )
-            )
-            all_approved = all_questions.scalars().all()
-            
-            # Debug: check user's answers
-            user_answers = await session.execute(
-                select(Answer).where(Answer.user_id == user.id)
-            )
-            user_answer_count = len(user_answers.scalars().all())
-            
-            logging.warning(f"[cb_answer_question] No more unanswered for user_id={user.id}. Total approved questions: {len(all_approved)}, User answers: {user_answer_count}")
-            for q in all_approved:
-                ans = await session.execute(select(Answer).where(and_(Answer.question_id == q.id, Answer.user_id == user.id)))
-                has_answer = ans.scalar() is not None
-                logging.warning(f"  Question {q.id}: '{q.text[:30]}...' - Has answer: {has_answer}")
-        # Update badge after answer (always)
-        await update_badge_after_answer(callback.bot, user, question.group_id)
+        creator_user_id = context["creator_user_id"]
+        # Round trip 2: upsert answer + award points + next question prefetch
+        result = await commit_answer(session, user.id, question, value, POINTS_FOR_ANSWER)
+    await publish_answer_events(result["events"])
+    if result["unchanged"]:
+        # Don't change status back to delivered, just show message
+        await show_question_with_all_buttons(callback, question, user, creator_user_id)
+        await callback.answer(get_message(QUESTION_CAN_CHANGE_ANSWER, user=user))
+        return
+    await show_question_with_selected_button(callback, question, user, value, creator_user_id)
+    if result["is_new"]:
+        await callback.answer(f"💎 Balance: {result['balance']} (+{POINTS_FOR_ANSWER})")
+    else:
+        await callback.answer(f"💎 Balance: {result['balance']} (updated)")
+    # Пушим следующий неотвеченный вопрос, если есть (уже получен вместе с записью ответа)
+    next_q = result["next_question"]
+    if next_q:
+        await send_question_to_user(
+            callback.bot, user, next_q,
+            creator_user_id=creator_user_id, group_id=question.group_id,
+            all_groups_count=context["all_groups_count"], group_name=context["group_name"]
+        )
+    else:
+        logging.info(f"[cb_answer_question] No more unanswered for user_id={user.id}, group_id={question.group_id}")
+    # Update badge after answer (always)
+    await update_badge_after_answer(callback.bot, user, question.group_id, unanswered=result["unanswered"])
 
-        # Log badge decrement (answered question)
-        await log_badge_decrement(user.id, "answered_question")
-        
-        # Show updated balance with points earned
+    # Log badge decrement (answered question)
+    await log_badge_decrement(user.id, "answered_question")
 
-@router.callback_query(F.data.startswith("delete_question_"))
-async def cb_delete_question(callback: types.CallbackQuery, state: FSMContext):
-    qid = int(callback.data.split("_")[-1])
+@callback_table.handler(DeleteQuestionCallback)
+async def cb_delete_question(callback: types.CallbackQuery, callback_data: DeleteQuestionCallback, state: FSMContext):
+    qid = callback_data.question_id
     user_id = await get_or_restore_internal_user_id(state, callback.from_user.id)
     if not user_id:
         await callback.answer(get_message("Please start the bot to use this feature.", user=callback.from_user), show_alert=True)
@@ -228,15 +208,39 @@ async def cb_delete_question(callback: types.CallbackQuery, state: FSMContext):
             await callback.answer(get_message(QUESTION_ONLY_AUTHOR_OR_CREATOR, user=user, show_alert=True))
             return
         question.is_deleted = 1
-        await session.execute(Answer.__table__.delete().where(Answer.question_id == qid))
+        events = await delete_answers_logged(session, Answer.question_id == qid)
         await session.commit()
+        await publish_answer_events(events)
+        version = await invalidate_group_catalog(question.group_id)
+        unindex_question(question.group_id, question.id, version)
         try:
             await callback.message.delete()
         except Exception as e:
             logging.error(f"[cb_delete_question] Failed to delete message: {e}")
         await callback.answer(get_message(QUESTION_DELETED, user=user))
 
-ANSWERED_PAGE_SIZE = 10
+async def send_answered_history_page(callback: types.CallbackQuery, session, user, group_id, after=None):
+    """Send one page of answered questions (one joined keyset query) and the 'load more' button if needed."""
+    items, next_cursor = await get_answered_history_page(session, user.id, group_id, after=after)
+    if not items:
+        return False
+    group_obj = await session.execute(select(Group).where(Group.id == group_id))
+    group_obj = group_obj.scalar()
+    all_groups_count = await session.execute(select(func.count(GroupMember.id)).where(GroupMember.user_id == user.id))
+    all_groups_count = all_groups_count.scalar()
+    telegram_user_id = await get_telegram_user_id(user.id)
+    if telegram_user_id:
+        await send_answered_questions_batch(
+            callback.bot, telegram_user_id, user, items,
+            group_name=group_obj.name if group_obj else None,
+            all_groups_count=all_groups_count,
+            creator_user_id=group_obj.creator_user_id if group_obj else None
+        )
+    if next_cursor:
+        await callback.message.answer(get_message(QUESTION_MORE_ANSWERED, user=user), reply_markup=get_load_more_keyboard(next_cursor, user))
+    elif after is not None:
+        await callback.message.answer(get_message(QUESTION_NO_MORE_ANSWERED, user=user))
+    return True
 
 @router.callback_query(F.data == "load_answered_questions")
 async def cb_load_answered_questions(callback: types.CallbackQuery, state: FSMContext):
@@ -247,119 +251,41 @@ async def cb_load_answered_questions(callback: types.CallbackQuery, state: FSMCo
     async with AsyncSessionLocal() as session:
         user = await session.execute(select(User).where(User.id == user_id))
         user = user.scalar()
-        group_id = user.current_group_id
-        print(f"[DEBUG] cb_load_answered_questions: user_id={user_id}, group_id={group_id}, user={user}")
-        group_obj = await session.execute(select(Group).where(Group.id == group_id))
-        group_obj = group_obj.scalar()
-        group_name = group_obj.name if group_obj else None
-        memberships = await session.execute(select(GroupMember).where(GroupMember.user_id == user.id))
-        memberships = memberships.scalars().all()
-        all_groups_count = len(memberships)
-        answers_query = select(Answer).where(
-                Answer.user_id == user.id,
-                Answer.value.isnot(None),
-                Answer.question_id.in_(select(Question.id).where(Question.group_id == group_id, Question.is_deleted == 0, Question.status == "approved"))
-        ).order_by(Answer.created_at)
-        answers = await session.execute(answers_query.limit(ANSWERED_PAGE_SIZE))
-        answers = answers.scalars().all()
-        print(f"[DEBUG] cb_load_answered_questions: answers_ids={[a.id for a in answers]}")
-        if not answers:
+        sent = await send_answered_history_page(callback, session, user, user.current_group_id)
+        if not sent:
             await callback.answer(get_message(QUESTION_NO_ANSWERED, user=user, show_alert=True))
             return
-        for ans in answers:
-            question = await session.execute(select(Question).where(Question.id == ans.question_id))
-            question = question.scalar()
-            await send_answered_question_to_user(callback.bot, user, question, ans.value, group_name=group_name, all_groups_count=all_groups_count)
-        total_count_query = select(Answer).where(
-                Answer.user_id == user.id,
-                Answer.value.isnot(None),
-                Answer.question_id.in_(select(Question.id).where(Question.group_id == group_id, Question.is_deleted == 0, Question.status == "approved"))
-            )
-        total_count = await session.execute(total_count_query)
-        total_count = len(total_count.scalars().all())
-        print(f"[DEBUG] cb_load_answered_questions: total_count={total_count}, page=0, offset={ANSWERED_PAGE_SIZE}")
-        # Log all questions
-        questions_query = select(Question).where(Question.group_id == group_id, Question.is_deleted == 0, Question.status == "approved")
-        questions = await session.execute(questions_query)
-        questions = questions.scalars().all()
-        print(f"[DEBUG] cb_load_answered_questions: questions_ids={[q.id for q in questions]}")
-        if total_count > ANSWERED_PAGE_SIZE:
-            kb = get_load_more_keyboard(1, user)
-            print(f"[DEBUG] cb_load_answered_questions: sending load more button, reply_markup={kb}")
-            await callback.message.answer(get_message(QUESTION_MORE_ANSWERED, user=user), reply_markup=kb)
     await callback.answer()
 
-@router.callback_query(F.data.startswith("load_answered_questions_more_"))
-async def cb_load_answered_questions_more(callback: types.CallbackQuery, state: FSMContext):
-    print(f"[DEBUG] cb_load_answered_questions_more: callback.data={callback.data}")
+@callback_table.handler(HistoryMoreCallback)
+async def cb_load_answered_questions_more(callback: types.CallbackQuery, callback_data: HistoryMoreCallback, state: FSMContext):
     user_id = await get_or_restore_internal_user_id(state, callback.from_user.id)
     if not user_id:
         await callback.answer(get_message("Please start the bot to use this feature.", user=callback.from_user), show_alert=True)
         return
-    try:
-        page = int(callback.data.split("_")[-1])
-    except Exception as e:
-        print(f"[ERROR] Failed to parse page from callback.data: {callback.data}, error: {e}")
-        await callback.answer("Internal error: invalid page.", show_alert=True)
-        return
-    offset = page * ANSWERED_PAGE_SIZE
+    cursor = callback_data.cursor
     async with AsyncSessionLocal() as session:
         user = await session.execute(select(User).where(User.id == user_id))
         user = user.scalar()
         group_id = user.current_group_id
-        print(f"[DEBUG] cb_load_answered_questions_more: user_id={user_id}, group_id={group_id}, user={user}")
-        group_obj = await session.execute(select(Group).where(Group.id == group_id))
-        group_obj = group_obj.scalar()
-        group_name = group_obj.name if group_obj else None
-        memberships = await session.execute(select(GroupMember).where(GroupMember.user_id == user.id))
-        memberships = memberships.scalars().all()
-        all_groups_count = len(memberships)
-        answers_query = select(Answer).where(
-                Answer.user_id == user.id,
-                Answer.value.isnot(None),
-                Answer.question_id.in_(select(Question.id).where(Question.group_id == group_id, Question.is_deleted == 0, Question.status == "approved"))
-            ).order_by(Answer.created_at).offset(offset).limit(ANSWERED_PAGE_SIZE)
-        answers = await session.execute(answers_query)
-        answers = answers.scalars().all()
-        print(f"[DEBUG] cb_load_answered_questions_more: answers_ids={[a.id for a in answers]}, offset={offset}")
-        if not answers:
-            print(f"[DEBUG] No more answers to load for user_id={user_id}, group_id={group_id}")
-            try:
-                await callback.message.edit_reply_markup(reply_markup=None)
-            except Exception as e:
-                print(f"[ERROR] Failed to remove inline keyboard: {e}")
+        try:
+            if cursor.isdigit():
+                # Old buttons carry a page number: translate offset to keyset position once
+                after = await get_history_cursor_for_offset(session, user.id, group_id, int(cursor) * ANSWERED_PAGE_SIZE)
+            else:
+                after = decode_history_cursor(cursor)
+        except Exception as e:
+            logging.error(f"[cb_load_answered_questions_more] Invalid cursor {callback.data}: {e}")
+            await callback.answer("Internal error: invalid page.", show_alert=True)
+            return
+        try:
+            await callback.message.edit_reply_markup(reply_markup=None)
+        except Exception:
+            pass
+        sent = await send_answered_history_page(callback, session, user, group_id, after=after) if after else False
+        if not sent:
             await callback.answer(get_message(QUESTION_NO_MORE_ANSWERED, user=user, show_alert=True))
             return
-        for ans in answers:
-            question = await session.execute(select(Question).where(Question.id == ans.question_id))
-            question = question.scalar()
-            await send_answered_question_to_user(callback.bot, user, question, ans.value, group_name=group_name, all_groups_count=all_groups_count)
-        total_count_query = select(Answer).where(
-            Answer.user_id == user.id,
-            Answer.value.isnot(None),
-            Answer.question_id.in_(select(Question.id).where(Question.group_id == group_id, Question.is_deleted == 0, Question.status == "approved"))
-        )
-        total_count = await session.execute(total_count_query)
-        total_count = len(total_count.scalars().all())
-        print(f"[DEBUG] cb_load_answered_questions_more: total_count={total_count}, page={page}, offset={offset}")
-        # Log all questions
-        questions_query = select(Question).where(Question.group_id == group_id, Question.is_deleted == 0, Question.status == "approved")
-        questions = await session.execute(questions_query)
-        questions = questions.scalars().all()
-        print(f"[DEBUG] cb_load_answered_questions_more: questions_ids={[q.id for q in questions]}")
-        if total_count > offset:
-            # If there are more questions after this page — show button
-            if offset + ANSWERED_PAGE_SIZE < total_count:
-                kb = get_load_more_keyboard(page+1, user)
-                print(f"[DEBUG] cb_load_answered_questions_more: sending load more button, reply_markup={kb}")
-                await callback.message.answer(get_message(QUESTION_MORE_ANSWERED, user=user), reply_markup=kb)
-        else:
-            # All questions loaded — remove button
-            try:
-                await callback.message.edit_reply_markup(reply_markup=None)
-            except Exception as e:
-                print(f"[ERROR] Failed to remove inline keyboard (final): {e}")
-            await callback.message.answer(get_message(QUESTION_NO_MORE_ANSWERED, user=user))
     await callback.answer()
 
 @router.callback_query(F.data == "load_unanswered")
@@ -371,21 +297,8 @@ async def cb_load_unanswered(callback: types.CallbackQuery, state: FSMContext):
     async with AsyncSessionLocal() as session:
         user = await session.execute(select(User).where(User.id == user_id))
         user = user.scalar()
-        # Новый динамический запрос: все вопросы группы, на которые нет Answer
-        questions = await session.execute(
-            select(Question).where(
-                Question.group_id == user.current_group_id,
-                Question.is_deleted == 0,
-                Question.status == "approved"
-            ).order_by(Question.created_at)
-        )
-        questions = questions.scalars().all()
-        unanswered = []
-        for q in questions:
-            ans = await session.execute(select(Answer).where(and_(Answer.question_id == q.id, Answer.user_id == user.id)))
-            ans = ans.scalar()
-            if not ans:
-                unanswered.append(q)
+        # Вопросы группы из каталога, на которые нет Answer (один запрос по ответам)
+        unanswered = await get_unanswered(session, user.current_group_id, user.id)
         if not unanswered:
             try:
                 await callback.message.delete()
@@ -395,7 +308,7 @@ async def cb_load_unanswered(callback: types.CallbackQuery, state: FSMContext):
             return
         # Показываем первый неотвеченный вопрос
         from src.handlers.questions import send_question_to_user
-        await send_question_to_user(callback.bot, user, unanswered[0])
+        await send_question_to_user(callback.bot, user, unanswered[0].to_question(user.current_group_id))
         # Если есть ещё — показываем кнопку снова
         if len(unanswered) > 1:
             msg = get_message(UNANSWERED_QUESTIONS_MSG, user=user, count=len(unanswered)-1)
@@ -417,10 +330,7 @@ async def show_question_with_selected_button(callback, question, user, value, cr
         logging.error(f"[show_question_with_selected_button] Unknown value: {value}")
         await callback.answer(get_message(QUESTION_INTERNAL_ERROR, user=user, show_alert=True))
         return
-    row = [types.InlineKeyboardButton(text=ANSWER_VALUE_TO_EMOJI[value], callback_data=f"answer_{question.id}_{value}")]
-    if is_author or is_creator:
-        row.append(types.InlineKeyboardButton(text="Delete", callback_data=f"delete_question_{question.id}"))
-    kb = types.InlineKeyboardMarkup(inline_keyboard=[row])
+    kb = get_question_keyboard(question.id, value, is_author or is_creator, get_language(user))
     # Compare current keyboard with new
     current = callback.message.reply_markup
     if current and current.inline_keyboard == kb.inline_keyboard:
@@ -438,11 +348,7 @@ async def show_question_with_all_buttons(callback, question, user, creator_user_
             creator_user_id = group_obj.creator_user_id if group_obj else None
     is_author = (user.id == question.author_id)
     is_creator = (user.id == creator_user_id)
-    answer_buttons = [types.InlineKeyboardButton(text=ANSWER_VALUE_TO_EMOJI[val], callback_data=f"answer_{question.id}_{val}") for val, emoji in ANSWER_VALUES]
-    keyboard = [answer_buttons]
-    if is_author or is_creator:
-        keyboard.append([types.InlineKeyboardButton(text="Delete", callback_data=f"delete_question_{question.id}")])
-    kb = types.InlineKeyboardMarkup(inline_keyboard=keyboard)
+    kb = get_question_keyboard(question.id, None, is_author or is_creator, get_language(user))
     # Compare current keyboard with new
     current = callback.message.reply_markup
     if current and current.inline_keyboard == kb.inline_keyboard:
@@ -472,11 +378,7 @@ async def send_question_to_user(bot, user, question, creator_user_id=None, group
     else:
         text = question.text
     # Не создаём Answer заранее!
-    answer_buttons = [types.InlineKeyboardButton(text=ANSWER_VALUE_TO_EMOJI[val], callback_data=f"answer_{question.id}_{val}") for val, emoji in ANSWER_VALUES]
-    keyboard = [answer_buttons]
-    if is_author or is_creator:
-        keyboard.append([types.InlineKeyboardButton(text="Delete", callback_data=f"delete_question_{question.id}")])
-    kb = types.InlineKeyboardMarkup(inline_keyboard=keyboard)
+    kb = get_question_keyboard(question.id, None, is_author or is_creator, get_language(user))
     telegram_user_id = await get_telegram_user_id(user.id)
     logging.warning(f"[send_question_to_user] telegram_user_id={telegram_user_id}")
     if not telegram_user_id:
@@ -500,41 +402,36 @@ async def send_answered_question_to_user(bot, user, question, value, group_name=
             memberships = await session.execute(select(GroupMember).where(GroupMember.user_id == user.id))
             memberships = memberships.scalars().all()
             all_groups_count = len(memberships)
-    is_author = (user.id == question.author_id)
     async with AsyncSessionLocal() as session:
         group_obj = await session.execute(select(Group).where(Group.id == question.group_id))
         group_obj = group_obj.scalar()
         creator_user_id = group_obj.creator_user_id if group_obj else None
-    is_creator = (user.id == creator_user_id)
+    text, kb = build_answered_question_card(user, question, value, group_name, all_groups_count, creator_user_id)
+    telegram_user_id = await get_telegram_user_id(user.id)
+    if telegram_user_id:
+        await bot.send_message(telegram_user_id, text, reply_markup=kb, parse_mode="HTML")
+
+def build_answered_question_card(user, question, value, group_name, all_groups_count, creator_user_id):
+    """Text and keyboard of an answered question card, without any I/O."""
     if all_groups_count > 1:
         text = f"<b>{group_name}</b>: {question.text}"
     else:
         text = question.text
-    row = [types.InlineKeyboardButton(text=ANSWER_VALUE_TO_EMOJI[value], callback_data=f"answer_{question.id}_{value}")]
-    if is_author or is_creator:
-        row.append(types.InlineKeyboardButton(text="Delete", callback_data=f"delete_question_{question.id}"))
-    kb = types.InlineKeyboardMarkup(inline_keyboard=[row])
-    telegram_user_id = await get_telegram_user_id(user.id)
-    if telegram_user_id:
+    can_delete = user.id == question.author_id or user.id == creator_user_id
+    return text, get_question_keyboard(question.id, value, can_delete, get_language(user))
+
+async def send_answered_questions_batch(bot, telegram_user_id, user, items, group_name, all_groups_count, creator_user_id):
+    """Send a page of (question, answer) cards: all cards are built first, then sent back to back in order."""
+    cards = [
+        build_answered_question_card(user, question, answer.value, group_name, all_groups_count, creator_user_id)
+        for question, answer in items
+    ]
+    for text, kb in cards:
         await bot.send_message(telegram_user_id, text, reply_markup=kb, parse_mode="HTML")
 
 async def update_badge_for_new_question(bot, user, new_question):
-    from src.utils.redis import get_telegram_user_id
     async with AsyncSessionLocal() as session:
-        questions = await session.execute(
-            select(Question).where(
-                Question.group_id == new_question.group_id,
-                Question.is_deleted == 0,
-                Question.status == "approved"
-            )
-        )
-        questions = questions.scalars().all()
-        unanswered = 0
-        for q in questions:
-            ans = await session.execute(select(Answer).where(and_(Answer.question_id == q.id, Answer.user_id == user.id)))
-            ans = ans.scalar()
-            if not ans:
-                unanswered += 1
+        unanswered = len(await get_unanswered(session, new_question.group_id, user.id))
         telegram_user_id = await get_telegram_user_id(user.id)
         if not telegram_user_id:
             return
@@ -550,37 +447,23 @@ async def update_badge_for_new_question(bot, user, new_question):
         except Exception as e:
             logging.error(f"[update_badge_for_new_question] Failed to update badge: {e}")
 
-async def update_badge_after_answer(bot, user, group_id):
-    from src.utils.redis import get_telegram_user_id
-    async with AsyncSessionLocal() as session:
-        questions = await session.execute(
-            select(Question).where(
-                Question.group_id == group_id,
-                Question.is_deleted == 0,
-                Question.status == "approved"
-            )
-        )
-        questions = questions.scalars().all()
-        unanswered = 0
-        for q in questions:
-            ans = await session.execute(select(Answer).where(and_(Answer.question_id == q.id, Answer.user_id == user.id)))
-            ans = ans.scalar()
-            if not ans:
-                unanswered += 1
-        telegram_user_id = await get_telegram_user_id(user.id)
-        if not telegram_user_id:
-            return
-        try:
-            if unanswered == 0:
-                # badge_text = "✅ All questions answered!"
-                # await bot.send_message(telegram_user_id, badge_text)
-                logging.info(f"[update_badge_after_answer] Removed badge for user {user.id}: no more unanswered questions")
-            else:
-                # badge_text = f"🔔 You have {unanswered} unanswered questions"
-                # await bot.send_message(telegram_user_id, badge_text)
-                logging.info(f"[update_badge_after_answer] Updated badge for user {user.id}: {unanswered} unanswered")
-        except Exception as e:
-            logging.error(f"[update_badge_after_answer] Failed to update badge: {e}") 
+async def update_badge_after_answer(bot, user, group_id, unanswered=None):
+    if unanswered is None:
+        unanswered = await get_unanswered_questions_count(user.id, group_id)
+    telegram_user_id = await get_telegram_user_id(user.id)
+    if not telegram_user_id:
+        return
+    try:
+        if unanswered == 0:
+            # badge_text = "✅ All questions answered!"
+            # await bot.send_message(telegram_user_id, badge_text)
+            logging.info(f"[update_badge_after_answer] Removed badge for user {user.id}: no more unanswered questions")
+        else:
+            # badge_text = f"🔔 You have {unanswered} unanswered questions"
+            # await bot.send_message(telegram_user_id, badge_text)
+            logging.info(f"[update_badge_after_answer] Updated badge for user {user.id}: {unanswered} unanswered")
+    except Exception as e:
+        logging.error(f"[update_badge_after_answer] Failed to update badge: {e}") 
 
 async def cleanup_old_delivered_answers():
     """Удалить все старые delivered Answer без value (устаревшие очереди)."""
@@ -590,44 +473,6 @@ async def cleanup_old_delivered_answers():
         )
         await session.commit()
 
-async def send_question_for_approval(bot, admin_user, question, author_user):
-    """Send question to admin for approval"""
-    from src.utils.redis import get_telegram_user_id
-    
-    admin_telegram_id = await get_telegram_user_id(admin_user.id)
-    if not admin_telegram_id:
-        return
-    
-    # Get author nickname for the admin message
-    async with AsyncSessionLocal() as session:
-        author_member = await session.execute(select(GroupMember).where(
-            GroupMember.user_id == author_user.id, 
-            GroupMember.group_id == question.group_id))
-        author_member = author_member.scalar()
-        author_name = author_member.nickname if author_member and author_member.nickname else f"User {author_user.id}"
-    
-    # Send admin notification
-    admin_text = get_message(QUESTION_ADMIN_APPROVAL, user=admin_user, 
-                           author_name=author_name,
-                           question_text=question.text)
-    
-    # Admin approval buttons
-    keyboard = [
-        [
-            types.InlineKeyboardButton(text="✅ Approve", callback_data=f"approve_question_{question.id}"),
-            types.InlineKeyboardButton(text="❌ Reject", callback_data=f"reject_question_{question.id}")
-        ],
-        [
-            types.InlineKeyboardButton(text="🚫 Ban User", callback_data=f"ban_user_{question.id}")
-        ]
-    ]
-    kb = types.InlineKeyboardMarkup(inline_keyboard=keyboard)
-    
-    try:
-        await bot.send_message(admin_telegram_id, admin_text, reply_markup=kb, parse_mode="HTML")
-    except Exception as e:
-        logging.error(f"[send_question_for_approval] Failed to send to admin: {e}")
-
 @router.callback_query(F.data.startswith("approve_question_"))
 async def cb_approve_question(callback: types.CallbackQuery, state: FSMContext):
     """Admin approves a question"""
@@ -635,11 +480,17 @@ async def cb_approve_question(callback: types.CallbackQuery, state: FSMContext):
     
     async with AsyncSessionLocal() as session:
         # Get question
-        question = await session.execute(select(Question).where(Question.id == question_id))
+        # Locked so a double tap or a scoring run cannot decide the same question twice
+        question = await session.execute(
+            select(Question).where(Question.id == question_id).with_for_update()
+        )
         question = question.scalar()
         if not question:
             await callback.answer("Question not found", show_alert=True)
             return
+        if question.status != "pending":
+            await callback.answer("Question already moderated", show_alert=True)
+            return
         
         # Get group to verify admin
         group = await session.execute(select(Group).where(Group.id == question.group_id))
@@ -665,15 +516,11 @@ async def cb_approve_question(callback: types.CallbackQuery, state: FSMContext):
         question.status = "approved"
         
         # Award points to author
-        author_member = await session.execute(select(GroupMember).where(
-            GroupMember.user_id == author_user.id,
-            GroupMember.group_id == question.group_id
-        ))
-        author_member = author_member.scalar()
-        if author_member:
-            author_member.balance += POINTS_FOR_NEW_QUESTION
+        await add_to_balance(session, author_user.id, question.group_id, POINTS_FOR_NEW_QUESTION)
         
         await session.commit()
+        version = await invalidate_group_catalog(question.group_id)
+        follow_group_version(question.group_id, version)  # indexed since it was submitted
         
         # Delete ALL moderation messages to keep chat clean
         try:
@@ -711,11 +558,16 @@ async def cb_reject_question(callback: types.CallbackQuery, state: FSMContext):
         admin_user = await session.execute(select(User).where(User.id == admin_user_id))
         admin_user = admin_user.scalar()
         
-        question = await session.execute(select(Question).where(Question.id == question_id))
+        question = await session.execute(
+            select(Question).where(Question.id == question_id).with_for_update()
+        )
         question = question.scalar()
         if not question:
             await callback.answer("Question not found.")
             return
+        if question.status != "pending":
+            await callback.answer("Question already moderated.")
+            return
             
         group = await session.execute(select(Group).where(Group.id == question.group_id))
         group = group.scalar()
@@ -726,6 +578,8 @@ async def cb_reject_question(callback: types.CallbackQuery, state: FSMContext):
         # Update question status to rejected
         question.status = "rejected"
         await session.commit()
+        version = await invalidate_group_catalog(question.group_id)
+        unindex_question(question.group_id, question.id, version)
         
         # Delete admin approval message
         try:
@@ -810,7 +664,13 @@ async def cb_ban_user(callback: types.CallbackQuery, state: FSMContext):
         # 2. Reject current question
         question.status = "rejected"
         
-        # 3. Delete ALL questions from this user in this group
+        # 3. Delete ALL questions from this user in this group (answers to them first, so they are logged)
+        events = await delete_answers_logged(
+            session,
+            Answer.question_id.in_(
+                select(Question.id).where(Question.author_id == banned_user_id, Question.group_id == question.group_id)
+            )
+        )
         await session.execute(
             delete(Question).where(
                 Question.author_id == banned_user_id,
@@ -819,12 +679,11 @@ async def cb_ban_user(callback: types.CallbackQuery, state: FSMContext):
         )
         
         # 4. Delete ALL answers from this user in this group
-        await session.execute(
-            delete(Answer).where(
-                Answer.user_id == banned_user_id,
-                Answer.question_id.in_(
-                    select(Question.id).where(Question.group_id == question.group_id)
-                )
+        events += await delete_answers_logged(
+            session,
+            Answer.user_id == banned_user_id,
+            Answer.question_id.in_(
+                select(Question.id).where(Question.group_id == question.group_id)
             )
         )
         
@@ -856,6 +715,10 @@ async def cb_ban_user(callback: types.CallbackQuery, state: FSMContext):
             banned_user.current_group_id = None
         
         await session.commit()
+        await add_banned_user(question.group_id, banned_user_id)
+        await publish_answer_events(events)
+        await invalidate_group_catalog(question.group_id)
+        drop_group_index(question.group_id)
         
         # Delete admin moderation message
         try:
@@ -878,41 +741,58 @@ async def cb_ban_user(callback: types.CallbackQuery, state: FSMContext):
 
 async def send_approved_question_to_users(bot, question, author_user):
     """Send approved question to author first, then to all group members including admin"""
-    # Send to author first
     await send_question_to_user(bot, author_user, question)
-    
-    # Send to ALL group members (including admin)
+    await deliver_approved_questions(bot, question.group_id, [question], skip_user_ids={author_user.id})
+
+async def deliver_approved_questions(bot, group_id, questions, skip_user_ids=()):
+    """
+    One delivery job for a batch of newly approved questions: every member is visited once,
+    gets the first new question pushed if their queue was empty and one badge notification.
+    """
+    if not questions:
+        return
+    questions = sorted(questions, key=lambda q: q.id)
+    new_ids = {q.id for q in questions}
     async with AsyncSessionLocal() as session:
-        # Get the group to find admin
-        group = await session.execute(select(Group).where(Group.id == question.group_id))
+        group = await session.execute(select(Group).where(Group.id == group_id))
         group = group.scalar()
         admin_user_id = group.creator_user_id if group else None
-        
         members = await session.execute(
-            select(GroupMember).where(GroupMember.group_id == question.group_id)
+            select(User).join(GroupMember, GroupMember.user_id == User.id).where(GroupMember.group_id == group_id)
         )
-        
-        for member in members.scalars().all():
-            user = await session.execute(select(User).where(User.id == member.user_id))
-            user = user.scalar()
-            if user:
-                # Skip author since they already got the question
-                if user.id == author_user.id:
-                    continue
-                
-                # Admin should ALWAYS get approved questions in the group
-                if user.id == admin_user_id:
-                    await send_question_to_user(bot, user, question)
-                    # No badge notification for admin (they just approved it)
-                    continue
-                    
-                # For other members: check queue and send accordingly
-                unanswered_count = await get_unanswered_questions_count(user.id, question.group_id)
-                
-                if unanswered_count == 0:  # Queue is empty, push immediately
-                    await send_question_to_user(bot, user, question)
-                    await send_badge_notification(bot, user.id, "📝 New question available!")
-                else:
-                    # User has questions in queue, just send badge notification
-                    # Question will be shown when they finish current queue
-                    await send_badge_notification(bot, user.id, "📝 New question available!")
\ No newline at end of file
+        members = members.scalars().all()
+        groups_count = {}
+        if members:
+            rows = await session.execute(
+                select(GroupMember.user_id, func.count(GroupMember.id))
+                .where(GroupMember.user_id.in_([m.id for m in members]))
+                .group_by(GroupMember.user_id)
+            )
+            groups_count = dict(rows.all())
+        # Queue size before this batch: approved questions of the catalog minus the new ones, minus answers
+        catalog = await get_group_catalog(group_id, session)
+        old_ids = [qid for qid in catalog.approved_ids if qid not in new_ids]
+        answered = {}
+        if old_ids and members:
+            rows = await session.execute(
+                select(Answer.user_id, func.count(Answer.id))
+                .where(Answer.question_id.in_(old_ids), Answer.user_id.in_([m.id for m in members]))
+                .group_by(Answer.user_id)
+            )
+            answered = dict(rows.all())
+    notification = "📝 New question available!" if len(questions) == 1 else f"📝 {len(questions)} new questions available!"
+    group_name = group.name if group else None
+    for user in members:
+        if user.id in skip_user_ids:
+            continue
+        try:
+            if user.id == admin_user_id:
+                # Admin always gets approved questions, no badge (they just approved them)
+                await send_question_to_user(bot, user, questions[0], admin_user_id, group_id, groups_count.get(user.id, 1), group_name)
+                continue
+            if len(old_ids) - answered.get(user.id, 0) <= 0:
+                # Queue is empty, push immediately; otherwise it's shown when the queue is done
+                await send_question_to_user(bot, user, questions[0], admin_user_id, group_id, groups_count.get(user.id, 1), group_name)
+            await send_badge_notification(bot, user.id, notification)
+        except Exception as e:
+            logging.error(f"[deliver_approved_questions] Failed for user {user.id}: {e}")
@@ -3,14 +3,15 @@ from aiogram.filters import CommandStart, Command
 from aiogram.fsm.context import FSMContext
 from aiogram import F
 from src.texts.messages import INSTRUCTIONS_TEXT, GROUPS_WELCOME_ADMIN, GROUPS_WELCOME, GROUPS_PROFILE_SETUP, GROUPS_FIND_MATCH, GROUPS_SELECT, get_message, TOKEN_EXTEND, TOKEN_EXTENDED, BTN_SWITCH_TO, BTN_CREATE_GROUP, BTN_GOT_IT
-from src.loader import bot, dp, redis, VERSION
+from src.loader import bot, dp, VERSION
+from src.utils.version_gate import current_version
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardRemove
 from src.services.questions import get_next_unanswered_question
 from src.handlers.questions import send_question_to_user
 from src.services.groups import get_user_groups, is_group_creator, is_onboarded, get_group_balance, join_group_by_code_service, ensure_admin_in_db
 from src.services.onboarding import is_onboarding_complete_service
 from src.db import AsyncSessionLocal
-from sqlalchemy import select, and_
+from sqlalchemy import select
 from src.models import User, GroupMember, GroupCreator, Question
 from src.keyboards.groups import get_user_keyboard, get_admin_keyboard, get_group_reply_keyboard
 from src.utils.redis import get_internal_user_id, set_telegram_mapping, update_ttl, get_or_restore_internal_user_id
@@ -19,114 +20,11 @@ import os
 from src.utils.badges import send_initial_badge_if_needed
 
 router = Router()
-print('System router loaded')
 
 async def send_pending_connection_requests(bot, user_id: int):
     """Отправить все пендинг запросы на подключение пользователю при рестарте"""
-    from src.models import MatchStatus, GroupMember
-    from src.utils.redis import get_telegram_user_id
-    from src.services.groups import find_best_match
-    
-    requests_sent = False
-    
-    async with AsyncSessionLocal() as session:
-        user = await session.execute(select(User).where(User.id == user_id))
-        user = user.scalar()
-        if not user or not user.current_group_id:
-            return requests_sent
-        
-        # Найти все входящие пендинг запросы для этого пользователя
-        pending_requests = await session.execute(select(MatchStatus).where(
-            MatchStatus.match_user_id == user_id,
-            MatchStatus.group_id == user.current_group_id,
-            MatchStatus.status == "pending"
-        ))
-        pending_requests = pending_requests.scalars().all()
-        
-        if not pending_requests:
-            return requests_sent
-        
-        member = await session.execute(select(GroupMember).where(
-            GroupMember.user_id == user_id, 
-            GroupMember.group_id == user.current_group_id))
-        member = member.scalar()
-        
-        for request in pending_requests:
-            initiator_user = await session.execute(select(User).where(User.id == request.user_id))
-            initiator_user = initiator_user.scalar()
-            initiator_member = await session.execute(select(GroupMember).where(
-                GroupMember.user_id == request.user_id, 
-                GroupMember.group_id == user.current_group_id))
-            initiator_member = initiator_member.scalar()
-            
-            if not initiator_user or not initiator_member:
-                continue
-            
-            # Получить данные мэтча для отображения
-            reverse_match = await find_best_match(user_id, user.current_group_id, exclude_user_ids=[])
-            if reverse_match and reverse_match.get('user_id') == initiator_user.id:
-                similarity = reverse_match['similarity']
-                common_questions = reverse_match['common_questions']
-                distance_info = reverse_match['distance_info']
-            else:
-                # Fallback значения
-                similarity = 85
-                common_questions = 3
-                # Calculate distance manually
-                from src.utils.distance import get_match_distance_info
-                distance_info = get_match_distance_info(member, initiator_member) if member else "📍 Location not specified"
-            
-            try:
-                # Отправить уведомление о запросе
-                request_text = get_message("MATCH_INCOMING_REQUEST", user=user, 
-                                         nickname=initiator_member.nickname if initiator_member else "Unknown")
-                
-                # Карточка мэтча
-                intro_text = initiator_member.intro if initiator_member and initiator_member.intro else ""
-                match_text = get_message("MATCH_FOUND", user=user, 
-                                       nickname=initiator_member.nickname if initiator_member else "Unknown", 
-                                       intro=intro_text, similarity=similarity, 
-                                       common_questions=common_questions, 
-                                       distance_info=distance_info if 'distance_info' in locals() else "📍 Location not specified")
-                
-                # Кнопки для ответа
-                from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-                kb = InlineKeyboardMarkup(inline_keyboard=[
-                    [
-                        InlineKeyboardButton(text=get_message("BTN_ACCEPT_MATCH", user=user), 
-                                           callback_data=f"accept_match_{initiator_user.id}"),
-                        InlineKeyboardButton(text=get_message("BTN_DECLINE_MATCH", user=user), 
-                                           callback_data=f"decline_match_{initiator_user.id}")
-                    ],
-                    [
-                        InlineKeyboardButton(text=get_message("BTN_BLOCK_MATCH", user=user), 
-                                           callback_data=f"block_match_{initiator_user.id}")
-                    ]
-                ])
-                
-                # Получить Telegram ID пользователя
-                user_telegram_id = await get_telegram_user_id(user_id)
-                if not user_telegram_id:
-                    continue
-                
-                # Отправить уведомление
-                await bot.send_message(user_telegram_id, request_text, parse_mode="HTML")
-                
-                # Отправить карточку мэтча с фото и кнопками
-                if initiator_member and initiator_member.photo_url:
-                    await bot.send_photo(user_telegram_id, initiator_member.photo_url, 
-                                       caption=match_text, reply_markup=kb, parse_mode="HTML")
-                else:
-                    await bot.send_message(user_telegram_id, match_text, 
-                                         reply_markup=kb, parse_mode="HTML")
-                
-                requests_sent = True
-                    
-            except Exception as e:
-                import logging
-                logging.error(f"[send_pending_connection_requests] Failed to send request from user_id={initiator_user.id} to user_id={user_id}: {e}")
-    
-    return requests_sent
+    from src.services.match_requests import replay_pending_requests
+    return await replay_pending_requests(bot, user_id)
 
 async def hide_instructions_and_mygroups_by_message(message, state):
     """Hide previous instructions and mygroups messages by message reference"""
@@ -176,15 +74,6 @@ async def instructions(message: types.Message, state: FSMContext):
         # Use new function with button
         msg_id = await show_instructions_with_button(message.bot, user or message.from_user, message.chat.id)
         await state.update_data(instructions_msg_id=msg_id)
-        # --- Version check ---
-        user_data = await state.get_data()
-        user_version = user_data.get('bot_version')
-        current_version = await redis.get('bot_version')
-        if user_version and current_version and user_version != current_version:
-            await message.answer("A new version of the bot has been released. Please click /start to update.")
-            await state.clear()
-            await state.update_data(bot_version=current_version)
-            return
     except Exception as e:
         logging.exception(f"Error in /instructions handler: {e}")
 
@@ -228,17 +117,8 @@ async def start(message: types.Message, state: FSMContext):
         # --- Get internal_user_id centrally ---
         internal_user_id = await get_or_restore_internal_user_id(state, telegram_user_id)
         await state.update_data(internal_user_id=internal_user_id)
-        # --- Version check ---
-        user_data = await state.get_data()
-        user_version = user_data.get('bot_version')
-        current_version = await redis.get('bot_version')
-        if user_version and current_version and user_version != current_version:
-            await message.answer("A new version of the bot has been released. Please click /start to update.")
-            await state.clear()
-            await state.update_data(bot_version=current_version)
-            return
-        # After successful start, update version in state
-        await state.update_data(bot_version=current_version)
+        # Outdated users were stopped by VersionGateMiddleware, stamp the version for new ones
+        await state.update_data(bot_version=current_version())
         # --- Fixed deeplink argument parsing ---
         args = None
         if message.text:
@@ -279,7 +159,6 @@ async def start(message: types.Message, state: FSMContext):
         await message.answer(get_message(GROUPS_SELECT, user), reply_markup=kb)
         # --- PUSH первого неотвеченного вопроса, если есть ---
         from src.db import AsyncSessionLocal
-        from src.models import Question, Answer
         from src.handlers.questions import send_question_to_user
         async with AsyncSessionLocal() as session:
             user_obj = await session.execute(select(User).where(User.id == internal_user_id))
@@ -296,20 +175,9 @@ async def start(message: types.Message, state: FSMContext):
                     user_obj.current_group_id = None
                     await session.commit()
                 else:
-                    questions = await session.execute(
-                        select(Question).where(
-                            Question.group_id == user_obj.current_group_id,
-                            Question.is_deleted == 0,
-                            Question.status == "approved"
-                        ).order_by(Question.created_at)
-                    )
-                    questions = questions.scalars().all()
-                    for q in questions:
-                        ans = await session.execute(select(Answer).where(and_(Answer.question_id == q.id, Answer.user_id == user_obj.id)))
-                        ans = ans.scalar()
-                        if not ans:
-                            await send_question_to_user(message.bot, user_obj, q)
-                            break
+                    next_q = await get_next_unanswered_question(session, user_obj.current_group_id, user_obj.id)
+                    if next_q:
+                        await send_question_to_user(message.bot, user_obj, next_q)
         
         # Send initial badge if user has pending questions/matches
         await send_initial_badge_if_needed(message.bot, internal_user_id, user_obj.current_group_id if user_obj else None)
@@ -415,7 +283,6 @@ async def remove_admin_command(message: types.Message, state: FSMContext):
 
 @router.callback_query(F.data == "extend_token")
 async def extend_token_callback(callback: types.CallbackQuery, state: FSMContext):
-    from src.utils.redis import update_ttl
     telegram_user_id = callback.from_user.id
     await update_ttl(telegram_user_id)
     # Get user for localization
@@ -431,7 +298,6 @@ async def extend_token_callback(callback: types.CallbackQuery, state: FSMContext
 
 @router.message(Command("myid"))
 async def myid_command(message: types.Message, state: FSMContext):
-    from src.utils.redis import get_or_restore_internal_user_id
     user_id = await get_or_restore_internal_user_id(state, message.from_user.id)
     if not user_id:
         await message.answer("User not found. Please use /start first.")
@@ -449,7 +315,6 @@ async def add_creator_command(message: types.Message, state: FSMContext):
         await message.answer("You are not authorized to use this command.")
         return
     telegram_id = int(args[1])
-    from src.utils.redis import get_or_restore_internal_user_id
     internal_user_id = await get_or_restore_internal_user_id(state, telegram_id)
     from src.models import GroupCreator, User
     async with AsyncSessionLocal() as session:
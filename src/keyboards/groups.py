@@ -1,7 +1,10 @@
 # Generate keyboards for groups 
+from functools import lru_cache
+
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
 from src.constants import POINTS_FOR_MATCH
-from src.texts.messages import get_message, BTN_CREATE_GROUP, BTN_JOIN_GROUP, BTN_SWITCH_TO, BTN_DELETE_GROUP, BTN_LEAVE_GROUP, BTN_DELETE, BTN_CANCEL, BTN_SEND_LOCATION, BTN_WHO_IS_VIBING
+from src.utils.callback_codec import MatchNavCallback, MatchActionCallback
+from src.texts.messages import get_message, CATALOG, MATCH_PREV, MATCH_NEXT, MATCH_SHOW_AGAIN, MATCH_DONT_SHOW, BTN_CONNECT, BTN_CREATE_GROUP, BTN_JOIN_GROUP, BTN_SWITCH_TO, BTN_DELETE_GROUP, BTN_LEAVE_GROUP, BTN_DELETE, BTN_CANCEL, BTN_SEND_LOCATION, BTN_WHO_IS_VIBING
 
 def get_admin_keyboard(groups, user):
     kb = [[
@@ -55,4 +58,20 @@ def get_group_reply_keyboard(user):
         keyboard=[[KeyboardButton(text=get_message(BTN_WHO_IS_VIBING, user=user, points=POINTS_FOR_MATCH))]],
         resize_keyboard=True,
         one_time_keyboard=False
-    ) 
\ No newline at end of file
+    )
+
+@lru_cache(maxsize=4096)
+def get_match_keyboard(match_user_id, index, total, lang):
+    """Match card keyboard with prev/next navigation; cached, don't mutate the result."""
+    messages = CATALOG[lang]
+    nav_row = []
+    if index > 0:
+        nav_row.append(InlineKeyboardButton(text=messages[MATCH_PREV], callback_data=MatchNavCallback(index=index - 1).pack()))
+    if index < total - 1:
+        nav_row.append(InlineKeyboardButton(text=messages[MATCH_NEXT], callback_data=MatchNavCallback(index=index + 1).pack()))
+    return InlineKeyboardMarkup(inline_keyboard=[
+        *([nav_row] if nav_row else []),
+        [InlineKeyboardButton(text=messages[BTN_CONNECT], callback_data=MatchActionCallback(action="c", user_id=match_user_id).pack())],
+        [InlineKeyboardButton(text=messages[MATCH_SHOW_AGAIN], callback_data=MatchActionCallback(action="p", user_id=match_user_id).pack())],
+        [InlineKeyboardButton(text=messages[MATCH_DONT_SHOW], callback_data=MatchActionCallback(action="h", user_id=match_user_id).pack())]
+    ])
@@ -1,6 +1,9 @@
 # Generate keyboards for questions and answers 
+from functools import lru_cache
+
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
-from src.texts.messages import QUESTION_DELETE, QUESTION_LOAD_MORE
+from src.texts.messages import CATALOG, DEFAULT_LANGUAGE, QUESTION_DELETE, QUESTION_LOAD_MORE
+from src.utils.callback_codec import AnswerCallback, DeleteQuestionCallback, HistoryMoreCallback
 
 ANSWER_VALUES = [
     (-2, "😠"),
@@ -11,20 +14,34 @@ ANSWER_VALUES = [
 ]
 ANSWER_VALUE_TO_EMOJI = dict(ANSWER_VALUES)
 
-def get_answer_keyboard(question_id, is_author=False, is_creator=False):
-    answer_buttons = [InlineKeyboardButton(text=emoji, callback_data=f"answer_{question_id}_{val}") for val, emoji in ANSWER_VALUES]
-    keyboard = [answer_buttons]
-    if is_author or is_creator:
-        keyboard.append([InlineKeyboardButton(text="Delete", callback_data=f"delete_question_{question_id}")])
+QUESTION_KEYBOARD_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=QUESTION_KEYBOARD_CACHE_SIZE)
+def get_question_keyboard(question_id, selected=None, can_delete=False, lang=DEFAULT_LANGUAGE):
+    """Question card keyboard: all answer buttons, or only the selected one; cached, don't mutate the result."""
+    values = ANSWER_VALUES if selected is None else [(selected, ANSWER_VALUE_TO_EMOJI[selected])]
+    row = [InlineKeyboardButton(text=emoji, callback_data=AnswerCallback(question_id=question_id, value=val).pack()) for val, emoji in values]
+    keyboard = [row]
+    if can_delete:
+        delete_button = InlineKeyboardButton(text=CATALOG[lang][QUESTION_DELETE], callback_data=DeleteQuestionCallback(question_id=question_id).pack())
+        if selected is None:
+            keyboard.append([delete_button])
+        else:
+            row.append(delete_button)
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
-def get_delete_keyboard(question_id):
-    return InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text=QUESTION_DELETE, callback_data=f"delete_question_{question_id}")]])
+def get_answer_keyboard(question_id, is_author=False, is_creator=False, lang=DEFAULT_LANGUAGE):
+    return get_question_keyboard(question_id, None, is_author or is_creator, lang)
+
+def get_delete_keyboard(question_id, lang=DEFAULT_LANGUAGE):
+    return InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text=CATALOG[lang][QUESTION_DELETE], callback_data=DeleteQuestionCallback(question_id=question_id).pack())]])
 
-def get_load_more_keyboard(page, user):
+def get_load_more_keyboard(cursor, user):
+    """cursor is the keyset position of the last shown answer (see encode_history_cursor)."""
     from src.texts.messages import get_message, QUESTION_LOAD_MORE
     return InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text=get_message(QUESTION_LOAD_MORE, user), callback_data=f"load_answered_questions_more_{page}")]
+            [InlineKeyboardButton(text=get_message(QUESTION_LOAD_MORE, user), callback_data=HistoryMoreCallback(cursor=cursor).pack())]
         ]
     ) 
\ No newline at end of file
@@ -6,10 +6,16 @@
 # - If version changed — users will see restart message and can't use bot until they press /start.
 # - Mechanism is fully under your control: change VERSION only if really need state reset for all users.
 # ---
-from aiogram import Bot, Dispatcher
-from src.config import BOT_TOKEN
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from src.config import BOT_TOKEN, TELEGRAM_API_URL
 import os
-import redis.asyncio as aioredis
+from src.utils.fsm_storage import CompactRedisStorage, SnapshotDispatcher
+from src.utils.redis import TTL_SECONDS
+from src.utils.redis_manager import redis, binary_redis as fsm_redis
+from src.utils.user_lock import UserLockMiddleware
+from src.utils.version_gate import VersionGateMiddleware, publish_bot_version
 
 VERSION = None
 try:
@@ -18,12 +24,15 @@ try:
 except Exception:
     VERSION = 'dev'
 
-REDIS_URL = os.getenv("REDIS_PUBLIC_URL", os.getenv("REDIS_URL", "redis://localhost:6379/0"))
-redis = aioredis.from_url(REDIS_URL, decode_responses=True)
-
 async def set_bot_version():
     if VERSION:
-        await redis.set('bot_version', VERSION)
+        await publish_bot_version(VERSION, redis)
  
-bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher() 
\ No newline at end of file
+if TELEGRAM_API_URL:
+    bot = Bot(token=BOT_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)))
+else:
+    bot = Bot(token=BOT_TOKEN)
+dp = SnapshotDispatcher(storage=CompactRedisStorage(fsm_redis, ttl=TTL_SECONDS))
+dp.update.outer_middleware(UserLockMiddleware(redis))
+dp.update.outer_middleware(VersionGateMiddleware())
+ 
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, BigInteger, String, Text, ForeignKey, Float, DateTime, UniqueConstraint
+from sqlalchemy import Column, Integer, BigInteger, String, Text, ForeignKey, Float, DateTime, UniqueConstraint, Index, LargeBinary
 from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime, UTC
 
@@ -43,6 +43,8 @@ class GroupMember(Base):
     geolocation_lon = Column(Float)
     city = Column(String(128), nullable=True)
     country = Column(String(128), nullable=True)  # Country of the user (optional)
+    city_id = Column(Integer, nullable=True)  # canonical city id from src/data gazetteer
+    geohash = Column(String(12), nullable=True)  # geohash bucket of geolocation, for distance prefilter
     role = Column(String(32), default='member')
     joined_at = Column(DateTime(timezone=True), default=lambda: datetime.now(UTC))
     balance = Column(Integer, default=0, nullable=False)
@@ -53,7 +55,10 @@ class GroupMember(Base):
     group = relationship('Group', back_populates='members')
     user = relationship('User', back_populates='memberships')
     
-    __table_args__ = (UniqueConstraint('group_id', 'user_id', name='_group_user_uc'),)
+    __table_args__ = (
+        UniqueConstraint('group_id', 'user_id', name='_group_user_uc'),
+        Index('ix_group_members_group_geohash', 'group_id', 'geohash'),
+    )
 
 class GroupCreator(Base):
     __tablename__ = 'group_creators'
@@ -82,7 +87,9 @@ class Question(Base):
     group_id = Column(Integer, ForeignKey('groups.id', ondelete='CASCADE'), nullable=False, index=True)
     author_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     text = Column(Text, nullable=False)
-    embedding = Column(String, nullable=True)  # for future AI
+    embedding = Column(LargeBinary, nullable=True)  # packed int8/float16 vector, see src.utils.embeddings
+    minhash = Column(LargeBinary, nullable=True)  # near-duplicate signature, see src.utils.near_duplicates
+    moderation_flags = Column(String(255), nullable=True)  # set once scored by the batch moderation, see src.services.moderation
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(UTC))
     is_deleted = Column(Integer, default=0)  # soft delete
     status = Column(String(16), default="pending", nullable=False)  # 'pending', 'approved', 'rejected'
@@ -99,11 +106,27 @@ class Answer(Base):
     value = Column(Integer, nullable=True)  # -2, -1, 0, 1, 2
     status = Column(String(16), default='delivered', nullable=False, index=True)  # delivered, answered
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(UTC))
-    __table_args__ = (UniqueConstraint('question_id', 'user_id'),)
+    __table_args__ = (
+        UniqueConstraint('question_id', 'user_id'),
+        Index('ix_answers_user_created', 'user_id', 'created_at', 'id'),  # keyset paging of answered history
+    )
 
     question = relationship('Question', back_populates='answers')
     user = relationship('User')
 
+class AnswerEvent(Base):
+    """Append-only log of answer changes (answered/changed/deleted), written in the same transaction as the answer."""
+    __tablename__ = 'answer_events'
+    id = Column(BigInteger, primary_key=True)
+    answer_id = Column(Integer, nullable=True)  # no FK: events outlive deleted answers
+    question_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    group_id = Column(Integer, nullable=False, index=True)
+    event_type = Column(String(16), nullable=False)  # 'answered' | 'changed' | 'deleted'
+    old_value = Column(Integer, nullable=True)
+    new_value = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(UTC))
+
 class MatchStatus(Base):
     __tablename__ = 'match_statuses'
     id = Column(Integer, primary_key=True)
@@ -1,9 +1,13 @@
+from src.utils.callback_codec import callback_table
 from src.handlers.system import router as system_router
 from src.handlers.groups import router as groups_router
 from src.handlers.onboarding import router as onboarding_router
 from src.handlers.questions import router as questions_router
+import src.handlers.moderation  # registers review queue callbacks in callback_table
 
 all_routers = [
+    # Typed callbacks first: one prefix lookup instead of every startswith filter below
+    callback_table.router,
     system_router,
     groups_router,
     onboarding_router,
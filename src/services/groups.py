@@ -1,12 +1,22 @@
 from typing import List, Dict, Optional, Any
 from src.db import AsyncSessionLocal
-from src.models import User, Group, GroupMember, GroupCreator, Answer, Question, MatchStatus, BannedUser
+from src.models import User, Group, GroupMember, GroupCreator, Answer, Question, MatchStatus
 from src.keyboards.groups import get_admin_keyboard, get_user_keyboard, get_group_main_keyboard
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 import os, logging
-from sqlalchemy import select, func
+from sqlalchemy import select, func, update, or_
+from sqlalchemy.exc import IntegrityError
 from src.utils.invite_code import generate_unique_invite_code
-from src.constants import WELCOME_BONUS
+from src.utils.join_cache import get_group_by_code, is_banned, invalidate_invite_code
+from src.constants import WELCOME_BONUS, MATCH_WITHIN_KM, MATCH_PREFILTER_MIN_MEMBERS
+from src.utils.distance import get_match_distance_info
+from src.utils.geo import geohash_prefixes_within, member_distances_km
+from src.utils.gazetteer import member_coordinates
+from src.utils.answer_events import publish_answer_events
+from src.utils.question_catalog import invalidate_group_catalog
+from src.utils.near_duplicates import drop_group_index
+from src.services.questions import delete_answers_logged
+from src.services.match_requests import pair_similarities
 from src.utils.redis import get_or_restore_internal_user_id
 from src.texts.messages import get_message, GROUPS_JOIN_NOT_FOUND, GROUPS_JOINED, GROUPS_JOIN_ONBOARDING, USER_BANNED_JOIN_ATTEMPT
 from aiogram import types
@@ -84,6 +94,32 @@ async def get_group_balance(user_id: int, group_id: int) -> int:
         balance = result.scalar()
         return balance if balance is not None else 0
 
+async def add_to_balance(session, user_id: int, group_id: int, amount: int) -> Optional[int]:
+    """Atomically add points to member balance (UPDATE ... RETURNING), returns new balance or None if not a member."""
+    result = await session.execute(
+        update(GroupMember)
+        .where(GroupMember.user_id == user_id, GroupMember.group_id == group_id)
+        .values(balance=GroupMember.balance + amount)
+        .returning(GroupMember.balance)
+        .execution_options(synchronize_session=False)
+    )
+    return result.scalar()
+
+async def charge_balance(session, user_id: int, group_id: int, amount: int) -> Optional[int]:
+    """Atomically deduct points only if balance is enough, returns new balance or None if not enough points."""
+    result = await session.execute(
+        update(GroupMember)
+        .where(
+            GroupMember.user_id == user_id,
+            GroupMember.group_id == group_id,
+            GroupMember.balance >= amount
+        )
+        .values(balance=GroupMember.balance - amount)
+        .returning(GroupMember.balance)
+        .execution_options(synchronize_session=False)
+    )
+    return result.scalar()
+
 async def get_group_members(group_id: int) -> List[Dict[str, Any]]:
     """Return all members of a group with onboarding status."""
     async with AsyncSessionLocal() as session:
@@ -187,9 +223,21 @@ async def create_group_service(user_id: int, name: str, description: str) -> dic
             await session.flush()
             await session.commit()
             print(f"[DEBUG] User created and committed (create_group_service): id={user.id}")
-        group = Group(name=name, description=description, invite_code=invite_code, creator_user_id=user.id)
-        session.add(group)
-        await session.flush()
+        creator_id = user.id
+        for attempt in range(2):
+            group = Group(name=name, description=description, invite_code=invite_code, creator_user_id=creator_id)
+            session.add(group)
+            try:
+                await session.flush()
+                break
+            except IntegrityError:
+                # The code was taken after it was drawn (e.g. a fallback draw raced another group)
+                await session.rollback()
+                if attempt:
+                    raise
+                logging.warning(f"[create_group_service] Invite code {invite_code} taken, retrying with a new one")
+                invite_code = await generate_unique_invite_code()
+                user = await session.get(User, creator_id)  # expired by the rollback
         member = await session.execute(select(GroupMember).where(GroupMember.user_id == user.id, GroupMember.group_id == group.id))
         member = member.scalar()
         if not member:
@@ -202,35 +250,64 @@ async def create_group_service(user_id: int, name: str, description: str) -> dic
 async def join_group_by_code_service(user_id: int, code: str) -> dict | None:
     """Вступить в группу по коду. Вернуть данные группы или None."""
     async with AsyncSessionLocal() as session:
-        group = await session.execute(select(Group).where(Group.invite_code == code))
-        group = group.scalar()
+        # Group and bans come from Redis, so a join is usually the membership statement alone
+        group = await get_group_by_code(session, code)
         if not group:
             return None
-        
-        # Check if user is banned from this group
-        banned_check = await session.execute(select(BannedUser).where(
-            BannedUser.user_id == user_id,
-            BannedUser.group_id == group.id
-        ))
-        if banned_check.scalar():
+        if await is_banned(session, group["id"], user_id):
             return {"error": "banned", "message": "You are banned from this group"}
-        user = await session.execute(select(User).where(User.id == user_id))
-        user = user.scalar()
-        if not user:
-            user = User()
-            session.add(user)
-            await session.flush()
-        member = await session.execute(select(GroupMember).where(GroupMember.user_id == user.id, GroupMember.group_id == group.id))
-        member = member.scalar()
-        if not member:
-            member = GroupMember(user_id=user.id, group_id=group.id, balance=WELCOME_BONUS)
-            session.add(member)
-            user.current_group_id = group.id
-            await session.commit()
-            onboarded = await is_onboarded(user_id, group.id)
-            if not onboarded:
-                return {"id": group.id, "name": group.name, "description": group.description, "needs_onboarding": True}
-        return {"id": group.id, "name": group.name, "description": group.description, "needs_onboarding": False}
+        try:
+            joined = await add_group_member(session, user_id, group["id"])
+        except IntegrityError:
+            await session.rollback()
+            exists = await session.execute(select(Group.id).where(Group.id == group["id"]))
+            if exists.first() is None:
+                # Stale cache entry of a deleted group
+                await invalidate_invite_code(code)
+                return None
+            # No such user yet: the slow path creates one
+            joined = await _add_group_member_creating_user(session, user_id, group["id"])
+        # A new member has no profile in the group yet
+        return {**group, "needs_onboarding": joined}
+
+async def add_group_member(session, user_id: int, group_id: int) -> bool:
+    """
+    One statement: insert the membership (ON CONFLICT DO NOTHING) and make the group current
+    for a new member. True if the user was not a member before.
+    """
+    from sqlalchemy.dialects.postgresql import insert as pg_insert
+    inserted = (
+        pg_insert(GroupMember)
+        .values(user_id=user_id, group_id=group_id, balance=WELCOME_BONUS)
+        .on_conflict_do_nothing(constraint="_group_user_uc")
+        .returning(GroupMember.user_id)
+        .cte("inserted")
+    )
+    updated = await session.execute(
+        update(User)
+        .where(User.id.in_(select(inserted.c.user_id)))
+        .values(current_group_id=group_id)
+        .returning(User.id)
+        .execution_options(synchronize_session=False)  # no User objects in this session to refresh
+    )
+    joined = updated.first() is not None
+    await session.commit()
+    return joined
+
+async def _add_group_member_creating_user(session, user_id: int, group_id: int) -> bool:
+    user = await session.execute(select(User).where(User.id == user_id))
+    user = user.scalar()
+    if not user:
+        user = User()
+        session.add(user)
+        await session.flush()
+    member = await session.execute(select(GroupMember).where(GroupMember.user_id == user.id, GroupMember.group_id == group_id))
+    if member.scalar():
+        return False
+    session.add(GroupMember(user_id=user.id, group_id=group_id, balance=WELCOME_BONUS))
+    user.current_group_id = group_id
+    await session.commit()
+    return not await is_onboarded(user.id, group_id)
 
 async def switch_group_service(user_id: int, group_id: int) -> dict:
     """Сменить текущую группу пользователя. Вернуть статус и данные группы."""
@@ -269,9 +346,15 @@ async def delete_group_service(group_id: int) -> dict:
             if user and user.id != group.creator_user_id:
                 notify_users.append({"group_name": group.name})
         await session.commit()
+        # Answers would go with the group by cascade, delete them explicitly so they are logged
+        events = await delete_answers_logged(session, Answer.question_id.in_(select(Question.id).where(Question.group_id == group_id)))
         await session.execute(GroupMember.__table__.delete().where(GroupMember.group_id == group_id))
         await session.execute(Group.__table__.delete().where(Group.id == group_id))
         await session.commit()
+        await invalidate_invite_code(group.invite_code)
+        await publish_answer_events(events)
+        await invalidate_group_catalog(group_id)
+        drop_group_index(group_id)
         return {"ok": True, "notify_users": notify_users}
 
 async def leave_group_service(user_id: int, group_id: int) -> dict:
@@ -281,21 +364,18 @@ async def leave_group_service(user_id: int, group_id: int) -> dict:
         user = user.scalar()
         
         # Delete all user's answers for questions in this group
-        questions_in_group = await session.execute(select(Question.id).where(Question.group_id == group_id))
-        question_ids = [q[0] for q in questions_in_group.all()]
-        if question_ids:
-            await session.execute(
-                Answer.__table__.delete().where(
-                    Answer.user_id == user.id,
-                    Answer.question_id.in_(question_ids)
-                )
-            )
+        events = await delete_answers_logged(
+            session,
+            Answer.user_id == user.id,
+            Answer.question_id.in_(select(Question.id).where(Question.group_id == group_id))
+        )
         
         # Delete group membership
         await session.execute(
             GroupMember.__table__.delete().where(GroupMember.user_id == user.id, GroupMember.group_id == group_id)
         )
         await session.commit()
+        await publish_answer_events(events)
         if user.current_group_id == group_id:
             user.current_group_id = None
             await session.commit()
@@ -422,7 +502,6 @@ async def find_best_match(user_id: int, group_id: int, exclude_user_ids: list[in
             match_user = match_user.scalar()
             
             # Calculate distance information
-            from src.utils.distance import get_match_distance_info
             distance_info = get_match_distance_info(current_member, best_match)
             
             return {
@@ -439,8 +518,9 @@ async def find_best_match(user_id: int, group_id: int, exclude_user_ids: list[in
             return {"not_enough_common": True}
         return None
 
-async def find_all_matches(user_id: int, group_id: int, exclude_user_ids: list[int] = None) -> list[dict]:
-    """Найти всех возможных мэтчей для пользователя, отсортированных по убыванию similarity."""
+async def find_all_matches(user_id: int, group_id: int, exclude_user_ids: list[int] = None, within_km: Optional[float] = None) -> list[dict]:
+    """Найти всех возможных мэтчей для пользователя, отсортированных по убыванию similarity.
+    within_km ограничивает кандидатов ближайшими geohash-ячейками (по умолчанию MATCH_WITHIN_KM для больших групп)."""
     exclude_user_ids = exclude_user_ids or []
     async with AsyncSessionLocal() as session:
         user = await session.execute(select(User).where(User.id == user_id))
@@ -485,15 +565,31 @@ async def find_all_matches(user_id: int, group_id: int, exclude_user_ids: list[i
         if not current_member:
             return []
         
+        # Optional geo prefilter: only nearby geohash buckets (and same-city members without coordinates)
+        if within_km is None and MATCH_WITHIN_KM:
+            group_size = await session.execute(select(func.count(GroupMember.id)).where(GroupMember.group_id == group_id))
+            if group_size.scalar() >= MATCH_PREFILTER_MIN_MEMBERS:
+                within_km = MATCH_WITHIN_KM
+        geo_filter = None
+        current_lat, current_lon = member_coordinates(current_member)
+        if within_km and current_lat is not None:
+            prefixes = geohash_prefixes_within(current_lat, current_lon, within_km)
+            geo_filter = or_(*[GroupMember.geohash.like(f"{prefix}%") for prefix in prefixes])
+            if current_member.city:
+                geo_filter = or_(geo_filter, GroupMember.geohash.is_(None) & (func.lower(GroupMember.city) == current_member.city.lower()))
+
         # Get all members with mutual gender preference
-        members = await session.execute(select(GroupMember).where(
+        members_query = select(GroupMember).where(
             GroupMember.group_id == group_id,
             GroupMember.user_id != user.id,
             GroupMember.nickname.isnot(None),
             GroupMember.photo_url.isnot(None),
             GroupMember.gender.isnot(None),
             GroupMember.looking_for.isnot(None)
-        ))
+        )
+        if geo_filter is not None:
+            members_query = members_query.where(geo_filter)
+        members = await session.execute(members_query)
         members = members.scalars().all()
         
         # Filter by mutual gender preferences
@@ -510,42 +606,41 @@ async def find_all_matches(user_id: int, group_id: int, exclude_user_ids: list[i
         if not filtered_members:
             return []
         
-        # Calculate similarity for all members
-        matches = []
-        for member in filtered_members:
-            if member.user_id in exclude_user_ids:
-                continue
-                
-            # Match answers
-            match_answers = await session.execute(
-                select(Answer.question_id, Answer.value).where(
-                    Answer.user_id == member.user_id,
-                    Answer.value.isnot(None),
-                    Answer.question_id.in_(user_answers.keys())
-                )
+        # Distances to all candidates in one vectorized pass
+        distances = dict(zip(
+            [member.user_id for member in filtered_members],
+            member_distances_km(current_member, filtered_members)
+        ))
+        if geo_filter is not None:
+            filtered_members = [
+                member for member in filtered_members
+                if distances[member.user_id] is None or distances[member.user_id] <= within_km
+            ]
+        
+        # Answers of all candidates to the user's questions in one query, similarities in one numpy pass
+        candidates = [member for member in filtered_members if member.user_id not in exclude_user_ids]
+        if not candidates:
+            return []
+        candidate_answers = await session.execute(
+            select(Answer.user_id, Answer.question_id, Answer.value).where(
+                Answer.user_id.in_([member.user_id for member in candidates]),
+                Answer.value.isnot(None),
+                Answer.question_id.in_(user_answers.keys())
             )
-            match_answers = {row[0]: row[1] for row in match_answers.all()}
-            if not match_answers:
-                continue
-            
-            # Calculate common questions and similarity
-            common_questions = set(user_answers.keys()) & set(match_answers.keys())
-            if len(common_questions) < 3:  # Need at least 3 common questions
+        )
+        by_user = {}
+        for answer_user_id, question_id, value in candidate_answers.all():
+            by_user.setdefault(answer_user_id, {})[question_id] = value
+        scores = pair_similarities(user_answers, by_user, [member.user_id for member in candidates])
+
+        matches = []
+        for member in candidates:
+            similarity, common_questions = scores[member.user_id]
+            if common_questions < 3:  # Need at least 3 common questions
                 continue
-                
-            # Calculate similarity
-            distance = sum(abs(user_answers[q] - match_answers[q]) for q in common_questions)
-            max_distance = 4 * len(common_questions)
-            similarity = round((1 - distance / max_distance) * 100)
-            
+
             # Calculate distance information
-            import logging
-            from src.utils.distance import get_match_distance_info
-            logging.warning(f"[find_all_matches] Calculating distance for user {current_member.user_id} -> {member.user_id}")
-            logging.warning(f"[find_all_matches] current_member: lat={getattr(current_member, 'geolocation_lat', None)}, lon={getattr(current_member, 'geolocation_lon', None)}, city={getattr(current_member, 'city', None)}, country={getattr(current_member, 'country', None)}")
-            logging.warning(f"[find_all_matches] member: lat={getattr(member, 'geolocation_lat', None)}, lon={getattr(member, 'geolocation_lon', None)}, city={getattr(member, 'city', None)}, country={getattr(member, 'country', None)}")
-            distance_info = get_match_distance_info(current_member, member)
-            logging.warning(f"[find_all_matches] Calculated distance_info: {distance_info}")
+            distance_info = get_match_distance_info(current_member, member, distances.get(member.user_id))
             
             matches.append({
                 "user_id": member.user_id,
@@ -553,7 +648,7 @@ async def find_all_matches(user_id: int, group_id: int, exclude_user_ids: list[i
                 "photo_url": member.photo_url,
                 "intro": member.intro,
                 "similarity": similarity,
-                "common_questions": len(common_questions),
+                "common_questions": common_questions,
                 "valid_users_count": len(filtered_members),
                 "distance_info": distance_info
             })
@@ -0,0 +1,139 @@
+"""
+Replay of incoming connection requests on /start
+Everything the cards need comes from three queries: the recipient with their membership, all pending
+requests joined with the initiators' users and memberships, and the answers of all of them in the
+group. Pair similarities are computed together with numpy instead of a group-wide match search per
+request, and the cards are sent in the background through the paced sender.
+"""
+import logging
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from sqlalchemy import select
+
+from src.db import AsyncSessionLocal
+from src.models import Answer, GroupMember, MatchStatus, Question, User
+from src.texts.messages import get_message, MATCH_INCOMING_REQUEST, MATCH_INCOMING_REQUESTS, MATCH_FOUND
+from src.utils.distance import get_match_distance_info
+from src.utils.geo import member_distances_km
+from src.utils.paced_sender import send_paced_in_background
+from src.utils.redis import get_telegram_user_id, redis
+
+# Both /start and the initial badge replay requests, only the first call within this window sends
+REPLAY_DEDUP_SECONDS = int(os.getenv("PENDING_REQUESTS_DEDUP_SECONDS", 30))
+
+
+def pair_similarities(user_answers: Dict[int, int], other_answers: Dict[int, Dict[int, int]], other_ids: List[int]) -> Dict[int, Tuple[int, int]]:
+    """{other_id: (similarity %, common questions)} with similarity = 1 - Σ|A_i-B_i| / (4*N) over common answers."""
+    if not other_ids or not user_answers:
+        return {other_id: (0, 0) for other_id in other_ids}
+    columns = {qid: i for i, qid in enumerate(user_answers)}
+    mine = np.array(list(user_answers.values()), dtype=np.float64)
+    theirs = np.full((len(other_ids), len(columns)), np.nan)
+    for row, other_id in enumerate(other_ids):
+        for qid, value in other_answers.get(other_id, {}).items():
+            if qid in columns:
+                theirs[row, columns[qid]] = value
+    diff = np.abs(theirs - mine)
+    common = np.count_nonzero(~np.isnan(diff), axis=1)
+    distance = np.nansum(diff, axis=1)
+    similarity = np.where(common > 0, np.round((1 - distance / (4 * np.maximum(common, 1))) * 100), 0)
+    return {other_id: (int(similarity[row]), int(common[row])) for row, other_id in enumerate(other_ids)}
+
+
+async def load_pending_requests(session, user_id: int):
+    """(user, member, [(initiator_member, similarity, common)]) for pending requests in user's current group."""
+    row = await session.execute(
+        select(User, GroupMember)
+        .outerjoin(GroupMember, (GroupMember.user_id == User.id) & (GroupMember.group_id == User.current_group_id))
+        .where(User.id == user_id)
+    )
+    row = row.first()
+    if not row or not row[0].current_group_id:
+        return None, None, []
+    user, member = row
+    group_id = user.current_group_id
+    initiators = await session.execute(
+        select(GroupMember)
+        .join(MatchStatus, (MatchStatus.user_id == GroupMember.user_id) & (MatchStatus.group_id == GroupMember.group_id))
+        .join(User, User.id == MatchStatus.user_id)
+        .where(MatchStatus.match_user_id == user_id, MatchStatus.group_id == group_id, MatchStatus.status == "pending")
+        .order_by(MatchStatus.created_at, MatchStatus.id)
+    )
+    initiators = initiators.scalars().all()
+    if not initiators:
+        return user, member, []
+    scores = await request_similarities(session, group_id, user_id, [m.user_id for m in initiators])
+    return user, member, [(m, *scores[m.user_id]) for m in initiators]
+
+
+async def request_similarities(session, group_id: int, user_id: int, initiator_ids: List[int]) -> Dict[int, Tuple[int, int]]:
+    """{initiator_id: (similarity %, common questions)} from one query over the answers of all of them in the group."""
+    answers = await session.execute(
+        select(Answer.user_id, Answer.question_id, Answer.value)
+        .join(Question, Question.id == Answer.question_id)
+        .where(
+            Answer.user_id.in_([user_id] + list(initiator_ids)), Answer.value.isnot(None),
+            Question.group_id == group_id, Question.is_deleted == 0
+        )
+    )
+    by_user: Dict[int, Dict[int, int]] = {}
+    for answer_user_id, question_id, value in answers.all():
+        by_user.setdefault(answer_user_id, {})[question_id] = value
+    return pair_similarities(by_user.get(user_id, {}), by_user, list(initiator_ids))
+
+
+def build_request_card(user, member, initiator, similarity: int, common: int, distance_km=None):
+    """Card text and accept/decline/block keyboard for one incoming request."""
+    distance_info = get_match_distance_info(member, initiator, distance_km) if member else "📍 Location not specified"
+    text = get_message(
+        MATCH_FOUND, user=user, nickname=initiator.nickname or "Unknown", intro=initiator.intro or "",
+        similarity=similarity, common_questions=common, distance_info=distance_info
+    )
+    kb = InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text=get_message("BTN_ACCEPT_MATCH", user=user), callback_data=f"accept_match_{initiator.user_id}"),
+            InlineKeyboardButton(text=get_message("BTN_DECLINE_MATCH", user=user), callback_data=f"decline_match_{initiator.user_id}")
+        ],
+        [
+            InlineKeyboardButton(text=get_message("BTN_BLOCK_MATCH", user=user), callback_data=f"block_match_{initiator.user_id}")
+        ]
+    ])
+    return text, kb
+
+
+async def replay_pending_requests(bot, user_id: int) -> bool:
+    """Sends all pending incoming requests of the current group (one header + one card each), True if any."""
+    async with AsyncSessionLocal() as session:
+        user, member, requests = await load_pending_requests(session, user_id)
+    if not requests:
+        return False
+    telegram_user_id = await get_telegram_user_id(user_id)
+    if not telegram_user_id:
+        return False
+    initiators = [initiator for initiator, _, _ in requests]
+    distances = member_distances_km(member, initiators) if member else [None] * len(initiators)
+    if len(requests) == 1:
+        header = get_message(MATCH_INCOMING_REQUEST, user=user, nickname=initiators[0].nickname or "Unknown")
+    else:
+        header = get_message(MATCH_INCOMING_REQUESTS, user=user, count=len(requests))
+    sends = [lambda: bot.send_message(telegram_user_id, header, parse_mode="HTML")]
+    for (initiator, similarity, common), distance_km in zip(requests, distances):
+        text, kb = build_request_card(user, member, initiator, similarity, common, distance_km)
+        if initiator.photo_url:
+            sends.append(lambda photo=initiator.photo_url, text=text, kb=kb: bot.send_photo(
+                telegram_user_id, photo, caption=text, reply_markup=kb, parse_mode="HTML"))
+        else:
+            sends.append(lambda text=text, kb=kb: bot.send_message(telegram_user_id, text, reply_markup=kb, parse_mode="HTML"))
+    # Set only once there is something to send: an empty replay must not hide requests arriving right after
+    try:
+        if not await redis.set(f"pending_replay:{user_id}", 1, nx=True, ex=REPLAY_DEDUP_SECONDS):
+            return False
+    except Exception as e:
+        logging.warning(f"[replay_pending_requests] Dedup key unavailable: {e}")
+    # Paced sending can take a while for many requests, don't hold the /start handler (and the user lock)
+    send_paced_in_background(sends, name=f"pending-requests-{user_id}")
+    logging.info(f"[replay_pending_requests] user_id={user_id}: {len(requests)} requests queued")
+    return True
@@ -0,0 +1,121 @@
+"""
+Batch moderation of pending questions
+Pending questions of a group are scored together: banned words, spam heuristics, author rate limit
+and near-duplicates. Confident cases are approved/rejected automatically, the rest get their flags
+stored in questions.moderation_flags and wait in the admin review queue.
+"""
+import os
+from collections import Counter
+from datetime import datetime, timedelta, UTC
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+
+from src.constants import POINTS_FOR_NEW_QUESTION
+from src.models import Question
+from src.services.groups import add_to_balance
+from src.services.questions import find_similar_questions
+from src.utils.moderation_rules import BANNED_WORDS, decide, spam_flags
+from src.utils.near_duplicates import NEAR_DUPLICATE_THRESHOLD
+
+MODERATION_AUTO_APPROVE = os.getenv("MODERATION_AUTO_APPROVE", "1") == "1"
+MODERATION_AUTO_REJECT = os.getenv("MODERATION_AUTO_REJECT", "1") == "1"
+MODERATION_MAX_PER_HOUR = int(os.getenv("MODERATION_MAX_PER_HOUR", 5))  # questions per author per group
+DUPLICATE_REJECT_SCORE = 0.9  # near-certain duplicates are rejected, lower similarity goes to review
+REVIEW_PAGE_SIZE = 5
+
+
+def flags_for_text(text: str) -> List[str]:
+    flags = [f"banned_word:{term}" for term in sorted(BANNED_WORDS.find(text))]
+    return flags + spam_flags(text)
+
+
+async def _recent_counts(session, group_id: int, author_ids) -> Dict[int, int]:
+    """Questions submitted by each author in the last hour (one grouped query)."""
+    since = datetime.now(UTC) - timedelta(hours=1)
+    rows = await session.execute(
+        select(Question.author_id, func.count(Question.id))
+        .where(Question.group_id == group_id, Question.author_id.in_(author_ids), Question.created_at >= since)
+        .group_by(Question.author_id)
+    )
+    return dict(rows.all())
+
+
+async def score_pending_questions(session, group_id: int) -> Dict[str, List[Question]]:
+    """Scores not yet moderated pending questions of the group and applies the verdicts (caller commits)."""
+    pending = await session.execute(
+        select(Question)
+        .where(Question.group_id == group_id, Question.status == "pending", Question.is_deleted == 0, Question.moderation_flags.is_(None))
+        .order_by(Question.created_at, Question.id)
+        # The delayed batch, the sweeper and other replicas may score the group at once: each row once
+        .with_for_update(skip_locked=True)
+    )
+    pending = pending.scalars().all()
+    result = {"approve": [], "reject": [], "review": []}
+    if not pending:
+        return result
+    recent = await _recent_counts(session, group_id, {q.author_id for q in pending})
+    in_batch = Counter(q.author_id for q in pending)
+    seen = Counter()
+    for question in pending:
+        flags = flags_for_text(question.text)
+        # Earlier questions of the hour (outside this batch) plus this one's position in the batch
+        seen[question.author_id] += 1
+        if recent.get(question.author_id, 0) - in_batch[question.author_id] + seen[question.author_id] > MODERATION_MAX_PER_HOUR:
+            flags.append("rate_limited")
+        _, similar = await find_similar_questions(session, group_id, question.text, limit=1, exclude_id=question.id)
+        # Only an earlier question counts, so the first of two duplicates in one batch survives
+        similar = [(candidate, score) for candidate, score in similar if candidate.id < question.id]
+        if similar and similar[0][1] >= NEAR_DUPLICATE_THRESHOLD:
+            candidate, score = similar[0]
+            flags.append(f"{'duplicate' if score >= DUPLICATE_REJECT_SCORE else 'similar'}:{candidate.id}")
+        verdict = decide(flags, MODERATION_AUTO_APPROVE, MODERATION_AUTO_REJECT)
+        if verdict.decision == "approve":
+            question.status = "approved"
+            question.moderation_flags = "auto"
+            await add_to_balance(session, question.author_id, group_id, POINTS_FOR_NEW_QUESTION)
+        elif verdict.decision == "reject":
+            question.status = "rejected"
+            question.moderation_flags = "auto," + ",".join(verdict.flags)
+        else:
+            question.moderation_flags = ",".join(verdict.flags) or "review"
+        result[verdict.decision].append(question)
+    return result
+
+
+async def get_review_page(session, group_id: int, page: int = 0) -> Tuple[List[Question], int]:
+    """Page of questions waiting for the admin and the total count."""
+    review_filter = (
+        Question.group_id == group_id, Question.status == "pending", Question.is_deleted == 0,
+        Question.moderation_flags.isnot(None)
+    )
+    total = await session.execute(select(func.count(Question.id)).where(*review_filter))
+    total = total.scalar() or 0
+    questions = await session.execute(
+        select(Question).where(*review_filter)
+        .order_by(Question.created_at, Question.id)
+        .offset(page * REVIEW_PAGE_SIZE)
+        .limit(REVIEW_PAGE_SIZE)
+    )
+    return questions.scalars().all(), total
+
+
+async def apply_admin_decision(session, group_id: int, question_ids, approve: bool) -> List[Question]:
+    """Approve or reject pending questions of the group in one go (caller commits). Returns changed questions."""
+    questions = await session.execute(
+        select(Question).where(
+            Question.id.in_(list(question_ids)), Question.group_id == group_id,
+            Question.status == "pending", Question.is_deleted == 0
+        ).order_by(Question.created_at, Question.id)
+        .with_for_update()  # waits for a scoring run, rows it decided no longer match status == "pending"
+    )
+    questions = questions.scalars().all()
+    for question in questions:
+        question.status = "approved" if approve else "rejected"
+        if approve:
+            await add_to_balance(session, question.author_id, group_id, POINTS_FOR_NEW_QUESTION)
+    return questions
+
+
+def describe_flags(flags: Optional[str]) -> List[str]:
+    return [flag for flag in (flags or "").split(",") if flag and flag not in ("review", "auto")]
@@ -2,6 +2,8 @@ from src.db import AsyncSessionLocal
 from src.models import User, GroupMember
 from sqlalchemy import select
 from typing import Optional
+from src.utils.geo import geohash_for_member
+from src.utils.gazetteer import member_coordinates
 
 async def save_nickname_service(user_id: int, group_id: int, nickname: str) -> None:
     async with AsyncSessionLocal() as session:
@@ -67,7 +69,7 @@ async def save_intro_service(user_id: int, group_id: int, intro: str) -> None:
             member.intro = intro
             await session.commit()
 
-async def save_location_service(user_id: int, group_id: int, lat: float = None, lon: float = None, city: str = None, country: str = None) -> None:
+async def save_location_service(user_id: int, group_id: int, lat: float = None, lon: float = None, city: str = None, country: str = None, city_id: int = None) -> None:
     async with AsyncSessionLocal() as session:
         member = await session.execute(select(GroupMember).where(GroupMember.user_id == user_id, GroupMember.group_id == group_id))
         member = member.scalar()
@@ -77,10 +79,17 @@ async def save_location_service(user_id: int, group_id: int, lat: float = None,
             if lat is not None and lon is not None:
                 member.geolocation_lat = lat
                 member.geolocation_lon = lon
+                member.geohash = geohash_for_member(lat, lon)
             if city is not None:
                 member.city = city
             if country is not None:
                 member.country = country
+            if city is not None:
+                member.city_id = city_id
+                if member.geolocation_lat is None:
+                    # Text-only location: bucket by gazetteer city centre so geo prefilter still works
+                    city_lat, city_lon = member_coordinates(member)
+                    member.geohash = geohash_for_member(city_lat, city_lon)
             await session.commit()
             print(f"[save_location_service] member after: {member}")
 
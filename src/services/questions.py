@@ -1,6 +1,15 @@
-from src.models import Question, Answer, GroupMember, Group, User
-from sqlalchemy import select, and_
+from src.models import Question, Answer, AnswerEvent, GroupMember, Group, User
+from sqlalchemy import select, and_, func, tuple_
 from src.db import AsyncSessionLocal
+from datetime import datetime, timedelta, UTC
+from typing import Optional, Tuple
+from src.utils.answer_events import answer_event_payload
+from src.utils.question_catalog import get_unanswered, get_group_catalog
+from src.utils.near_duplicates import minhash_signature, get_group_index
+from src.utils.vector_index import find_semantic_neighbours, SEMANTIC_DUPLICATE_THRESHOLD
+
+ANSWERED_PAGE_SIZE = 10
+HISTORY_EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
 
 async def ensure_user_exists(session, user_id):
     user = await session.execute(select(User).where(User.id == user_id))
@@ -14,29 +23,33 @@ async def ensure_user_exists(session, user_id):
 
 async def get_next_unanswered_question(session, group_id, user_id):
     await ensure_user_exists(session, user_id)
-    q = await session.execute(
-        select(Question).where(
-            and_(Question.group_id == group_id, Question.is_deleted == 0, Question.status == "approved")
-        ).order_by(Question.created_at)
-    )
-    questions = q.scalars().all()
-    for question in questions:
-        ans = await session.execute(select(Answer).where(and_(Answer.question_id == question.id, Answer.user_id == user_id)))
-        ans = ans.scalar()
-        if not ans:
-            return question
-    return None
+    unanswered = await get_unanswered(session, group_id, user_id)
+    return unanswered[0].to_question(group_id) if unanswered else None
 
 async def is_duplicate_question(session, group_id, text):
     q = await session.execute(
-        select(Question).where(
+        select(Question.id).where(
             Question.group_id == group_id,
             Question.is_deleted == 0,
             Question.text == text.strip()
-        )
+        ).limit(1)
     )
     return q.scalar() is not None
 
+async def find_similar_questions(session, group_id, text, limit: int = 3, exclude_id: Optional[int] = None):
+    """MinHash signature of text and up to `limit` near-duplicate (CatalogQuestion, similarity) pairs in the group."""
+    signature = minhash_signature(text)
+    index = await get_group_index(session, group_id)
+    catalog = await get_group_catalog(group_id, session)
+    scores = {qid: score for qid, score in index.query(signature, limit=limit + 1) if qid != exclude_id}
+    # Reworded questions with few shared shingles are caught by embeddings
+    for qid, cosine in await find_semantic_neighbours(session, group_id, text, k=limit, exclude=exclude_id):
+        if cosine >= SEMANTIC_DUPLICATE_THRESHOLD:
+            scores[qid] = max(scores.get(qid, 0), cosine)
+    ranked = sorted(scores.items(), key=lambda item: -item[1])[:limit]
+    similar = [(catalog.by_id[qid], score) for qid, score in ranked if qid in catalog.by_id]
+    return signature, similar
+
 async def moderate_question(text):
     # Basic moderation: reject too short questions and obvious spam
     if len(text.strip()) < 5:
@@ -46,4 +59,208 @@ async def moderate_question(text):
 
 async def get_group_members(session, group_id):
     members = await session.execute(select(GroupMember.user_id).where(GroupMember.group_id == group_id))
-    return [row[0] for row in members.all()] 
\ No newline at end of file
+    return [row[0] for row in members.all()] 
+
+def _answered_history_filter(user_id, group_id):
+    return and_(
+        Answer.user_id == user_id,
+        Answer.value.isnot(None),
+        Question.group_id == group_id,
+        Question.is_deleted == 0,
+        Question.status == "approved"
+    )
+
+def encode_history_cursor(answer) -> str:
+    """Keyset cursor (answer.created_at, answer.id) packed for callback_data."""
+    created_us = (answer.created_at - HISTORY_EPOCH) // timedelta(microseconds=1) if answer.created_at else 0
+    return f"a{created_us}_{answer.id}"
+
+def decode_history_cursor(cursor: str) -> Optional[Tuple[datetime, int]]:
+    if not cursor or not cursor.startswith("a"):
+        return None
+    created_us, answer_id = cursor[1:].split("_")
+    return HISTORY_EPOCH + timedelta(microseconds=int(created_us)), int(answer_id)
+
+async def get_answered_history_page(session, user_id, group_id, after: Optional[Tuple[datetime, int]] = None, limit: int = ANSWERED_PAGE_SIZE):
+    """One joined keyset query: page of (question, answer) ordered by (answer.created_at, answer.id), plus next cursor or None."""
+    query = (
+        select(Question, Answer)
+        .join(Answer, Answer.question_id == Question.id)
+        .where(_answered_history_filter(user_id, group_id))
+        .order_by(Answer.created_at, Answer.id)
+        .limit(limit + 1)
+    )
+    if after:
+        query = query.where(tuple_(Answer.created_at, Answer.id) > tuple_(*after))
+    rows = await session.execute(query)
+    rows = rows.all()
+    items = [(row[0], row[1]) for row in rows[:limit]]
+    next_cursor = encode_history_cursor(items[-1][1]) if len(rows) > limit else None
+    return items, next_cursor
+
+async def count_answered_history(session, user_id, group_id) -> int:
+    """Exact number of answered questions in group (COUNT, no rows loaded)."""
+    total = await session.execute(
+        select(func.count(Answer.id))
+        .join(Question, Answer.question_id == Question.id)
+        .where(_answered_history_filter(user_id, group_id))
+    )
+    return total.scalar() or 0
+
+async def get_history_cursor_for_offset(session, user_id, group_id, offset: int) -> Optional[Tuple[datetime, int]]:
+    """Keyset position of the row before offset, for old offset-based 'load more' buttons."""
+    if offset <= 0:
+        return None
+    row = await session.execute(
+        select(Answer.created_at, Answer.id)
+        .join(Question, Answer.question_id == Question.id)
+        .where(_answered_history_filter(user_id, group_id))
+        .order_by(Answer.created_at, Answer.id)
+        .offset(offset - 1)
+        .limit(1)
+    )
+    row = row.first()
+    return (row[0], row[1]) if row else None
+
+async def get_answer_context(session, user_id, question_id):
+    """Round trip 1 of the answer path: user, live question, its group name/creator and user's groups count in one query."""
+    memberships = select(func.count(GroupMember.id)).where(GroupMember.user_id == User.id).scalar_subquery()
+    row = await session.execute(
+        select(User, Question, Group.name, Group.creator_user_id, memberships)
+        .select_from(User)
+        .outerjoin(Question, and_(Question.id == question_id, Question.is_deleted == 0))
+        .outerjoin(Group, Group.id == Question.group_id)
+        .where(User.id == user_id)
+    )
+    row = row.first()
+    if not row:
+        return None
+    user, question, group_name, creator_user_id, all_groups_count = row
+    return {
+        "user": user,
+        "question": question,
+        "group_name": group_name,
+        "creator_user_id": creator_user_id,
+        "all_groups_count": all_groups_count or 0,
+    }
+
+async def commit_answer(session, user_id, question, value, points):
+    """
+    Round trip 2 of the answer path, one statement:
+    upsert answer (ON CONFLICT DO UPDATE only if value changed), award points only for a new row
+    (balance + points RETURNING), log the answer event, prefetch next unanswered question and remaining unanswered count.
+    """
+    from sqlalchemy import case, exists, insert, literal, literal_column, true, update
+    from sqlalchemy.dialects.postgresql import insert as pg_insert
+    group_id = question.group_id
+    now = datetime.now(UTC)
+    prev = select(Answer.value, Answer.status).where(Answer.question_id == question.id, Answer.user_id == user_id).cte("prev")
+    upsert = (
+        pg_insert(Answer)
+        .values(question_id=question.id, user_id=user_id, value=value, status='answered', created_at=now)
+        .on_conflict_do_update(
+            index_elements=[Answer.question_id, Answer.user_id],
+            set_={"value": value, "status": 'answered'},
+            where=(Answer.value.is_distinct_from(value) | (Answer.status != 'answered'))
+        )
+        .returning(Answer.id, literal_column("(xmax = 0)").label("inserted"))
+        .cte("upsert")
+    )
+    prev_value = select(prev.c.value).scalar_subquery()
+    logged = (
+        insert(AnswerEvent)
+        .from_select(
+            ["answer_id", "question_id", "user_id", "group_id", "event_type", "old_value", "new_value", "created_at"],
+            select(
+                upsert.c.id, literal(question.id), literal(user_id), literal(group_id),
+                case((prev_value.is_(None), literal('answered')), else_=literal('changed')),
+                prev_value, literal(value), literal(now)
+            )
+        )
+        .returning(AnswerEvent.id, AnswerEvent.answer_id, AnswerEvent.event_type)
+        .cte("logged")
+    )
+    award = (
+        update(GroupMember)
+        .where(
+            GroupMember.user_id == user_id,
+            GroupMember.group_id == group_id,
+            exists(select(upsert.c.inserted).where(upsert.c.inserted))
+        )
+        .values(balance=GroupMember.balance + points)
+        .returning(GroupMember.balance)
+        .cte("award")
+    )
+    # Statement sees the snapshot before the upsert, so the answered question is excluded explicitly
+    unanswered_filter = and_(
+        Question.group_id == group_id,
+        Question.is_deleted == 0,
+        Question.status == "approved",
+        Question.id != question.id,
+        ~exists(select(Answer.id).where(Answer.question_id == Question.id, Answer.user_id == user_id))
+    )
+    next_question = select(Question).where(unanswered_filter).order_by(Question.created_at).limit(1).cte("next_question")
+    current_balance = select(GroupMember.balance).where(GroupMember.user_id == user_id, GroupMember.group_id == group_id).scalar_subquery()
+    one_row = select(literal(1).label("one")).subquery("one_row")
+    row = await session.execute(
+        select(
+            select(prev.c.value).scalar_subquery().label("prev_value"),
+            select(prev.c.status).scalar_subquery().label("prev_status"),
+            select(upsert.c.inserted).scalar_subquery().label("inserted"),
+            select(logged.c.id).scalar_subquery().label("event_id"),
+            select(logged.c.answer_id).scalar_subquery().label("answer_id"),
+            select(logged.c.event_type).scalar_subquery().label("event_type"),
+            func.coalesce(select(award.c.balance).scalar_subquery(), current_balance).label("balance"),
+            select(func.count(Question.id)).where(unanswered_filter).scalar_subquery().label("unanswered"),
+            next_question.c.id, next_question.c.text, next_question.c.author_id, next_question.c.group_id, next_question.c.created_at,
+        )
+        .select_from(one_row.outerjoin(next_question, true()))
+    )
+    row = row.one()
+    await session.commit()
+    next_q = None
+    if row.id is not None:
+        next_q = Question(id=row.id, text=row.text, author_id=row.author_id, group_id=row.group_id, created_at=row.created_at, status="approved", is_deleted=0)
+    return {
+        "unchanged": row.prev_status == 'answered' and row.prev_value == value,
+        "is_new": bool(row.inserted),
+        "balance": row.balance or 0,
+        "unanswered": row.unanswered or 0,
+        "next_question": next_q,
+        "events": [answer_event_payload(
+            row.event_id, row.answer_id, question.id, user_id, group_id, row.event_type, row.prev_value, value, now
+        )] if row.event_id else [],
+    }
+
+async def delete_answers_logged(session, *criteria) -> list:
+    """DELETE answers matching criteria and append 'deleted' events in the same statement; caller commits."""
+    from sqlalchemy import delete, insert, literal
+    now = datetime.now(UTC)
+    deleted = (
+        delete(Answer)
+        .where(*criteria)
+        .returning(Answer.id, Answer.question_id, Answer.user_id, Answer.value)
+        .cte("deleted")
+    )
+    stmt = (
+        insert(AnswerEvent)
+        .from_select(
+            ["answer_id", "question_id", "user_id", "group_id", "event_type", "old_value", "new_value", "created_at"],
+            select(
+                deleted.c.id, deleted.c.question_id, deleted.c.user_id, Question.group_id,
+                literal('deleted'), deleted.c.value, literal(None), literal(now)
+            )
+            .join(Question, Question.id == deleted.c.question_id)
+            .where(deleted.c.value.isnot(None))  # delivered-but-unanswered rows were never answers
+        )
+        .returning(
+            AnswerEvent.id, AnswerEvent.answer_id, AnswerEvent.question_id, AnswerEvent.user_id,
+            AnswerEvent.group_id, AnswerEvent.old_value
+        )
+        .add_cte(deleted)
+    )
+    rows = await session.execute(stmt)
+    return [
+        answer_event_payload(r.id, r.answer_id, r.question_id, r.user_id, r.group_id, 'deleted', r.old_value, None, now)
+        for r in rows.all()
+    ]
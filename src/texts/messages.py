@@ -49,7 +49,12 @@ MESSAGES = {
         "QUESTION_REJECTED": "🚫 This question didn't pass moderation.",
         "QUESTION_ADDED": "🎉 Question added! +{points}💎 to your account.",
         "QUESTION_PENDING_APPROVAL": "⏳ Your question is being reviewed by the admin.",
+        "QUESTION_RATE_LIMITED": "⏳ You're adding questions too fast. Try again in {minutes} min.",
+        "QUESTION_GROUP_RATE_LIMITED": "⏳ This group is getting too many new questions right now. Try again in {minutes} min.",
         "QUESTION_ADMIN_APPROVAL": "📝 New question from {author_name}:\n\n{question_text}\n\nApprove or reject?",
+        "MODERATION_REVIEW_HEADER": "🛡 Questions to review in {group_name}: {total} (page {page}/{pages})",
+        "MODERATION_REVIEW_EMPTY": "✅ No questions waiting for review.",
+        "MODERATION_REVIEW_SIMILAR": "⚠️ Similar to: {text}",
         "QUESTION_APPROVED_ADMIN": "✅ Question approved and sent to group members.",
         "QUESTION_REJECTED_ADMIN": "❌ Question rejected.",
         "QUESTION_APPROVED_AUTHOR": "✅ Your question was approved! +{points}💎 to your account.",
@@ -82,6 +87,7 @@ MESSAGES = {
         # --- Match Connection Messages ---
         "MATCH_REQUEST_SENT": "🔔 We've notified {nickname} about your interest. We'll let you know when they make a decision!",
         "MATCH_INCOMING_REQUEST": "🤝 {nickname} wants to connect with you",
+        "MATCH_INCOMING_REQUESTS": "🤝 {count} people want to connect with you",
         "MATCH_REQUEST_ACCEPTED": "✅ {nickname} accepted your match request!",
         "MATCH_REQUEST_REJECTED": "😔 {nickname} declined your match request.",
         "MATCH_REQUEST_BLOCKED": "🚫 {nickname} decided not to communicate with you 😞",
@@ -98,6 +104,7 @@ MESSAGES = {
             "Send connection requests and exchange contacts\n\n"
             "💎 Earn points by participating, spend them on matches"
         ),
+        "USER_BUSY": "⏳ Still working on your previous action. Try again in a moment.",
         # --- Buttons ---
         "BTN_CREATE_GROUP": "🌀 Kick off a new group",
         "BTN_JOIN_GROUP": "🔑 Join with an invite code",
@@ -176,7 +183,12 @@ MESSAGES = {
         "QUESTION_REJECTED": "🚫 Этот вопрос не прошёл модерацию.",
         "QUESTION_ADDED": "🎉 Вопрос добавлен! +{points}💎 на твой счёт.",
         "QUESTION_PENDING_APPROVAL": "⏳ Твой вопрос отправлен на модерацию администратору.",
+        "QUESTION_RATE_LIMITED": "⏳ Ты добавляешь вопросы слишком часто. Попробуй через {minutes} мин.",
+        "QUESTION_GROUP_RATE_LIMITED": "⏳ В группу сейчас приходит слишком много вопросов. Попробуй через {minutes} мин.",
         "QUESTION_ADMIN_APPROVAL": "📝 Новый вопрос от {author_name}:\n\n{question_text}\n\nОдобрить или отклонить?",
+        "MODERATION_REVIEW_HEADER": "🛡 Вопросы на проверку в {group_name}: {total} (страница {page}/{pages})",
+        "MODERATION_REVIEW_EMPTY": "✅ Нет вопросов на проверку.",
+        "MODERATION_REVIEW_SIMILAR": "⚠️ Похож на: {text}",
         "QUESTION_APPROVED_ADMIN": "✅ Вопрос одобрен и отправлен участникам группы.",
         "QUESTION_REJECTED_ADMIN": "❌ Вопрос отклонён.",
         "QUESTION_APPROVED_AUTHOR": "✅ Твой вопрос одобрен! +{points}💎 на твой счёт.",
@@ -209,6 +221,7 @@ MESSAGES = {
         # --- Match Connection Messages ---
         "MATCH_REQUEST_SENT": "🔔 Мы уведомили {nickname} о твоём интересе. Мы дадим знать, когда они примут решение!",
         "MATCH_INCOMING_REQUEST": "🤝 {nickname} хочет связаться с тобой",
+        "MATCH_INCOMING_REQUESTS": "🤝 С тобой хотят связаться: {count}",
         "MATCH_REQUEST_ACCEPTED": "✅ {nickname} принял твой запрос на совпадение!",
         "MATCH_REQUEST_REJECTED": "😔 {nickname} отклонил твой запрос на совпадение.",
         "MATCH_REQUEST_BLOCKED": "🚫 {nickname} решил не общаться с тобой 😞",
@@ -225,6 +238,7 @@ MESSAGES = {
             "Отправляй запросы на связь и обменивайтесь контактами\n\n"
             "💎 Зарабатывай поинты участием, трать их на поиск совпадений"
         ),
+        "USER_BUSY": "⏳ Ещё обрабатываю предыдущее действие. Попробуй через пару секунд.",
         # --- Buttons ---
         "BTN_CREATE_GROUP": "🌀 Запустить новую группу",
         "BTN_JOIN_GROUP": "🔑 Присоединиться по коду приглашения",
@@ -257,12 +271,25 @@ MESSAGES = {
     },
 }
 
-def get_message(key, user, **kwargs):
+DEFAULT_LANGUAGE = "en"
+
+
+def compile_catalog(messages=MESSAGES):
+    """Per-language lookup tables with English fallbacks merged in, so a lookup is one dict hit."""
+    default = messages[DEFAULT_LANGUAGE]
+    return {lang: {**default, **{key: msg for key, msg in table.items() if msg}} for lang, table in messages.items()}
+
+
+CATALOG = compile_catalog()
+
+
+def get_language(user) -> str:
     lang = getattr(user, 'language', None)
-    if lang not in MESSAGES:
-        lang = 'en'
-    msg = MESSAGES[lang].get(key) or MESSAGES['en'].get(key) or key
-    print(f"[DEBUG get_message] lang={lang}, key={key}, msg={msg}")
+    return lang if lang in CATALOG else DEFAULT_LANGUAGE
+
+
+def get_message(key, user, **kwargs):
+    msg = CATALOG[get_language(user)].get(key, key)
     if kwargs:
         return msg.format(**kwargs)
     return msg
@@ -340,12 +367,14 @@ MATCH_NO_OTHERS = "MATCH_NO_OTHERS"
 # --- Match Connection Messages ---
 MATCH_REQUEST_SENT = "MATCH_REQUEST_SENT"
 MATCH_INCOMING_REQUEST = "MATCH_INCOMING_REQUEST"
+MATCH_INCOMING_REQUESTS = "MATCH_INCOMING_REQUESTS"
 MATCH_REQUEST_ACCEPTED = "MATCH_REQUEST_ACCEPTED"
 MATCH_REQUEST_REJECTED = "MATCH_REQUEST_REJECTED"
 MATCH_REQUEST_BLOCKED = "MATCH_REQUEST_BLOCKED"
 
 # --- System/General ---
 INSTRUCTIONS_TEXT = "INSTRUCTIONS_TEXT"
+USER_BUSY = "USER_BUSY"
 
 # --- Buttons ---
 BTN_CREATE_GROUP = "BTN_CREATE_GROUP"
@@ -386,7 +415,12 @@ QUEUE_LOAD_UNANSWERED = "QUEUE_LOAD_UNANSWERED"
 
 # Question moderation constants
 QUESTION_PENDING_APPROVAL = "QUESTION_PENDING_APPROVAL"
+QUESTION_RATE_LIMITED = "QUESTION_RATE_LIMITED"
+QUESTION_GROUP_RATE_LIMITED = "QUESTION_GROUP_RATE_LIMITED"
 QUESTION_ADMIN_APPROVAL = "QUESTION_ADMIN_APPROVAL"
+MODERATION_REVIEW_HEADER = "MODERATION_REVIEW_HEADER"
+MODERATION_REVIEW_EMPTY = "MODERATION_REVIEW_EMPTY"
+MODERATION_REVIEW_SIMILAR = "MODERATION_REVIEW_SIMILAR"
 QUESTION_APPROVED_ADMIN = "QUESTION_APPROVED_ADMIN"
 QUESTION_REJECTED_ADMIN = "QUESTION_REJECTED_ADMIN"
 QUESTION_APPROVED_AUTHOR = "QUESTION_APPROVED_AUTHOR"
@@ -0,0 +1,167 @@
+"""
+Answer change-data stream
+Every answer mutation appends a row to answer_events in the same transaction (see src.services.questions),
+after commit the rows are published to the Redis stream `answer_events` for incremental consumers
+(match accumulators, analytics rollups, badges). The table is the source of truth: a consumer that
+missed stream entries or needs a rebuild replays the table from its last seen event id.
+
+Consumers must be idempotent by event "id" (an event may be delivered twice after a replay).
+
+Replay tool:
+    python -m src.utils.answer_events replay --since-id 0       # re-publish table rows to the stream
+    python -m src.utils.answer_events reset-group matches       # consumer group re-reads the whole stream
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+from typing import Awaitable, Callable, List, Optional
+
+from sqlalchemy import select
+
+from src.models import AnswerEvent
+
+ANSWER_EVENTS_STREAM = "answer_events"
+STREAM_MAXLEN = int(os.getenv("ANSWER_EVENTS_STREAM_MAXLEN", 1000000))
+READ_BATCH = 100
+READ_BLOCK_MS = 5000
+REPLAY_BATCH = 1000
+
+
+def answer_event_payload(event_id, answer_id, question_id, user_id, group_id, event_type, old_value, new_value, created_at) -> dict:
+    return {
+        "id": event_id,
+        "answer_id": answer_id,
+        "question_id": question_id,
+        "user_id": user_id,
+        "group_id": group_id,
+        "event_type": event_type,
+        "old_value": old_value,
+        "new_value": new_value,
+        "created_at": created_at.isoformat() if created_at else None,
+    }
+
+
+def event_to_payload(event: AnswerEvent) -> dict:
+    return answer_event_payload(
+        event.id, event.answer_id, event.question_id, event.user_id, event.group_id,
+        event.event_type, event.old_value, event.new_value, event.created_at
+    )
+
+
+async def publish_answer_events(events: List[dict], redis=None) -> None:
+    """Appends committed events to the stream. Failures are only logged: the table keeps them for replay."""
+    if not events:
+        return
+    if redis is None:
+        from src.utils.redis import redis
+    try:
+        pipe = redis.pipeline(transaction=False)
+        for event in events:
+            pipe.xadd(ANSWER_EVENTS_STREAM, {"e": json.dumps(event)}, maxlen=STREAM_MAXLEN, approximate=True)
+        await pipe.execute()
+    except Exception as e:
+        logging.warning(f"[publish_answer_events] Failed to publish {len(events)} events (first id {events[0]['id']}): {e}")
+
+
+async def ensure_consumer_group(redis, group: str, start_id: str = "0") -> None:
+    try:
+        await redis.xgroup_create(ANSWER_EVENTS_STREAM, group, id=start_id, mkstream=True)
+    except Exception as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+async def consume_answer_events(
+    redis,
+    group: str,
+    consumer: str,
+    handler: Callable[[List[dict]], Awaitable[None]],
+    stop_event: Optional[asyncio.Event] = None,
+) -> None:
+    """Feeds batches of events to handler forever, first the ones left unacked by this consumer; acks after handler."""
+    await ensure_consumer_group(redis, group)
+    last_id = "0"
+    while not (stop_event and stop_event.is_set()):
+        response = await redis.xreadgroup(group, consumer, {ANSWER_EVENTS_STREAM: last_id}, count=READ_BATCH, block=READ_BLOCK_MS)
+        entries = response[0][1] if response else []
+        if not entries:
+            last_id = ">"
+            continue
+        events = []
+        for _, fields in entries:
+            try:
+                events.append(json.loads(fields["e"] if "e" in fields else fields[b"e"]))
+            except Exception as e:
+                logging.warning(f"[consume_answer_events] Dropping malformed entry: {e}")
+        # Not acked on handler error: entries stay pending and are re-read on restart
+        await handler(events)
+        await redis.xack(ANSWER_EVENTS_STREAM, group, *[entry_id for entry_id, _ in entries])
+
+
+async def iter_answer_events(session, since_id: int = 0, batch: int = REPLAY_BATCH, group_id: Optional[int] = None):
+    """Yields batches of event payloads with id > since_id from the table (keyset by id)."""
+    last_id = since_id
+    while True:
+        query = select(AnswerEvent).where(AnswerEvent.id > last_id).order_by(AnswerEvent.id).limit(batch)
+        if group_id is not None:
+            query = query.where(AnswerEvent.group_id == group_id)
+        rows = await session.execute(query)
+        rows = rows.scalars().all()
+        if not rows:
+            return
+        yield [event_to_payload(row) for row in rows]
+        last_id = rows[-1].id
+
+
+async def replay_answer_events(handler: Callable[[List[dict]], Awaitable[None]], since_id: int = 0, group_id: Optional[int] = None) -> int:
+    """Rebuilds a derived store straight from the table, returns the last event id seen."""
+    from src.db import AsyncSessionLocal
+    last_id = since_id
+    async with AsyncSessionLocal() as session:
+        async for events in iter_answer_events(session, since_id, group_id=group_id):
+            await handler(events)
+            last_id = events[-1]["id"]
+    return last_id
+
+
+async def _replay_to_stream(since_id: int, group_id: Optional[int]) -> None:
+    from src.utils.redis import redis
+    count = 0
+
+    async def publish(events):
+        nonlocal count
+        await publish_answer_events(events, redis)
+        count += len(events)
+
+    last_id = await replay_answer_events(publish, since_id, group_id)
+    logging.info(f"[replay] Published {count} events, last id {last_id}")
+
+
+async def _reset_group(group: str, start_id: str) -> None:
+    from src.utils.redis import redis
+    await ensure_consumer_group(redis, group, start_id)
+    await redis.xgroup_setid(ANSWER_EVENTS_STREAM, group, start_id)
+    logging.info(f"[reset-group] {group} now reads {ANSWER_EVENTS_STREAM} after {start_id}")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="answer_events replay tool")
+    commands = parser.add_subparsers(dest="command", required=True)
+    replay = commands.add_parser("replay", help="re-publish events from the table to the stream")
+    replay.add_argument("--since-id", type=int, default=0)
+    replay.add_argument("--group-id", type=int, default=None)
+    reset = commands.add_parser("reset-group", help="move a consumer group position on the stream")
+    reset.add_argument("group")
+    reset.add_argument("--to", default="0", help="stream entry id, 0 = from the beginning, $ = only new")
+    args = parser.parse_args()
+    if args.command == "replay":
+        asyncio.run(_replay_to_stream(args.since_id, args.group_id))
+    else:
+        asyncio.run(_reset_group(args.group, args.to))
+
+
+if __name__ == "__main__":
+    main()
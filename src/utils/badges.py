@@ -6,27 +6,25 @@ import logging
 from typing import Optional
 from sqlalchemy import select, and_, func
 from src.db import AsyncSessionLocal
-from src.models import Question, Answer, MatchStatus, GroupMember
+from src.models import Answer, MatchStatus, GroupMember
 from src.utils.redis import get_telegram_user_id
+from src.utils.question_catalog import get_group_catalog
 
 
 async def get_unanswered_questions_count(user_id: int, group_id: int) -> int:
     """Get count of unanswered questions for user in group"""
     async with AsyncSessionLocal() as session:
-        # Count questions where user has no answer
-        subquery = select(Answer.question_id).where(Answer.user_id == user_id)
-        
+        # Approved question ids come from the catalog, only user's answers are counted in DB
+        catalog = await get_group_catalog(group_id, session)
+        if not catalog.approved:
+            return 0
         result = await session.execute(
-            select(func.count(Question.id)).where(
-                and_(
-                    Question.group_id == group_id,
-                    Question.is_deleted == 0,
-                    Question.status == "approved",
-                    ~Question.id.in_(subquery)
-                )
+            select(func.count(Answer.id)).where(
+                Answer.user_id == user_id,
+                Answer.question_id.in_(catalog.approved_ids)
             )
         )
-        return result.scalar() or 0
+        return len(catalog.approved) - (result.scalar() or 0)
 
 
 async def get_pending_match_requests_count(user_id: int) -> int:
@@ -0,0 +1,162 @@
+"""
+Typed callback_data for the hot buttons (answers, history, match cards, moderation queue)
+Payloads are aiogram CallbackData schemas packed as "<prefix>:<field>:...", the version tag is part of
+the prefix (a1 = answer, schema version 1). A changed schema gets a new prefix and the old one stays
+registered, so buttons already sitting in chats keep working.
+All of them are dispatched by one router: a dict lookup on the prefix instead of a startswith filter
+per handler. Buttons sent before the codec (answer_12_2, match_nav_3, ...) are translated to the same
+schemas by the legacy table.
+"""
+import base64
+import logging
+from typing import Callable, Dict, Iterable, List, Optional, Type
+
+from aiogram import Router, types
+from aiogram.filters.callback_data import CallbackData
+from aiogram.fsm.context import FSMContext
+
+
+class AnswerCallback(CallbackData, prefix="a1"):
+    question_id: int
+    value: int
+
+
+class DeleteQuestionCallback(CallbackData, prefix="dq1"):
+    question_id: int
+
+
+class HistoryMoreCallback(CallbackData, prefix="h1"):
+    cursor: str  # keyset cursor (encode_history_cursor) or a page number from old buttons
+
+
+class MatchNavCallback(CallbackData, prefix="mn1"):
+    index: int
+
+
+class MatchActionCallback(CallbackData, prefix="ma1"):
+    action: str  # 'c' connect, 'p' postpone, 'h' hide
+    user_id: int
+
+
+class ReviewPageCallback(CallbackData, prefix="rp1"):
+    group_id: int
+    page: int
+
+
+class ReviewDecisionCallback(CallbackData, prefix="rd1"):
+    approve: bool
+    page: int
+    ids: str  # pack_ints of question ids
+
+
+def pack_ints(values: Iterable[int]) -> str:
+    """Sorted non-negative ints as delta varints in unpadded base64url (a page of ids fits in a few bytes)."""
+    out, previous = bytearray(), 0
+    for value in sorted(values):
+        delta, previous = value - previous, value
+        while delta >= 0x80:
+            out.append(delta & 0x7F | 0x80)
+            delta >>= 7
+        out.append(delta)
+    return base64.urlsafe_b64encode(bytes(out)).rstrip(b"=").decode()
+
+
+def unpack_ints(packed: str) -> List[int]:
+    data = base64.urlsafe_b64decode(packed + "=" * (-len(packed) % 4))
+    values, value, shift, current = [], 0, 0, 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            current += value
+            values.append(current)
+            value, shift = 0, 0
+    return values
+
+
+def _legacy_review_decision(approve: bool):
+    def parse(rest: str) -> ReviewDecisionCallback:
+        page, ids = rest.split("_")
+        return ReviewDecisionCallback(approve=approve, page=int(page), ids=pack_ints(int(qid) for qid in ids.split(".")))
+    return parse
+
+
+def _legacy_review_page(rest: str) -> ReviewPageCallback:
+    group_id, page = rest.split("_")
+    return ReviewPageCallback(group_id=int(group_id), page=int(page))
+
+
+def _legacy_answer(rest: str) -> AnswerCallback:
+    question_id, value = rest.split("_")
+    return AnswerCallback(question_id=int(question_id), value=int(value))
+
+
+SCHEMAS: Dict[str, Type[CallbackData]] = {
+    schema.__prefix__: schema for schema in (
+        AnswerCallback, DeleteQuestionCallback, HistoryMoreCallback, MatchNavCallback, MatchActionCallback,
+        ReviewPageCallback, ReviewDecisionCallback,
+    )
+}
+
+# Old underscore formats -> parser of the part after the prefix
+LEGACY_FORMATS: Dict[str, Callable[[str], CallbackData]] = {
+    "answer_": _legacy_answer,
+    "delete_question_": lambda rest: DeleteQuestionCallback(question_id=int(rest)),
+    "load_answered_questions_more_": lambda rest: HistoryMoreCallback(cursor=rest),
+    "match_nav_": lambda rest: MatchNavCallback(index=int(rest)),
+    "connect_": lambda rest: MatchActionCallback(action="c", user_id=int(rest)),
+    "match_postpone_": lambda rest: MatchActionCallback(action="p", user_id=int(rest)),
+    "match_hide_": lambda rest: MatchActionCallback(action="h", user_id=int(rest)),
+    "modq_p_": _legacy_review_page,
+    "modq_a_": _legacy_review_decision(True),
+    "modq_r_": _legacy_review_decision(False),
+}
+
+
+class CallbackTable:
+    """Prefix -> handler table behind a single callback_query handler."""
+
+    def __init__(self, schemas: Dict[str, Type[CallbackData]] = SCHEMAS, legacy_formats: Dict[str, Callable[[str], CallbackData]] = LEGACY_FORMATS):
+        self.schemas = schemas
+        self.legacy_formats = legacy_formats
+        self.handlers: Dict[str, Callable] = {}
+        self.router = Router(name="callback_table")
+        self.router.callback_query.register(self._dispatch, self._match)
+
+    def handler(self, *schemas: Type[CallbackData]):
+        """Registers handler(callback, callback_data, state) for the schemas' prefixes."""
+        def decorator(func):
+            for schema in schemas:
+                self.handlers[schema.__prefix__] = func
+            return func
+        return decorator
+
+    def decode(self, data: Optional[str]) -> Optional[CallbackData]:
+        if not data:
+            return None
+        prefix = data.partition(":")[0]
+        if prefix in self.schemas:
+            return self.schemas[prefix].unpack(data)
+        head = data
+        while "_" in head:
+            head = head.rpartition("_")[0]
+            parse = self.legacy_formats.get(head + "_")
+            if parse:
+                return parse(data[len(head) + 1:])
+        return None
+
+    async def _match(self, callback: types.CallbackQuery):
+        try:
+            payload = self.decode(callback.data)
+        except (ValueError, TypeError) as e:
+            logging.warning(f"[CallbackTable] Malformed callback_data {callback.data!r}: {e}")
+            return False
+        if payload is None or payload.__prefix__ not in self.handlers:
+            return False
+        return {"callback_data": payload}
+
+    async def _dispatch(self, callback: types.CallbackQuery, callback_data: CallbackData, state: FSMContext):
+        return await self.handlers[callback_data.__prefix__](callback, callback_data, state)
+
+
+callback_table = CallbackTable()
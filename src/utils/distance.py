@@ -4,6 +4,7 @@ Distance calculation utilities for match display
 import math
 from typing import Optional
 from src.models import GroupMember
+from src.utils.gazetteer import member_coordinates
 
 
 def calculate_distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> int:
@@ -28,9 +29,10 @@ def calculate_distance_km(lat1: float, lon1: float, lat2: float, lon2: float) ->
     return round(distance_km)
 
 
-def get_match_distance_info(member1: GroupMember, member2: GroupMember) -> str:
+def get_match_distance_info(member1: GroupMember, member2: GroupMember, distance_km: Optional[int] = None) -> str:
     """
     Get distance information for match display
+    distance_km can be passed when already computed for a batch (see src.utils.geo.member_distances_km)
     
     Returns formatted distance string:
     - If both have coordinates: "📍 23 км away"
@@ -39,21 +41,28 @@ def get_match_distance_info(member1: GroupMember, member2: GroupMember) -> str:
     - If different countries: "📍 Moscow, Russia"
     - If no location data: "📍 Location not specified"
     """
-    import logging
-    
-    # Debug logging
-    logging.warning(f"[get_match_distance_info] member1: lat={getattr(member1, 'geolocation_lat', None)}, lon={getattr(member1, 'geolocation_lon', None)}, city={getattr(member1, 'city', None)}, country={getattr(member1, 'country', None)}")
-    logging.warning(f"[get_match_distance_info] member2: lat={getattr(member2, 'geolocation_lat', None)}, lon={getattr(member2, 'geolocation_lon', None)}, city={getattr(member2, 'city', None)}, country={getattr(member2, 'country', None)}")
-    
     # Check if both users have GPS coordinates
     if all([
         member1.geolocation_lat, member1.geolocation_lon,
         member2.geolocation_lat, member2.geolocation_lon
     ]):
-        distance_km = calculate_distance_km(
-            member1.geolocation_lat, member1.geolocation_lon,
-            member2.geolocation_lat, member2.geolocation_lon
-        )
+        if distance_km is None:
+            distance_km = calculate_distance_km(
+                member1.geolocation_lat, member1.geolocation_lon,
+                member2.geolocation_lat, member2.geolocation_lon
+            )
+        return f"📍 {distance_km} км away"
+    
+    # Both locations resolved by gazetteer: compare canonical city ids, else distance between city centres
+    city_id1, city_id2 = getattr(member1, 'city_id', None), getattr(member2, 'city_id', None)
+    if city_id1 is not None and city_id1 == city_id2:
+        return "📍 Same city"
+    if distance_km is None:
+        lat1, lon1 = member_coordinates(member1)
+        lat2, lon2 = member_coordinates(member2)
+        if lat1 is not None and lat2 is not None:
+            distance_km = calculate_distance_km(lat1, lon1, lat2, lon2)
+    if distance_km is not None:
         return f"📍 {distance_km} км away"
     
     # Check if both users have city/country data
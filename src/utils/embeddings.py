@@ -0,0 +1,171 @@
+"""
+Local question embeddings
+Offline, CPU-only: a sentence-transformers model if EMBEDDING_MODEL is set and the package is installed,
+otherwise a hashed TF vector (word + char trigram features, signed feature hashing) that the vector index
+turns into TF-IDF per group. Stored in questions.embedding as packed int8 or float16 with a small header.
+
+Batch pipeline (incremental: only questions without an embedding or with one of another kind):
+    python -m src.utils.embeddings run [--batch 500]
+    python -m src.utils.embeddings run --all        # re-embed everything, e.g. after changing the model
+    python -m src.utils.embeddings run --watch 60   # keep new/approved questions embedded
+"""
+import argparse
+import asyncio
+import logging
+import math
+import os
+import struct
+import zlib
+from collections import Counter
+from typing import List, Tuple
+
+import numpy as np
+from sqlalchemy import func, or_, select, update
+
+from src.models import Question
+from src.utils.near_duplicates import normalize_question
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL")  # e.g. a local path to a small sentence-transformers model
+EMBEDDING_DTYPE = os.getenv("EMBEDDING_DTYPE", "int8")  # 'int8' or 'float16'
+HASHED_DIM = 256
+
+KIND_HASHED_TF = 0
+KIND_MODEL = 1
+_DTYPE_CODES = {"int8": 1, "float16": 2}
+_HEADER = struct.Struct("<BBBHf")  # format version, kind, dtype code, dim, int8 scale
+_FORMAT_VERSION = 1
+
+_model = None
+
+
+def _load_model():
+    global _model
+    if _model is None:
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            logging.warning("[embeddings] sentence-transformers is not installed, using hashed TF-IDF")
+            return None
+        _model = SentenceTransformer(EMBEDDING_MODEL, device="cpu")
+    return _model
+
+
+def current_kind() -> int:
+    return KIND_MODEL if EMBEDDING_MODEL and _load_model() is not None else KIND_HASHED_TF
+
+
+def _features(text: str) -> Counter:
+    words = normalize_question(text).split()
+    features = Counter(f"w:{word}" for word in words)
+    for word in words:
+        padded = f"<{word}>"
+        features.update(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+    return features
+
+
+def hashed_tf_vector(text: str, dim: int = HASHED_DIM) -> np.ndarray:
+    """Signed feature hashing of log-scaled term frequencies, L2-normalized."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature, count in _features(text).items():
+        h = zlib.crc32(feature.encode())
+        vector[h % dim] += (1.0 if h & 0x80000000 else -1.0) * (1.0 + math.log(count))
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def embed_texts(texts: List[str]) -> Tuple[int, np.ndarray]:
+    """(kind, float32 matrix len(texts) x dim) with the configured backend."""
+    kind = current_kind()
+    if kind == KIND_MODEL:
+        matrix = _load_model().encode(texts, batch_size=64, normalize_embeddings=True, convert_to_numpy=True)
+        return kind, matrix.astype(np.float32)
+    if not texts:
+        return kind, np.zeros((0, HASHED_DIM), dtype=np.float32)
+    return kind, np.stack([hashed_tf_vector(text) for text in texts])
+
+
+def pack_embedding(vector: np.ndarray, kind: int, dtype: str = EMBEDDING_DTYPE) -> bytes:
+    if dtype == "int8":
+        scale = float(np.abs(vector).max()) / 127 or 1.0
+        data = np.round(vector / scale).astype(np.int8).tobytes()
+    else:
+        scale = 1.0
+        data = vector.astype("<f2").tobytes()
+    return _HEADER.pack(_FORMAT_VERSION, kind, _DTYPE_CODES[dtype], vector.shape[0], scale) + data
+
+
+def unpack_embedding(blob: bytes) -> Tuple[int, np.ndarray]:
+    """(kind, float32 vector)."""
+    _, kind, dtype_code, dim, scale = _HEADER.unpack_from(blob)
+    data = blob[_HEADER.size:]
+    if dtype_code == _DTYPE_CODES["int8"]:
+        vector = np.frombuffer(data, dtype=np.int8, count=dim).astype(np.float32) * scale
+    else:
+        vector = np.frombuffer(data, dtype="<f2", count=dim).astype(np.float32)
+    return kind, vector
+
+
+async def embed_pending_questions(session, batch: int = 500, after_id: int = 0, everything: bool = False) -> Tuple[int, int]:
+    """Embeds the next batch (by id) of live questions that need it, returns (written, last id)."""
+    kind = current_kind()
+    query = (
+        select(Question.id, Question.text)
+        .where(Question.id > after_id, Question.is_deleted == 0, Question.status != "rejected")
+        .order_by(Question.id)
+        .limit(batch)
+    )
+    if not everything:
+        # Missing, or computed by another backend (byte 1 of the header is the kind)
+        query = query.where(or_(Question.embedding.is_(None), func.get_byte(Question.embedding, 1) != kind))
+    rows = await session.execute(query)
+    rows = rows.all()
+    if not rows:
+        return 0, after_id
+    _, matrix = embed_texts([row.text for row in rows])
+    await session.execute(update(Question), [
+        {"id": row.id, "embedding": pack_embedding(vector, kind)} for row, vector in zip(rows, matrix)
+    ])
+    await session.commit()
+    return len(rows), rows[-1].id
+
+
+async def run_pipeline(batch: int = 500, everything: bool = False) -> int:
+    from src.db import AsyncSessionLocal
+    total, last_id = 0, 0
+    async with AsyncSessionLocal() as session:
+        while True:
+            written, last_id = await embed_pending_questions(session, batch, last_id, everything)
+            total += written
+            if written < batch:
+                break
+    logging.info(f"[embeddings] Embedded {total} questions")
+    return total
+
+
+async def watch_pipeline(interval: int, batch: int = 500) -> None:
+    """Keeps embeddings current: new and approved questions are picked up every `interval` seconds."""
+    while True:
+        try:
+            await run_pipeline(batch)
+        except Exception as e:
+            logging.warning(f"[embeddings] Pipeline run failed: {e}")
+        await asyncio.sleep(interval)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="question embeddings pipeline")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="embed new/approved questions without an embedding")
+    run.add_argument("--batch", type=int, default=500)
+    run.add_argument("--all", action="store_true", help="re-embed every live question")
+    run.add_argument("--watch", type=int, default=0, metavar="SECONDS", help="repeat every N seconds")
+    args = parser.parse_args()
+    if args.watch:
+        asyncio.run(watch_pipeline(args.watch, args.batch))
+    else:
+        asyncio.run(run_pipeline(args.batch, args.all))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Redis-backed FSM storage for aiogram
+Keeps state and data of one chat/user in a single Redis hash with msgpack-encoded data
+and a sliding TTL, so FSM context survives restarts and is shared between replicas
+"""
+import copy
+from contextvars import ContextVar
+from typing import Any, Dict, Mapping, Optional
+
+import msgpack
+from aiogram import Dispatcher
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+
+STATE_FIELD = "s"
+DATA_FIELD = "d"
+
+# Per-update snapshot of already loaded records: redis_key -> (state, data)
+_snapshot: ContextVar[Optional[Dict[str, tuple]]] = ContextVar("fsm_snapshot", default=None)
+
+
+def pack_data(data: Mapping[str, Any]) -> bytes:
+    return msgpack.packb(dict(data), use_bin_type=True)
+
+
+def unpack_data(raw: Optional[bytes]) -> Dict[str, Any]:
+    if not raw:
+        return {}
+    return msgpack.unpackb(raw, raw=False, strict_map_key=False)
+
+
+class CompactRedisStorage(BaseStorage):
+    """
+    FSM storage that keeps one hash per context key:
+      s -> state name, d -> msgpack-encoded data.
+    Both fields are read in one pipelined round trip (HMGET + EXPIRE), and the result
+    is reused for the rest of the update, so repeated state.get_data() calls are free.
+    """
+
+    def __init__(self, redis, ttl: Optional[int] = None, key_builder: Optional[KeyBuilder] = None):
+        # redis client must be created with decode_responses=False (data is binary)
+        self.redis = redis
+        self.ttl = ttl
+        self.key_builder = key_builder or DefaultKeyBuilder(prefix="fsm")
+
+    def _key(self, key: StorageKey) -> str:
+        return self.key_builder.build(key)
+
+    async def _load(self, redis_key: str) -> tuple:
+        snapshot = _snapshot.get()
+        if snapshot is not None and redis_key in snapshot:
+            return snapshot[redis_key]
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hmget(redis_key, STATE_FIELD, DATA_FIELD)
+            if self.ttl:
+                pipe.expire(redis_key, self.ttl)
+            results = await pipe.execute()
+        raw_state, raw_data = results[0]
+        state = raw_state.decode("utf-8") if isinstance(raw_state, bytes) else raw_state
+        record = (state, unpack_data(raw_data))
+        if snapshot is not None:
+            snapshot[redis_key] = record
+        return record
+
+    def _remember(self, redis_key: str, state: Optional[str], data: Dict[str, Any]) -> None:
+        snapshot = _snapshot.get()
+        if snapshot is not None:
+            snapshot[redis_key] = (state, data)
+
+    async def _write(self, redis_key: str, state: Optional[str], data: Dict[str, Any]) -> None:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            if state is None and not data:
+                pipe.delete(redis_key)
+            else:
+                if state is None:
+                    pipe.hdel(redis_key, STATE_FIELD)
+                else:
+                    pipe.hset(redis_key, STATE_FIELD, state)
+                if data:
+                    pipe.hset(redis_key, DATA_FIELD, pack_data(data))
+                else:
+                    pipe.hdel(redis_key, DATA_FIELD)
+                if self.ttl:
+                    pipe.expire(redis_key, self.ttl)
+            await pipe.execute()
+        self._remember(redis_key, state, data)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        redis_key = self._key(key)
+        _, data = await self._load(redis_key)
+        state_name = state.state if isinstance(state, State) else state
+        await self._write(redis_key, state_name, data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._load(self._key(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(f"Data must be a dict or dict-like object, got {type(data).__name__}")
+        redis_key = self._key(key)
+        state, _ = await self._load(redis_key)
+        await self._write(redis_key, state, copy.deepcopy(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._load(self._key(key))
+        return copy.deepcopy(data)
+
+    async def close(self) -> None:
+        await self.redis.aclose()
+
+
+def reset_snapshot() -> None:
+    """Forgets records loaded during the current update, next read goes to Redis."""
+    snapshot = _snapshot.get()
+    if snapshot is not None:
+        snapshot.clear()
+
+
+class SnapshotDispatcher(Dispatcher):
+    """
+    Dispatcher that gives every update a fresh FSM snapshot. It is set around feed_update rather than
+    in a middleware because FSMContextMiddleware (registered by Dispatcher itself) reads the state
+    before any middleware of ours runs. Outside of an update nothing is cached.
+    """
+
+    async def feed_update(self, bot, update, **kwargs):
+        token = _snapshot.set({})
+        try:
+            return await super().feed_update(bot, update, **kwargs)
+        finally:
+            _snapshot.reset(token)
@@ -0,0 +1,134 @@
+"""
+Offline gazetteer for onboarding locations
+Resolves free-text "City" / "City, Country" (en/ru aliases) to a canonical city id with coordinates.
+Data is bundled in src/data and indexed into a prefix trie once at import.
+"""
+import csv
+import os
+import re
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional, Tuple
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+CITIES_FILE = os.path.join(DATA_DIR, "gazetteer_cities.csv")
+COUNTRIES_FILE = os.path.join(DATA_DIR, "gazetteer_countries.csv")
+
+
+class City(NamedTuple):
+    id: int
+    name: str
+    country: str
+    lat: float
+    lon: float
+
+
+class AliasTrie:
+    """Character trie: alias -> tuple of ids (several cities may share a name, file order = priority)."""
+    __slots__ = ("root",)
+
+    def __init__(self):
+        self.root = {}
+
+    def insert(self, alias: str, value) -> None:
+        node = self.root
+        for char in alias:
+            node = node.setdefault(char, {})
+        values = node.get(None, ())
+        if value not in values:
+            node[None] = values + (value,)
+
+    def get(self, text: str) -> tuple:
+        node = self.root
+        for char in text:
+            node = node.get(char)
+            if node is None:
+                return ()
+        return node.get(None, ())
+
+    def longest_prefix(self, text: str) -> Tuple[tuple, str]:
+        """Longest alias that starts the text on a word boundary, returns (values, rest of text)."""
+        node = self.root
+        best, best_end = (), 0
+        for i, char in enumerate(text):
+            node = node.get(char)
+            if node is None:
+                break
+            if None in node and (i + 1 == len(text) or text[i + 1] == " "):
+                best, best_end = node[None], i + 1
+        return best, text[best_end:].strip()
+
+
+def normalize_text(text: str) -> str:
+    text = text.lower().replace("ё", "е").strip()
+    text = re.sub(r"[^\w\s.'-]", " ", text)
+    return re.sub(r"\s+", " ", text).strip(" .")
+
+
+def _load():
+    cities: Dict[int, City] = {}
+    city_index = AliasTrie()
+    country_index = AliasTrie()
+    with open(COUNTRIES_FILE, encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            for alias in row["aliases"].split("|"):
+                country_index.insert(normalize_text(alias), row["country"])
+    with open(CITIES_FILE, encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            city = City(int(row["id"]), row["name"], row["country"], float(row["lat"]), float(row["lon"]))
+            cities[city.id] = city
+            for alias in row["aliases"].split("|") + [row["name"]]:
+                city_index.insert(normalize_text(alias), city.id)
+    return cities, city_index, country_index
+
+
+CITIES, CITY_INDEX, COUNTRY_INDEX = _load()
+
+
+def get_city(city_id: Optional[int]) -> Optional[City]:
+    return CITIES.get(city_id) if city_id is not None else None
+
+
+def resolve_country(text: Optional[str]) -> Optional[str]:
+    if not text:
+        return None
+    countries = COUNTRY_INDEX.get(normalize_text(text))
+    return countries[0] if countries else None
+
+
+def _pick(city_ids: tuple, country: Optional[str]) -> Optional[City]:
+    if not city_ids:
+        return None
+    if country:
+        for city_id in city_ids:
+            if CITIES[city_id].country == country:
+                return CITIES[city_id]
+    return CITIES[city_ids[0]]
+
+
+@lru_cache(maxsize=4096)
+def resolve_location(text: str) -> Optional[City]:
+    """Free-text location -> City or None. Accepts 'City', 'City, Country' and 'City Country'."""
+    if not text:
+        return None
+    parts = [p for p in (normalize_text(p) for p in text.split(",")) if p]
+    if not parts:
+        return None
+    country = resolve_country(parts[-1]) if len(parts) > 1 else None
+    city = _pick(CITY_INDEX.get(parts[0]), country)
+    if city:
+        return city
+    # "moscow russia" / "москва центр": longest known alias at the start
+    city_ids, rest = CITY_INDEX.longest_prefix(parts[0])
+    return _pick(city_ids, country or resolve_country(rest))
+
+
+def member_coordinates(member) -> Tuple[Optional[float], Optional[float]]:
+    """Member GPS coordinates, or centre of their gazetteer city for text-only locations."""
+    lat = getattr(member, "geolocation_lat", None)
+    lon = getattr(member, "geolocation_lon", None)
+    if lat is not None and lon is not None:
+        return lat, lon
+    city = get_city(getattr(member, "city_id", None))
+    if city:
+        return city.lat, city.lon
+    return None, None
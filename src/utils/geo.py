@@ -0,0 +1,101 @@
+"""
+Geo utilities for matching
+Geohash buckets for members with coordinates and vectorized haversine for candidate batches
+"""
+import math
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from src.utils.gazetteer import member_coordinates
+
+EARTH_RADIUS_KM = 6371
+GEOHASH_PRECISION = 6  # stored on GroupMember, ~1.2 x 0.6 km cell
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Cell size (width_km, height_km) at the equator for each geohash length
+GEOHASH_CELL_KM = {
+    1: (5009.4, 4992.6),
+    2: (1252.3, 624.1),
+    3: (156.5, 156.0),
+    4: (39.1, 19.5),
+    5: (4.9, 4.9),
+    6: (1.2, 0.61),
+}
+
+
+def encode_geohash(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    """Encodes coordinates into a geohash string."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits, bit_count, even = 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+
+def geohash_for_member(lat: Optional[float], lon: Optional[float]) -> Optional[str]:
+    if lat is None or lon is None:
+        return None
+    return encode_geohash(lat, lon)
+
+
+def prefix_precision_for_radius(lat: float, radius_km: float) -> int:
+    """Longest geohash length whose cell is still not smaller than radius (so 3x3 cells cover the circle)."""
+    cos_lat = max(math.cos(math.radians(lat)), 0.01)
+    best = 1
+    for precision, (width_km, height_km) in sorted(GEOHASH_CELL_KM.items()):
+        if min(width_km * cos_lat, height_km) >= radius_km:
+            best = precision
+    return best
+
+
+def geohash_prefixes_within(lat: float, lon: float, radius_km: float) -> List[str]:
+    """Geohash prefixes of the cell containing the point and its 8 neighbours."""
+    precision = prefix_precision_for_radius(lat, radius_km)
+    width_km, height_km = GEOHASH_CELL_KM[precision]
+    dlat = height_km / 111.32
+    dlon = width_km / 111.32
+    prefixes = []
+    for i in (-1, 0, 1):
+        for j in (-1, 0, 1):
+            n_lat = min(max(lat + i * dlat, -89.999), 89.999)
+            n_lon = ((lon + j * dlon + 180) % 360) - 180
+            prefix = encode_geohash(n_lat, n_lon, precision)
+            if prefix not in prefixes:
+                prefixes.append(prefix)
+    return prefixes
+
+
+def haversine_km_batch(lat: float, lon: float, lats: Sequence[float], lons: Sequence[float]) -> np.ndarray:
+    """Distances in km from one point to arrays of points (NaN where coordinates are missing)."""
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    lons = np.radians(np.asarray(lons, dtype=np.float64))
+    lat0, lon0 = math.radians(lat), math.radians(lon)
+    a = np.sin((lats - lat0) / 2) ** 2 + math.cos(lat0) * np.cos(lats) * np.sin((lons - lon0) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def member_distances_km(member, candidates) -> List[Optional[int]]:
+    """Rounded distances from member to every candidate in one vectorized pass (None without any location)."""
+    lat, lon = member_coordinates(member)
+    if lat is None or not candidates:
+        return [None] * len(candidates)
+    coords = [member_coordinates(c) for c in candidates]
+    lats = [c_lat if c_lat is not None else np.nan for c_lat, _ in coords]
+    lons = [c_lon if c_lon is not None else np.nan for _, c_lon in coords]
+    distances = haversine_km_batch(lat, lon, lats, lons)
+    return [None if np.isnan(d) else int(round(d)) for d in distances]
@@ -1,16 +1,142 @@
+"""
+Invite code allocation from a pre-generated pool
+Unused codes wait in the `invite_codes:pool` Redis set, a group gets one with a single atomic SPOP.
+The pool is refilled in batches: random candidates are checked against groups with one
+`invite_code IN (...)` query, then added by a Lua script that skips codes handed out but not yet
+saved (`invite_codes:issued`, kept for ISSUED_TTL seconds), so a code popped meanwhile is not re-added. A background task keeps the pool above
+INVITE_POOL_LOW_WATERMARK; an empty pool is refilled inline, and without Redis codes are drawn one by
+one against the database as before.
+"""
+import asyncio
+import logging
+import os
 import random
 import string
+import time
+from typing import Optional, Set
+
+from sqlalchemy import select
+
 from src.db import AsyncSessionLocal
 from src.models import Group
-from sqlalchemy import select
 
 CODE_LENGTH = 5
 CODE_CHARS = string.ascii_uppercase + string.digits
 
-async def generate_unique_invite_code():
+POOL_KEY = "invite_codes:pool"
+ISSUED_KEY = "invite_codes:issued"  # zset code -> issue time, until the group row exists
+REFILL_LOCK_KEY = "invite_codes:refill_lock"
+ISSUED_TTL = 24 * 3600
+INVITE_POOL_SIZE = int(os.getenv("INVITE_POOL_SIZE", 500))
+INVITE_POOL_LOW_WATERMARK = int(os.getenv("INVITE_POOL_LOW_WATERMARK", 100))
+INVITE_POOL_CHECK_INTERVAL = int(os.getenv("INVITE_POOL_CHECK_INTERVAL", 60))  # seconds
+
+# KEYS: pool, issued; ARGV: now
+_POP_SCRIPT = """
+local code = redis.call('SPOP', KEYS[1])
+if code then
+    redis.call('ZADD', KEYS[2], ARGV[1], code)
+end
+return code
+"""
+
+# KEYS: pool, issued; ARGV: codes
+_REFILL_SCRIPT = """
+local added = 0
+for i = 1, #ARGV do
+    if not redis.call('ZSCORE', KEYS[2], ARGV[i]) then
+        added = added + redis.call('SADD', KEYS[1], ARGV[i])
+    end
+end
+return added
+"""
+
+
+def _redis():
+    from src.utils.redis import redis
+    return redis
+
+
+_scripts = {}
+
+
+def _get_script(redis, source: str = _POP_SCRIPT):
+    script = _scripts.get(source)
+    if script is None or script.registered_client is not redis:
+        script = _scripts[source] = redis.register_script(source)
+    return script
+
+
+def random_codes(count: int, rng: random.Random = random) -> Set[str]:
+    return {''.join(rng.choices(CODE_CHARS, k=CODE_LENGTH)) for _ in range(count)}
+
+
+async def _codes_in_use(candidates: Set[str]) -> Set[str]:
+    async with AsyncSessionLocal() as session:
+        taken = await session.execute(select(Group.invite_code).where(Group.invite_code.in_(candidates)))
+        return set(taken.scalars().all())
+
+
+async def refill_invite_code_pool(target: int = INVITE_POOL_SIZE, redis=None) -> int:
+    """Tops the pool up to `target` codes, returns how many were added (0 if another process is refilling)."""
+    redis = redis or _redis()
+    if not await redis.set(REFILL_LOCK_KEY, 1, nx=True, ex=30):
+        return 0
+    try:
+        missing = target - await redis.scard(POOL_KEY)
+        if missing <= 0:
+            return 0
+        candidates = random_codes(missing)
+        candidates -= await _codes_in_use(candidates)
+        await redis.zremrangebyscore(ISSUED_KEY, "-inf", time.time() - ISSUED_TTL)
+        added = 0
+        if candidates:
+            added = await _get_script(redis, _REFILL_SCRIPT)(keys=[POOL_KEY, ISSUED_KEY], args=sorted(candidates))
+        logging.info(f"[refill_invite_code_pool] Added {added} codes")
+        return added
+    finally:
+        await redis.delete(REFILL_LOCK_KEY)
+
+
+async def _pop_code(redis) -> Optional[str]:
+    return await _get_script(redis)(keys=[POOL_KEY, ISSUED_KEY], args=[time.time()])
+
+
+async def _draw_code_from_db() -> str:
     while True:
-        code = ''.join(random.choices(CODE_CHARS, k=CODE_LENGTH))
-        async with AsyncSessionLocal() as session:
-            exists = await session.execute(select(Group).where(Group.invite_code == code))
-            if not exists.scalar():
-                return code 
\ No newline at end of file
+        code = next(iter(random_codes(1)))
+        if not await _codes_in_use({code}):
+            return code
+
+
+async def generate_unique_invite_code(redis=None) -> str:
+    """An invite code no group uses, normally one Redis round trip."""
+    redis = redis or _redis()
+    try:
+        code = await _pop_code(redis)
+        if code is None:
+            await refill_invite_code_pool(redis=redis)
+            code = await _pop_code(redis)
+        if code is not None:
+            return code
+    except Exception as e:
+        logging.warning(f"[generate_unique_invite_code] Pool unavailable, drawing from the database: {e}")
+    return await _draw_code_from_db()
+
+
+async def keep_invite_code_pool_filled(redis=None, stop_event: Optional[asyncio.Event] = None) -> None:
+    """Refills the pool whenever it drops below the low watermark."""
+    redis = redis or _redis()
+    while not (stop_event and stop_event.is_set()):
+        try:
+            if await redis.scard(POOL_KEY) < INVITE_POOL_LOW_WATERMARK:
+                await refill_invite_code_pool(redis=redis)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.warning(f"[keep_invite_code_pool_filled] Refill failed: {e}")
+        await asyncio.sleep(INVITE_POOL_CHECK_INTERVAL)
+
+
+def start_invite_code_refiller() -> asyncio.Task:
+    return asyncio.create_task(keep_invite_code_pool_filled(), name="invite-code-refiller")
@@ -0,0 +1,149 @@
+"""
+Redis caches of the group join path
+Invite links are shared in bursts, so what every join of a group reads is kept in Redis:
+- `invite:{code}`: id, name and description of the group with that code (deleted with the group)
+- `group_banned:{group_id}`: ids of users banned from the group, loaded from banned_users with one
+  query on a miss (the marker member keeps an empty set in Redis). A new ban is added to a loaded set
+  and bumps `group_banned_gen:{group_id}`; a fill only lands if that generation did not move since
+  its query, so a load that raced a ban cannot bring the set back without it
+Both fall back to the database when Redis is unavailable.
+"""
+import json
+import logging
+import os
+from typing import Optional
+
+from sqlalchemy import select
+
+from src.models import BannedUser, Group
+
+INVITE_CACHE_TTL = int(os.getenv("INVITE_CACHE_TTL", 3600))
+BANNED_CACHE_TTL = int(os.getenv("BANNED_CACHE_TTL", 3600))
+_LOADED_MARKER = "-"
+
+# KEYS: set, generation; ARGV: generation read before the query ("" if none), ttl, ids...
+_FILL_SCRIPT = """
+local generation = redis.call('GET', KEYS[2]) or ''
+if generation ~= ARGV[1] then
+    return 0
+end
+for i = 3, #ARGV do
+    redis.call('SADD', KEYS[1], ARGV[i])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+# KEYS: set, generation; ARGV: user id, ttl
+_BAN_SCRIPT = """
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('SADD', KEYS[1], ARGV[1])
+end
+"""
+
+
+def _redis():
+    from src.utils.redis import redis
+    return redis
+
+
+_scripts = {}
+
+
+def _get_script(redis, source: str):
+    script = _scripts.get(source)
+    if script is None or script.registered_client is not redis:
+        script = _scripts[source] = redis.register_script(source)
+    return script
+
+
+def _invite_key(code: str) -> str:
+    return f"invite:{code}"
+
+
+def _banned_key(group_id: int) -> str:
+    return f"group_banned:{group_id}"
+
+
+def _banned_generation_key(group_id: int) -> str:
+    return f"group_banned_gen:{group_id}"
+
+
+async def get_group_by_code(session, code: str, redis=None) -> Optional[dict]:
+    """{"id", "name", "description"} of the group with invite code `code`, or None."""
+    redis = redis or _redis()
+    try:
+        cached = await redis.get(_invite_key(code))
+        if cached:
+            return json.loads(cached)
+    except Exception as e:
+        logging.warning(f"[get_group_by_code] Cache read failed for {code}: {e}")
+    group = await session.execute(select(Group.id, Group.name, Group.description).where(Group.invite_code == code))
+    group = group.first()
+    if not group:
+        return None
+    group = {"id": group.id, "name": group.name, "description": group.description}
+    try:
+        await redis.set(_invite_key(code), json.dumps(group), ex=INVITE_CACHE_TTL)
+    except Exception as e:
+        logging.warning(f"[get_group_by_code] Cache write failed for {code}: {e}")
+    return group
+
+
+async def is_banned(session, group_id: int, user_id: int, redis=None) -> bool:
+    redis = redis or _redis()
+    key = _banned_key(group_id)
+    generation_key = _banned_generation_key(group_id)
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.exists(key)
+            pipe.sismember(key, str(user_id))
+            pipe.get(generation_key)
+            loaded, banned, generation = await pipe.execute()
+        if loaded:
+            return bool(banned)
+    except Exception as e:
+        logging.warning(f"[is_banned] Cache read failed for group {group_id}: {e}")
+        banned = await session.execute(select(BannedUser.id).where(BannedUser.group_id == group_id, BannedUser.user_id == user_id))
+        return banned.first() is not None
+    banned_ids = await session.execute(select(BannedUser.user_id).where(BannedUser.group_id == group_id))
+    banned_ids = set(banned_ids.scalars().all())
+    try:
+        await _get_script(redis, _FILL_SCRIPT)(
+            keys=[key, generation_key],
+            args=[generation or "", BANNED_CACHE_TTL, _LOADED_MARKER, *banned_ids],
+        )
+    except Exception as e:
+        logging.warning(f"[is_banned] Cache write failed for group {group_id}: {e}")
+    return user_id in banned_ids
+
+
+async def invalidate_invite_code(code: str, redis=None) -> None:
+    redis = redis or _redis()
+    try:
+        await redis.delete(_invite_key(code))
+    except Exception as e:
+        logging.warning(f"[invalidate_invite_code] Failed for {code}, cached until TTL: {e}")
+
+
+async def add_banned_user(group_id: int, user_id: int, redis=None) -> None:
+    """Call after the ban is committed."""
+    redis = redis or _redis()
+    try:
+        await _get_script(redis, _BAN_SCRIPT)(
+            keys=[_banned_key(group_id), _banned_generation_key(group_id)],
+            args=[user_id, BANNED_CACHE_TTL],
+        )
+    except Exception as e:
+        logging.warning(f"[add_banned_user] Failed for group {group_id}, dropping the cached set: {e}")
+        await invalidate_banned_users(group_id, redis)
+
+
+async def invalidate_banned_users(group_id: int, redis=None) -> None:
+    redis = redis or _redis()
+    try:
+        await redis.delete(_banned_key(group_id))
+    except Exception as e:
+        logging.warning(f"[invalidate_banned_users] Failed for group {group_id}, cached until TTL: {e}")
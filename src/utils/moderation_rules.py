@@ -0,0 +1,122 @@
+"""
+Local moderation rules for submitted questions
+Banned words are matched with an Aho-Corasick automaton (one pass over the text for the whole list),
+spam heuristics are plain regex/counting checks. Everything here is pure and CPU-only.
+"""
+import os
+import re
+from collections import Counter, deque
+from typing import List, NamedTuple, Set, Tuple
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+BANNED_WORDS_FILE = os.getenv("MODERATION_BANNED_WORDS_FILE", os.path.join(DATA_DIR, "banned_words.txt"))
+
+# Flags that reject a question on their own; the rest send it to the admin review queue
+HARD_FLAGS = {"banned_word", "duplicate", "rate_limited"}
+
+_LINK_RE = re.compile(r"(https?://|www\.|t\.me/|\b\w+\.(com|ru|net|org|io|xyz)\b)", re.IGNORECASE)
+_MENTION_RE = re.compile(r"@\w{4,}")
+_REPEATED_CHAR_RE = re.compile(r"(.)\1{5,}")
+
+
+def normalize_for_matching(text: str) -> str:
+    return text.lower().replace("ё", "е")
+
+
+class BannedWordAutomaton:
+    """Aho-Corasick automaton over banned terms, matches whole words only."""
+
+    def __init__(self, terms):
+        self.goto: List[dict] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[str]] = [[]]
+        for term in terms:
+            self._add(normalize_for_matching(term.strip()))
+        self._build()
+
+    def _add(self, term: str) -> None:
+        if not term:
+            return
+        node = 0
+        for char in term:
+            if char not in self.goto[node]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[node][char] = len(self.goto) - 1
+            node = self.goto[node][char]
+        self.output[node].append(term)
+
+    def _build(self) -> None:
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[child] = target if target != child else 0
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def find(self, text: str) -> Set[str]:
+        text = normalize_for_matching(text)
+        found, node = set(), 0
+        for i, char in enumerate(text):
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            for term in self.output[node]:
+                start, end = i - len(term) + 1, i + 1
+                if (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum()):
+                    found.add(term)
+        return found
+
+
+def load_banned_words(path: str = BANNED_WORDS_FILE) -> List[str]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    except FileNotFoundError:
+        return []
+
+
+BANNED_WORDS = BannedWordAutomaton(load_banned_words())
+
+
+def spam_flags(text: str) -> List[str]:
+    """Soft spam signals of a single question text."""
+    flags = []
+    if _LINK_RE.search(text):
+        flags.append("link")
+    if _MENTION_RE.search(text):
+        flags.append("mention")
+    if _REPEATED_CHAR_RE.search(text):
+        flags.append("repeated_chars")
+    words = re.findall(r"\w+", normalize_for_matching(text))
+    if len(words) >= 4:
+        _, top = Counter(words).most_common(1)[0]
+        if top >= 3 and top / len(words) > 0.4:
+            flags.append("repeated_words")
+    letters = [c for c in text if c.isalpha()]
+    if len(letters) >= 10 and sum(c.isupper() for c in letters) / len(letters) > 0.6:
+        flags.append("caps")
+    if not letters:
+        flags.append("no_letters")
+    return flags
+
+
+class ModerationVerdict(NamedTuple):
+    decision: str  # 'approve' | 'reject' | 'review'
+    flags: Tuple[str, ...]
+
+
+def decide(flags: List[str], auto_approve: bool = True, auto_reject: bool = True) -> ModerationVerdict:
+    """Hard flag -> reject, any other flag -> review, clean -> approve (each auto step can be turned off)."""
+    names = {flag.split(":", 1)[0] for flag in flags}
+    if names & HARD_FLAGS:
+        return ModerationVerdict("reject" if auto_reject else "review", tuple(flags))
+    if flags or not auto_approve:
+        return ModerationVerdict("review", tuple(flags))
+    return ModerationVerdict("approve", ())
@@ -0,0 +1,177 @@
+"""
+Near-duplicate question detection
+Questions are normalized into character 4-gram shingles and summarized by a 64-value MinHash signature
+(stored in questions.minhash). Per group, signatures are bucketed by LSH (16 bands x 4 rows), so
+"similar existing questions" is a few dict lookups instead of a scan of the group.
+The index follows the question catalog version: changes made by this process are applied
+incrementally, changes from other replicas (version jump) trigger a rebuild from stored signatures.
+"""
+import os
+import re
+import zlib
+from collections import OrderedDict, defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import select, update
+
+from src.models import Question
+from src.utils.question_catalog import QUESTION_CATALOG_MAX_GROUPS, get_group_catalog
+
+NUM_PERM = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+SHINGLE_SIZE = 4
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", 0.5))  # estimated Jaccard
+_rng = np.random.default_rng(20240601)  # fixed seed: stored signatures must stay comparable
+_A = _rng.integers(0, np.iinfo(np.uint64).max, size=NUM_PERM, dtype=np.uint64, endpoint=True) | np.uint64(1)
+_B = _rng.integers(0, np.iinfo(np.uint64).max, size=NUM_PERM, dtype=np.uint64, endpoint=True)
+
+
+def normalize_question(text: str) -> str:
+    words = re.findall(r"\w+", text.lower().replace("ё", "е"))
+    return " ".join(words)
+
+
+def shingles(text: str) -> Set[str]:
+    normalized = normalize_question(text)
+    if len(normalized) <= SHINGLE_SIZE:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    hashes = np.fromiter((zlib.crc32(s.encode()) for s in shingles(text)), dtype=np.uint64)
+    if not hashes.size:
+        return np.full(NUM_PERM, 0xFFFFFFFF, dtype=np.uint32)
+    # Multiply-shift hash (a * x + b mod 2^64) >> 32 per permutation and shingle, min over shingles
+    permuted = (np.outer(hashes, _A) + _B) >> np.uint64(32)
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def signature_to_bytes(signature: np.ndarray) -> bytes:
+    return signature.astype("<u4").tobytes()
+
+
+def signature_from_bytes(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype="<u4").astype(np.uint32)
+
+
+def estimate_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+def _band_keys(signature: np.ndarray) -> List[Tuple[int, bytes]]:
+    return [(band, signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes()) for band in range(LSH_BANDS)]
+
+
+class NearDuplicateIndex:
+    """LSH buckets of MinHash signatures for one group."""
+    __slots__ = ("version", "signatures", "buckets")
+
+    def __init__(self, version: int):
+        self.version = version
+        self.signatures: Dict[int, np.ndarray] = {}
+        self.buckets: Dict[Tuple[int, bytes], Set[int]] = defaultdict(set)
+
+    def add(self, question_id: int, signature: np.ndarray) -> None:
+        self.remove(question_id)
+        self.signatures[question_id] = signature
+        for key in _band_keys(signature):
+            self.buckets[key].add(question_id)
+
+    def remove(self, question_id: int) -> None:
+        signature = self.signatures.pop(question_id, None)
+        if signature is None:
+            return
+        for key in _band_keys(signature):
+            bucket = self.buckets.get(key)
+            if bucket:
+                bucket.discard(question_id)
+                if not bucket:
+                    del self.buckets[key]
+
+    def query(self, signature: np.ndarray, threshold: float = NEAR_DUPLICATE_THRESHOLD, limit: int = 3) -> List[Tuple[int, float]]:
+        """(question_id, estimated similarity) of LSH candidates above threshold, most similar first."""
+        candidates = set()
+        for key in _band_keys(signature):
+            candidates |= self.buckets.get(key, set())
+        scored = [(qid, estimate_similarity(signature, self.signatures[qid])) for qid in candidates]
+        scored = [item for item in scored if item[1] >= threshold]
+        scored.sort(key=lambda item: -item[1])
+        return scored[:limit]
+
+
+_indexes: "OrderedDict[int, NearDuplicateIndex]" = OrderedDict()
+
+
+async def rebuild_group_index(session, group_id: int, version: int) -> NearDuplicateIndex:
+    """Index of pending/approved questions from stored signatures, missing ones are computed and written back."""
+    rows = await session.execute(
+        select(Question.id, Question.text, Question.minhash)
+        .where(Question.group_id == group_id, Question.is_deleted == 0, Question.status != "rejected")
+    )
+    index = NearDuplicateIndex(version)
+    missing = []
+    for question_id, text, stored in rows.all():
+        if stored:
+            signature = signature_from_bytes(stored)
+        else:
+            signature = minhash_signature(text)
+            missing.append({"id": question_id, "minhash": signature_to_bytes(signature)})
+        index.add(question_id, signature)
+    if missing:
+        # ORM bulk UPDATE by primary key, saved with the caller's next commit
+        await session.execute(update(Question), missing)
+    _indexes[group_id] = index
+    _indexes.move_to_end(group_id)
+    while len(_indexes) > QUESTION_CATALOG_MAX_GROUPS:
+        _indexes.popitem(last=False)
+    return index
+
+
+async def get_group_index(session, group_id: int) -> NearDuplicateIndex:
+    catalog = await get_group_catalog(group_id, session)
+    index = _indexes.get(group_id)
+    if index is not None and index.version == catalog.version:
+        _indexes.move_to_end(group_id)
+        return index
+    return await rebuild_group_index(session, group_id, catalog.version)
+
+
+def _apply_change(group_id: int, version: Optional[int], change) -> None:
+    index = _indexes.get(group_id)
+    if index is None:
+        return
+    if version is not None and index.version == version - 1:
+        change(index)
+        index.version = version
+    else:
+        # Somebody else changed the group in between (or version unknown): rebuild on next use
+        del _indexes[group_id]
+
+
+def index_question(group_id: int, question_id: int, signature: np.ndarray, version: Optional[int]) -> None:
+    """Apply a question added by this process (version = catalog version after the change)."""
+    _apply_change(group_id, version, lambda index: index.add(question_id, signature))
+
+
+def unindex_question(group_id: int, question_id: int, version: Optional[int]) -> None:
+    unindex_questions(group_id, [question_id], version)
+
+
+def unindex_questions(group_id: int, question_ids: Iterable[int], version: Optional[int]) -> None:
+    def change(index: NearDuplicateIndex) -> None:
+        for question_id in question_ids:
+            index.remove(question_id)
+    _apply_change(group_id, version, change)
+
+
+def follow_group_version(group_id: int, version: Optional[int]) -> None:
+    """Catalog change that keeps the indexed set (pending -> approved): only the version moves."""
+    _apply_change(group_id, version, lambda index: None)
+
+
+def drop_group_index(group_id: int) -> None:
+    """Bulk changes (ban, group delete): rebuild on next use."""
+    _indexes.pop(group_id, None)
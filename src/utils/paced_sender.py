@@ -0,0 +1,52 @@
+"""
+Paced sending of several messages to one chat
+Telegram throttles bursts to a single chat; a token bucket keeps replays (pending requests, history pages)
+under that limit, and flood-wait responses are honoured once instead of failing the rest of the batch.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, List
+
+from aiogram.exceptions import TelegramRetryAfter
+
+CHAT_SEND_BURST = int(os.getenv("CHAT_SEND_BURST", 5))  # messages sent back to back
+CHAT_SENDS_PER_SECOND = float(os.getenv("CHAT_SENDS_PER_SECOND", 1))  # sustained rate after the burst
+
+_background = set()  # strong references to running background batches, the loop only keeps weak ones
+
+
+async def send_paced(sends: List[Callable[[], Awaitable]], burst: int = CHAT_SEND_BURST, rate: float = CHAT_SENDS_PER_SECOND) -> int:
+    """Awaits each send() in order under a token bucket, returns how many succeeded."""
+    tokens, last, sent = float(burst), time.monotonic(), 0
+    for send in sends:
+        now = time.monotonic()
+        tokens = min(burst, tokens + (now - last) * rate)
+        last = now
+        if tokens < 1:
+            await asyncio.sleep((1 - tokens) / rate)
+            tokens, last = 1.0, time.monotonic()
+        tokens -= 1
+        for attempt in range(2):
+            try:
+                await send()
+                sent += 1
+                break
+            except TelegramRetryAfter as e:
+                if attempt:
+                    logging.warning(f"[send_paced] Still flood-limited after waiting, skipping: {e}")
+                    break
+                await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                logging.error(f"[send_paced] Send failed: {e}")
+                break
+    return sent
+
+
+def send_paced_in_background(sends: List[Callable[[], Awaitable]], name: str = "paced-sends") -> asyncio.Task:
+    """Runs send_paced() as a task that is kept referenced until it finishes."""
+    task = asyncio.create_task(send_paced(sends), name=name)
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    return task
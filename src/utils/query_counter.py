@@ -0,0 +1,46 @@
+"""
+Per-task SQL statement counting
+install(engine) adds one cursor hook to the engine; inside `with count_queries() as counter:` every
+statement executed by the current task (and by tasks it spawns) is recorded in the counter.
+Outside such a block the hook only does a context variable lookup.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+from sqlalchemy import event
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements: List[str] = []
+
+    @property
+    def total(self) -> int:
+        return len(self.statements)
+
+
+_current: ContextVar[Optional[QueryCounter]] = ContextVar("query_counter", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    counter = _current.get()
+    if counter is not None:
+        counter.statements.append(statement)
+
+
+def install(engine) -> None:
+    """Hooks an (async) engine, safe to call more than once."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+
+
+@contextmanager
+def count_queries():
+    counter = QueryCounter()
+    token = _current.set(counter)
+    try:
+        yield counter
+    finally:
+        _current.reset(token)
@@ -0,0 +1,214 @@
+"""
+In-process question catalog per group
+Keeps (id, text, status, ordinal) of every live question of recently used groups, so question lists
+and unanswered counts don't re-read the questions table on every interaction.
+Each group has a version counter in Redis. Create/approve/reject/delete bump it and publish it on the
+`question_catalog` channel, every replica drops its copy on the message. Groups are evicted LRU,
+entries also expire after QUESTION_CATALOG_TTL seconds in case a pub/sub message was missed.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import select
+
+from src.db import AsyncSessionLocal
+from src.models import Answer, Question
+
+QUESTION_CATALOG_MAX_GROUPS = int(os.getenv("QUESTION_CATALOG_MAX_GROUPS", 1000))
+QUESTION_CATALOG_TTL = int(os.getenv("QUESTION_CATALOG_TTL", 300))  # seconds
+INVALIDATION_CHANNEL = "question_catalog"
+VERSION_KEY = "qcat:ver:{group_id}"
+
+
+class CatalogQuestion(NamedTuple):
+    id: int
+    text: str
+    status: str
+    ordinal: int  # position among approved questions (1-based), 0 for pending/rejected
+    author_id: int
+    created_at: Optional[datetime]
+
+    def to_question(self, group_id: int) -> Question:
+        """Transient Question (not attached to a session) for code that expects the model."""
+        return Question(
+            id=self.id, group_id=group_id, author_id=self.author_id, text=self.text,
+            status=self.status, created_at=self.created_at, is_deleted=0
+        )
+
+
+class GroupCatalog:
+    __slots__ = ("group_id", "version", "questions", "by_id", "approved", "loaded_at")
+
+    def __init__(self, group_id: int, version: int, questions: List[CatalogQuestion]):
+        self.group_id = group_id
+        self.version = version
+        self.questions = questions
+        self.by_id: Dict[int, CatalogQuestion] = {q.id: q for q in questions}
+        self.approved = [q for q in questions if q.status == "approved"]
+        self.loaded_at = time.monotonic()
+
+    @property
+    def approved_ids(self) -> List[int]:
+        return [q.id for q in self.approved]
+
+    def count_by_status(self) -> Dict[str, int]:
+        counts = {}
+        for q in self.questions:
+            counts[q.status] = counts.get(q.status, 0) + 1
+        return counts
+
+
+class QuestionCatalogCache:
+    """LRU of GroupCatalog by group id."""
+
+    def __init__(self, max_groups: int = QUESTION_CATALOG_MAX_GROUPS, ttl: int = QUESTION_CATALOG_TTL):
+        self.max_groups = max_groups
+        self.ttl = ttl
+        self._groups: "OrderedDict[int, GroupCatalog]" = OrderedDict()
+        # Same cap as the catalogs: a forgotten version only loses the stale-load guard, TTL still applies
+        self._seen_versions: "OrderedDict[int, int]" = OrderedDict()
+
+    def get(self, group_id: int) -> Optional[GroupCatalog]:
+        catalog = self._groups.get(group_id)
+        if catalog is None:
+            return None
+        if time.monotonic() - catalog.loaded_at > self.ttl or catalog.version < self._seen_versions.get(group_id, 0):
+            del self._groups[group_id]
+            return None
+        self._groups.move_to_end(group_id)
+        return catalog
+
+    def put(self, catalog: GroupCatalog) -> None:
+        if catalog.version < self._seen_versions.get(catalog.group_id, 0):
+            # Invalidated while it was loading, don't keep a stale copy
+            return
+        self._groups[catalog.group_id] = catalog
+        self._groups.move_to_end(catalog.group_id)
+        while len(self._groups) > self.max_groups:
+            self._groups.popitem(last=False)
+
+    def invalidate(self, group_id: int, version: Optional[int] = None) -> None:
+        if version is not None:
+            self._seen_versions[group_id] = max(version, self._seen_versions.get(group_id, 0))
+            self._seen_versions.move_to_end(group_id)
+            while len(self._seen_versions) > self.max_groups:
+                self._seen_versions.popitem(last=False)
+        self._groups.pop(group_id, None)
+
+    def clear(self) -> None:
+        self._groups.clear()
+        self._seen_versions.clear()
+
+
+catalog_cache = QuestionCatalogCache()
+
+
+def _redis():
+    from src.utils.redis import redis
+    return redis
+
+
+async def _current_version(group_id: int) -> int:
+    try:
+        version = await _redis().get(VERSION_KEY.format(group_id=group_id))
+        return int(version) if version else 0
+    except Exception as e:
+        logging.warning(f"[question_catalog] Version read failed for group {group_id}: {e}")
+        return 0
+
+
+async def _load_catalog(session, group_id: int) -> GroupCatalog:
+    version = await _current_version(group_id)
+    rows = await session.execute(
+        select(Question.id, Question.text, Question.status, Question.author_id, Question.created_at)
+        .where(Question.group_id == group_id, Question.is_deleted == 0)
+        .order_by(Question.created_at, Question.id)
+    )
+    questions, ordinal = [], 0
+    for row in rows.all():
+        if row.status == "approved":
+            ordinal += 1
+        questions.append(CatalogQuestion(row.id, row.text, row.status, ordinal if row.status == "approved" else 0, row.author_id, row.created_at))
+    return GroupCatalog(group_id, version, questions)
+
+
+async def get_group_catalog(group_id: int, session=None) -> GroupCatalog:
+    """Catalog of live questions of the group, from memory or one query on miss."""
+    catalog = catalog_cache.get(group_id)
+    if catalog is not None:
+        return catalog
+    if session is None:
+        async with AsyncSessionLocal() as session:
+            catalog = await _load_catalog(session, group_id)
+    else:
+        catalog = await _load_catalog(session, group_id)
+    catalog_cache.put(catalog)
+    return catalog
+
+
+async def invalidate_group_catalog(group_id: int) -> Optional[int]:
+    """Call after commit of any question create/approve/reject/delete in the group. Returns the new version."""
+    catalog_cache.invalidate(group_id)
+    try:
+        redis = _redis()
+        version = await redis.incr(VERSION_KEY.format(group_id=group_id))
+        catalog_cache.invalidate(group_id, version)
+        await redis.publish(INVALIDATION_CHANNEL, f"{group_id}:{version}")
+        return version
+    except Exception as e:
+        logging.warning(f"[invalidate_group_catalog] Publish failed for group {group_id}, other replicas rely on TTL: {e}")
+        return None
+
+
+async def get_answered_ids(session, user_id: int, question_ids: List[int]) -> set:
+    if not question_ids:
+        return set()
+    rows = await session.execute(
+        select(Answer.question_id).where(Answer.user_id == user_id, Answer.question_id.in_(question_ids))
+    )
+    return {row[0] for row in rows.all()}
+
+
+async def get_unanswered(session, group_id: int, user_id: int) -> List[CatalogQuestion]:
+    """Approved questions of the group without user's Answer, in catalog order (one Answer query)."""
+    catalog = await get_group_catalog(group_id, session)
+    answered = await get_answered_ids(session, user_id, catalog.approved_ids)
+    return [q for q in catalog.approved if q.id not in answered]
+
+
+async def listen_for_invalidations(redis=None, stop_event: Optional[asyncio.Event] = None) -> None:
+    """Drops local catalogs on messages from other replicas, reconnects on errors."""
+    redis = redis or _redis()
+    while not (stop_event and stop_event.is_set()):
+        pubsub = redis.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Anything published while we were not subscribed is unknown: start clean
+            catalog_cache.clear()
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                data = message["data"].decode() if isinstance(message["data"], bytes) else message["data"]
+                group_id, _, version = data.partition(":")
+                catalog_cache.invalidate(int(group_id), int(version) if version else None)
+                if stop_event and stop_event.is_set():
+                    break
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.warning(f"[listen_for_invalidations] Subscription lost: {e}")
+            await asyncio.sleep(1)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+
+
+def start_catalog_listener() -> asyncio.Task:
+    return asyncio.create_task(listen_for_invalidations(), name="question-catalog-listener")
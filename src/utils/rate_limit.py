@@ -0,0 +1,129 @@
+"""
+Sliding-window rate limits for question submissions
+Checked before anything is written to PostgreSQL, so spam bursts are turned away with one Redis call.
+Each scope is a sorted set of submission timestamps; one Lua script trims the windows, checks all scopes
+and records the submission only if every scope has room. Allowed/blocked counters per scope are kept
+in the `ratelimit:stats` hash (shared by all processes) and exposed on /metrics.
+
+Limits are "count/seconds", e.g. RATE_LIMIT_QUESTIONS_USER=10/3600; an empty value disables the scope.
+"""
+import logging
+import os
+import time
+import uuid
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+STATS_KEY = "ratelimit:stats"
+
+
+def parse_limit(value: Optional[str]) -> Optional[Tuple[int, int]]:
+    """'5/3600' -> (5, 3600), empty -> None."""
+    if not value:
+        return None
+    count, _, seconds = value.partition("/")
+    return int(count), int(seconds or 60)
+
+
+# Per user across all groups, per user in one group, and per group review queue (what reaches the admin)
+QUESTION_LIMITS = {
+    "user": parse_limit(os.getenv("RATE_LIMIT_QUESTIONS_USER", "10/3600")),
+    "user_group": parse_limit(os.getenv("RATE_LIMIT_QUESTIONS_USER_GROUP", "5/3600")),
+    "group_queue": parse_limit(os.getenv("RATE_LIMIT_QUESTIONS_GROUP", "30/3600")),
+}
+
+# KEYS: window keys..., stats key; ARGV: now_ms, member, scope names..., then (limit, window_ms) pairs
+_SLIDING_WINDOW_SCRIPT = """
+local n = #KEYS - 1
+local now = tonumber(ARGV[1])
+for i = 1, n do
+    local limit = tonumber(ARGV[2 + n + (i - 1) * 2 + 1])
+    local window = tonumber(ARGV[2 + n + (i - 1) * 2 + 2])
+    redis.call('ZREMRANGEBYSCORE', KEYS[i], '-inf', now - window)
+    if redis.call('ZCARD', KEYS[i]) >= limit then
+        redis.call('HINCRBY', KEYS[n + 1], ARGV[2 + i] .. ':blocked', 1)
+        local oldest = redis.call('ZRANGE', KEYS[i], 0, 0, 'WITHSCORES')
+        return {i, tonumber(oldest[2]) + window - now}
+    end
+end
+for i = 1, n do
+    local window = tonumber(ARGV[2 + n + (i - 1) * 2 + 2])
+    redis.call('ZADD', KEYS[i], now, ARGV[2])
+    redis.call('PEXPIRE', KEYS[i], window)
+    redis.call('HINCRBY', KEYS[n + 1], ARGV[2 + i] .. ':allowed', 1)
+end
+return {0, 0}
+"""
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    scope: Optional[str] = None  # the scope that blocked
+    retry_after: int = 0  # seconds until the oldest submission leaves that window
+
+
+def _redis():
+    from src.utils.redis import redis
+    return redis
+
+
+_script = None
+
+
+def _get_script(redis):
+    global _script
+    if _script is None or _script.registered_client is not redis:
+        _script = redis.register_script(_SLIDING_WINDOW_SCRIPT)
+    return _script
+
+
+async def hit(scopes: Dict[str, Tuple[str, Optional[Tuple[int, int]]]], redis=None) -> RateLimitResult:
+    """Records one event in every scope {name: (key, (limit, seconds))} if all have room (fails open)."""
+    active = [(name, key, limit) for name, (key, limit) in scopes.items() if limit]
+    if not active:
+        return RateLimitResult(True)
+    redis = redis or _redis()
+    keys = [key for _, key, _ in active] + [STATS_KEY]
+    args: List = [int(time.time() * 1000), uuid.uuid4().hex] + [name for name, _, _ in active]
+    for _, _, (count, seconds) in active:
+        args += [count, seconds * 1000]
+    try:
+        blocked, retry_ms = await _get_script(redis)(keys=keys, args=args)
+    except Exception as e:
+        logging.warning(f"[rate_limit] Redis unavailable, allowing: {e}")
+        return RateLimitResult(True)
+    if not blocked:
+        return RateLimitResult(True)
+    return RateLimitResult(False, active[int(blocked) - 1][0], max(1, (int(retry_ms) + 999) // 1000))
+
+
+async def check_question_submission(user_id: int, group_id: int, redis=None) -> RateLimitResult:
+    """Counts a question submission of user to group against QUESTION_LIMITS."""
+    return await hit({
+        "user": (f"ratelimit:q:user:{user_id}", QUESTION_LIMITS["user"]),
+        "user_group": (f"ratelimit:q:user_group:{user_id}:{group_id}", QUESTION_LIMITS["user_group"]),
+        "group_queue": (f"ratelimit:q:group:{group_id}", QUESTION_LIMITS["group_queue"]),
+    }, redis)
+
+
+async def get_rate_limit_stats(redis=None) -> Dict[str, int]:
+    """{'scope:allowed' | 'scope:blocked': count} since the stats hash was created."""
+    redis = redis or _redis()
+    stats = await redis.hgetall(STATS_KEY)
+    return {field: int(value) for field, value in stats.items()}
+
+
+async def render_metrics(redis=None) -> str:
+    """Counters in Prometheus text format."""
+    lines = [
+        "# HELP allkinds_rate_limit_total Rate-limited events by scope and result",
+        "# TYPE allkinds_rate_limit_total counter",
+    ]
+    try:
+        stats = await get_rate_limit_stats(redis)
+    except Exception as e:
+        logging.warning(f"[rate_limit] Stats read failed: {e}")
+        stats = {}
+    for field, value in sorted(stats.items()):
+        scope, _, result = field.rpartition(":")
+        lines.append(f'allkinds_rate_limit_total{{scope="{scope}",result="{result}"}} {value}')
+    return "\n".join(lines) + "\n"
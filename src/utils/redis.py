@@ -1,32 +1,29 @@
-import redis.asyncio as aioredis
-import os
 from src.db import AsyncSessionLocal
 from src.models import User
 from sqlalchemy import select
 import logging
-
-REDIS_URL = os.getenv("REDIS_PUBLIC_URL", os.getenv("REDIS_URL", "redis://localhost:6379/0"))
-
-redis = aioredis.from_url(REDIS_URL, decode_responses=True)
+from src.utils.redis_manager import batch, cached_get, invalidate_local, redis
 
 TTL_DAYS = 30
 TTL_SECONDS = TTL_DAYS * 24 * 60 * 60
 
 async def set_telegram_mapping(telegram_user_id: int, internal_user_id: int, ttl: int = TTL_SECONDS):
     key = f"tg2int:{telegram_user_id}"
-    await redis.setex(key, ttl, internal_user_id)
     # Bidirectional mapping
     key2 = f"int2tg:{internal_user_id}"
-    await redis.setex(key2, ttl, telegram_user_id)
+    async with batch() as pipe:
+        pipe.setex(key, ttl, internal_user_id)
+        pipe.setex(key2, ttl, telegram_user_id)
+    invalidate_local(key, key2)
 
 async def get_internal_user_id(telegram_user_id: int):
     key = f"tg2int:{telegram_user_id}"
-    val = await redis.get(key)
+    val = await cached_get(key)
     return int(val) if val else None
 
 async def get_telegram_user_id(internal_user_id: int):
     key = f"int2tg:{internal_user_id}"
-    val = await redis.get(key)
+    val = await cached_get(key)
     return int(val) if val else None
 
 async def update_ttl(telegram_user_id: int, ttl: int = TTL_SECONDS):
@@ -53,8 +50,8 @@ async def get_or_restore_internal_user_id(state, telegram_user_id):
             else:
                 logging.warning(f"[get_or_restore_internal_user_id] user_id from Redis not found in DB: {user_id}")
                 # Remove outdated mappings
-                await redis.delete(f"tg2int:{telegram_user_id}")
-                await redis.delete(f"int2tg:{user_id}")
+                await redis.delete(f"tg2int:{telegram_user_id}", f"int2tg:{user_id}")
+                invalidate_local(f"tg2int:{telegram_user_id}", f"int2tg:{user_id}")
     # If not found — create new user and update Redis
     async with AsyncSessionLocal() as session:
         user = User()
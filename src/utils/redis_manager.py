@@ -0,0 +1,174 @@
+"""
+The process-wide Redis connection manager
+One bounded, health-checked connection pool per decoding mode: text for everything else, binary for
+the msgpack FSM storage. Both clients time every command for /metrics. Read-mostly keys (Telegram id
+mappings) can be read through a small in-process cache that this process invalidates on
+writes; other processes see a change after at most REDIS_LOCAL_CACHE_TTL seconds.
+
+    async with batch() as pipe:      # one round trip, executed on exit, results in pipe.results
+        pipe.set("a", 1)
+        pipe.expire("b", 60)
+"""
+import logging
+import os
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+
+import redis.asyncio as aioredis
+from redis.asyncio.client import Pipeline
+
+REDIS_URL = os.getenv("REDIS_PUBLIC_URL", os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))  # per pool, callers wait when exhausted
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", 5))  # seconds to wait for a free connection
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", 30))  # PING idle connections before use
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 10))
+REDIS_LOCAL_CACHE_TTL = float(os.getenv("REDIS_LOCAL_CACHE_TTL", 30))
+LOCAL_CACHE_PREFIXES = ("tg2int:", "int2tg:")
+LOCAL_CACHE_MAX_KEYS = 100_000
+
+
+class CommandStats:
+    """Per-command call count, total seconds and errors of this process."""
+
+    def __init__(self):
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.seconds: Dict[str, float] = defaultdict(float)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def observe(self, command: str, seconds: float, failed: bool) -> None:
+        self.calls[command] += 1
+        self.seconds[command] += seconds
+        if failed:
+            self.errors[command] += 1
+
+
+command_stats = CommandStats()
+
+
+def _command_name(args) -> str:
+    name = args[0] if args else "UNKNOWN"
+    return (name.decode() if isinstance(name, bytes) else str(name)).split(" ")[0].upper()
+
+
+class InstrumentedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        command = "MULTI" if self.is_transaction else "PIPELINE"
+        start, failed = time.perf_counter(), False
+        try:
+            return await super().execute(raise_on_error)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            command_stats.observe(command, time.perf_counter() - start, failed)
+
+
+class InstrumentedRedis(aioredis.Redis):
+    async def execute_command(self, *args, **options):
+        start, failed = time.perf_counter(), False
+        try:
+            return await super().execute_command(*args, **options)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            command_stats.observe(_command_name(args), time.perf_counter() - start, failed)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> InstrumentedPipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+def create_client(decode_responses: bool, url: str = REDIS_URL) -> InstrumentedRedis:
+    pool = aioredis.BlockingConnectionPool.from_url(
+        url,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_POOL_TIMEOUT,
+        health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_keepalive=True,
+        decode_responses=decode_responses,
+    )
+    return InstrumentedRedis(connection_pool=pool)
+
+
+redis = create_client(decode_responses=True)
+# FSM data is msgpack-encoded, so the storage needs a non-decoding client
+binary_redis = create_client(decode_responses=False)
+
+# key -> (expires_at, value)
+_local_cache: Dict[str, Tuple[float, Optional[str]]] = {}
+
+
+async def cached_get(key: str, ttl: float = REDIS_LOCAL_CACHE_TTL) -> Optional[str]:
+    """GET through the in-process cache for keys under LOCAL_CACHE_PREFIXES (missing keys aren't cached)."""
+    if not key.startswith(LOCAL_CACHE_PREFIXES):
+        return await redis.get(key)
+    entry = _local_cache.get(key)
+    now = time.monotonic()
+    if entry and entry[0] > now:
+        return entry[1]
+    value = await redis.get(key)
+    if value is not None:
+        if len(_local_cache) >= LOCAL_CACHE_MAX_KEYS:
+            _local_cache.clear()
+        _local_cache[key] = (now + ttl, value)
+    else:
+        _local_cache.pop(key, None)
+    return value
+
+
+def invalidate_local(*keys: str) -> None:
+    for key in keys:
+        _local_cache.pop(key, None)
+
+
+@asynccontextmanager
+async def batch(transaction: bool = False):
+    """Pipeline executed when the block exits (MULTI/EXEC if transaction), results in pipe.results."""
+    async with redis.pipeline(transaction=transaction) as pipe:
+        yield pipe
+        pipe.results = await pipe.execute()
+
+
+async def health_check() -> Tuple[bool, float]:
+    """(reachable, PING round trip in ms)."""
+    start = time.perf_counter()
+    try:
+        await redis.ping()
+        return True, (time.perf_counter() - start) * 1000
+    except Exception as e:
+        logging.warning(f"[redis_manager] Health check failed: {e}")
+        return False, (time.perf_counter() - start) * 1000
+
+
+async def render_metrics() -> str:
+    """Command latency and pool metrics in Prometheus text format."""
+    up, ping_ms = await health_check()
+    lines = [
+        "# HELP allkinds_redis_up Whether Redis answered PING",
+        "# TYPE allkinds_redis_up gauge",
+        f"allkinds_redis_up {int(up)}",
+        "# HELP allkinds_redis_ping_seconds PING round trip",
+        "# TYPE allkinds_redis_ping_seconds gauge",
+        f"allkinds_redis_ping_seconds {ping_ms / 1000:.6f}",
+        "# HELP allkinds_redis_command_seconds Time spent in Redis commands by command",
+        "# TYPE allkinds_redis_command_seconds summary",
+    ]
+    for command in sorted(command_stats.calls):
+        lines.append(f'allkinds_redis_command_seconds_count{{command="{command}"}} {command_stats.calls[command]}')
+        lines.append(f'allkinds_redis_command_seconds_sum{{command="{command}"}} {command_stats.seconds[command]:.6f}')
+    lines += ["# HELP allkinds_redis_command_errors_total Failed Redis commands by command",
+              "# TYPE allkinds_redis_command_errors_total counter"]
+    for command in sorted(command_stats.errors):
+        lines.append(f'allkinds_redis_command_errors_total{{command="{command}"}} {command_stats.errors[command]}')
+    lines += ["# HELP allkinds_redis_pool_connections Connections of the pool by state",
+              "# TYPE allkinds_redis_pool_connections gauge"]
+    for name, client in (("text", redis), ("binary", binary_redis)):
+        pool = client.connection_pool
+        in_use = len(getattr(pool, "_in_use_connections", ()))
+        created = in_use + len(getattr(pool, "_available_connections", ()))
+        lines.append(f'allkinds_redis_pool_connections{{pool="{name}",state="in_use"}} {in_use}')
+        lines.append(f'allkinds_redis_pool_connections{{pool="{name}",state="created"}} {created}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,134 @@
+"""
+Shared update queue on Redis streams
+Webhook process validates incoming updates and appends them to one of N partition streams
+(partition = from_user.id % N), worker processes consume their partition and ack after handling
+"""
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict
+
+from aiogram import types
+from aiogram.methods import TelegramMethod
+from aiohttp import web
+
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", 0))  # 0 = handle updates inside the webhook process
+STREAM_PREFIX = "updates"
+CONSUMER_GROUP = "bot-workers"
+STREAM_MAXLEN = int(os.getenv("UPDATE_STREAM_MAXLEN", 100000))
+READ_BATCH = 50
+READ_BLOCK_MS = 5000
+
+
+def stream_name(partition: int) -> str:
+    return f"{STREAM_PREFIX}:{partition}"
+
+
+def get_update_user_id(update: types.Update):
+    """Returns telegram id of the user who sent the update (None for service updates)."""
+    try:
+        event = update.event
+    except Exception:
+        return None
+    from_user = getattr(event, "from_user", None)
+    if from_user:
+        return from_user.id
+    chat = getattr(event, "chat", None)
+    return chat.id if chat else None
+
+
+def get_partition(update: types.Update, partitions: int) -> int:
+    user_id = get_update_user_id(update)
+    if user_id is None:
+        return update.update_id % partitions
+    return user_id % partitions
+
+
+async def enqueue_update(redis, payload: dict, partitions: int) -> str:
+    """Validates raw update payload and appends it to its partition stream."""
+    update = types.Update.model_validate(payload)
+    partition = get_partition(update, partitions)
+    return await redis.xadd(
+        stream_name(partition),
+        {"u": json.dumps(payload, ensure_ascii=False)},
+        maxlen=STREAM_MAXLEN,
+        approximate=True,
+    )
+
+
+class QueueRequestHandler:
+    """aiohttp webhook handler that only validates and enqueues updates."""
+
+    def __init__(self, redis, partitions: int):
+        self.redis = redis
+        self.partitions = partitions
+
+    async def handle(self, request: web.Request) -> web.Response:
+        try:
+            payload = await request.json()
+            await enqueue_update(self.redis, payload, self.partitions)
+        except (ValueError, TypeError) as e:
+            logging.warning(f"[QueueRequestHandler] Invalid update payload: {e}")
+            return web.Response(status=400)
+        return web.Response()
+
+    def register(self, app: web.Application, path: str) -> None:
+        app.router.add_post(path, self.handle)
+
+
+async def ensure_consumer_group(redis, partition: int) -> None:
+    try:
+        await redis.xgroup_create(stream_name(partition), CONSUMER_GROUP, id="0", mkstream=True)
+    except Exception as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+async def process_update(dp, bot, update: types.Update) -> None:
+    result = await dp.feed_update(bot, update)
+    if isinstance(result, TelegramMethod):
+        await bot(result)
+
+
+async def process_batch(dp, bot, entries) -> list:
+    """Handles a batch of entries: different users in parallel, one user strictly in order."""
+    by_user = OrderedDict()
+    for entry_id, fields in entries:
+        try:
+            update = types.Update.model_validate(json.loads(fields["u"]), context={"bot": bot})
+        except Exception as e:
+            logging.warning(f"[process_batch] Dropping malformed entry {entry_id}: {e}")
+            continue
+        by_user.setdefault(get_update_user_id(update), []).append((entry_id, update))
+
+    async def run_user_chain(chain):
+        for entry_id, update in chain:
+            try:
+                await process_update(dp, bot, update)
+            except Exception as e:
+                # Failed update is logged and acked anyway, otherwise it would be replayed forever
+                logging.exception(f"[process_batch] Update {entry_id} failed: {e}")
+
+    await asyncio.gather(*(run_user_chain(chain) for chain in by_user.values()))
+    return [entry_id for entry_id, _ in entries]
+
+
+async def consume_partition(redis, dp, bot, partition: int, consumer: str, stop_event: asyncio.Event = None) -> None:
+    """Reads the partition stream forever, first replaying entries left unacked by a crashed worker."""
+    await ensure_consumer_group(redis, partition)
+    stream = stream_name(partition)
+    last_id = "0"  # pending entries of this consumer first, then new ones
+    while not (stop_event and stop_event.is_set()):
+        response = await redis.xreadgroup(
+            CONSUMER_GROUP, consumer, {stream: last_id}, count=READ_BATCH, block=READ_BLOCK_MS
+        )
+        entries = response[0][1] if response else []
+        if not entries:
+            if last_id == "0":
+                logging.info(f"[consume_partition] {stream}: no pending entries, switching to new ones")
+                last_id = ">"
+            continue
+        acked = await process_batch(dp, bot, entries)
+        if acked:
+            await redis.xack(stream, CONSUMER_GROUP, *acked)
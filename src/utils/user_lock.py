@@ -0,0 +1,95 @@
+"""
+Per-user serialization of update handling
+Updates of one user are handled one after another (double taps, repeated "Find match"),
+updates of different users still run concurrently
+"""
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+
+from aiogram import BaseMiddleware
+
+from src.texts.messages import USER_BUSY, get_message
+from src.utils.fsm_storage import reset_snapshot
+
+# 'local' - asyncio locks inside this process, 'redis' - shared lock for several bot processes
+USER_LOCK_BACKEND = os.getenv("USER_LOCK_BACKEND", "local")
+USER_LOCK_TIMEOUT = int(os.getenv("USER_LOCK_TIMEOUT", 30))  # seconds, protects from a crashed holder
+USER_LOCK_WAIT = int(os.getenv("USER_LOCK_WAIT", 15))  # seconds to wait before the update is dropped with a busy notice
+
+
+class UserLockMiddleware(BaseMiddleware):
+    """Outer update middleware that holds a per-user lock while the update is handled."""
+
+    def __init__(self, redis=None, backend: str = USER_LOCK_BACKEND, wait: float = USER_LOCK_WAIT):
+        self.redis = redis
+        self.backend = backend
+        self.wait = wait
+        self._locks = {}
+        self._waiters = {}
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        if not user:
+            return await handler(event, data)
+        async with self._local_lock(user.id) as waited:
+            if self.backend == "redis" and self.redis is not None:
+                lock = self.redis.lock(f"user_lock:{user.id}", timeout=USER_LOCK_TIMEOUT, blocking_timeout=self.wait)
+                acquired = await lock.acquire()
+                if not acquired:
+                    # Handling it unlocked would race the update that holds the lock
+                    logging.warning(f"[UserLockMiddleware] Lock wait timeout for user {user.id}, update dropped")
+                    await self._answer_busy(event, user)
+                    return None
+                try:
+                    await self._refresh_state(data, True)
+                    return await handler(event, data)
+                finally:
+                    try:
+                        await lock.release()
+                    except Exception as e:
+                        logging.warning(f"[UserLockMiddleware] Lock release failed for user {user.id}: {e}")
+            await self._refresh_state(data, waited)
+            return await handler(event, data)
+
+    async def _answer_busy(self, event, user):
+        try:
+            if event.callback_query:
+                await event.callback_query.answer(get_message(USER_BUSY, user=user))
+            elif event.message:
+                await event.message.answer(get_message(USER_BUSY, user=user))
+        except Exception as e:
+            logging.warning(f"[UserLockMiddleware] Busy notice not delivered to user {user.id}: {e}")
+
+    async def _refresh_state(self, data, waited: bool):
+        # FSM state was read before the lock: re-read it if another update of this user ran meanwhile
+        if not waited:
+            return
+        reset_snapshot()
+        state = data.get("state")
+        if state is not None:
+            data["raw_state"] = await state.get_state()
+
+    @asynccontextmanager
+    async def _local_lock(self, user_id: int):
+        lock = self._locks.setdefault(user_id, asyncio.Lock())
+        self._waiters[user_id] = self._waiters.get(user_id, 0) + 1
+        waited = lock.locked()
+        try:
+            await lock.acquire()
+        except BaseException:
+            self._release_waiter(user_id)
+            raise
+        try:
+            yield waited
+        finally:
+            lock.release()
+            self._release_waiter(user_id)
+
+    def _release_waiter(self, user_id: int):
+        self._waiters[user_id] -= 1
+        if not self._waiters[user_id]:
+            # Nobody else waits for this user, drop the lock to keep the dict small
+            del self._waiters[user_id]
+            self._locks.pop(user_id, None)
@@ -0,0 +1,129 @@
+"""
+Per-group vector index over question embeddings
+Exact cosine search (one matrix product) over live pending/approved questions of a group.
+For hashed TF embeddings the group's IDF is applied at build time. When the group's question
+catalog version changes, only the added and removed questions are applied (the raw vectors are kept,
+so only new questions are read and embedded); a full build happens on first use or a kind change.
+"""
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import and_, select
+
+from src.models import Question
+from src.utils.embeddings import KIND_HASHED_TF, current_kind, embed_texts, unpack_embedding
+from src.utils.question_catalog import QUESTION_CATALOG_MAX_GROUPS, get_group_catalog
+
+SEMANTIC_DUPLICATE_THRESHOLD = 0.8  # cosine
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class GroupVectorIndex:
+    __slots__ = ("version", "kind", "ids", "raw", "matrix", "idf")
+
+    def __init__(self, version: int, kind: int, ids: List[int], matrix: np.ndarray):
+        self.version = version
+        self.kind = kind
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.raw = matrix
+        self.idf = None
+        if kind == KIND_HASHED_TF and len(ids):
+            df = np.count_nonzero(matrix, axis=0)
+            self.idf = (np.log((1 + len(ids)) / (1 + df)) + 1).astype(np.float32)
+            matrix = matrix * self.idf
+        self.matrix = _normalize_rows(matrix) if len(ids) else matrix
+
+    def with_changes(self, version: int, removed: Set[int], added_ids: List[int], added_vectors: List[np.ndarray]) -> "GroupVectorIndex":
+        """New index without the removed rows and with the added ones, from the kept raw vectors."""
+        keep = ~np.isin(self.ids, list(removed)) if removed else np.ones(len(self.ids), dtype=bool)
+        parts = [self.raw[keep]] if keep.any() else []
+        if added_vectors:
+            parts.append(np.stack(added_vectors).astype(np.float32))
+        matrix = np.concatenate(parts) if parts else np.zeros((0, 0), dtype=np.float32)
+        return GroupVectorIndex(version, self.kind, self.ids[keep].tolist() + list(added_ids), matrix)
+
+    def transform(self, vector: np.ndarray) -> np.ndarray:
+        if self.idf is not None:
+            vector = vector * self.idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def search(self, vector: np.ndarray, k: int = 5, exclude: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Top-k (question_id, cosine) for a raw (not yet IDF-weighted) embedding."""
+        if not len(self.ids):
+            return []
+        scores = self.matrix @ self.transform(vector)
+        if exclude is not None:
+            scores = np.where(self.ids == exclude, -np.inf, scores)
+        k = min(k, len(self.ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.ids[i]), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+
+_indexes: "OrderedDict[int, GroupVectorIndex]" = OrderedDict()
+
+
+async def _embeddings(session, kind: int, texts: Dict[int, str], condition) -> Dict[int, np.ndarray]:
+    """Stored embeddings of the current kind for the questions in texts, the rest embedded in memory."""
+    rows = await session.execute(select(Question.id, Question.embedding).where(condition))
+    vectors = {}
+    for row in rows.all():
+        if row.id in texts and row.embedding:
+            stored_kind, vector = unpack_embedding(row.embedding)
+            if stored_kind == kind:
+                vectors[row.id] = vector
+    missing = [qid for qid in texts if qid not in vectors]
+    if missing:
+        _, computed = embed_texts([texts[qid] for qid in missing])
+        vectors.update(zip(missing, computed))
+    return vectors
+
+
+async def build_group_vector_index(session, group_id: int, catalog, previous: Optional[GroupVectorIndex] = None) -> GroupVectorIndex:
+    """Index of the catalog's pending/approved questions, derived from `previous` when it has the current kind."""
+    kind = current_kind()
+    live = {q.id: q.text for q in catalog.questions if q.status != "rejected"}
+    if previous is None or previous.kind != kind:
+        vectors = await _embeddings(session, kind, live, and_(Question.group_id == group_id, Question.is_deleted == 0))
+        ids = sorted(vectors)
+        matrix = np.stack([vectors[qid] for qid in ids]).astype(np.float32) if ids else np.zeros((0, 0), dtype=np.float32)
+        index = GroupVectorIndex(catalog.version, kind, ids, matrix)
+    else:
+        indexed = set(previous.ids.tolist())
+        added = [qid for qid in live if qid not in indexed]
+        removed = indexed - live.keys()
+        if added or removed:
+            vectors = await _embeddings(session, kind, {qid: live[qid] for qid in added}, Question.id.in_(added)) if added else {}
+            index = previous.with_changes(catalog.version, removed, added, [vectors[qid] for qid in added])
+        else:
+            # e.g. a pending question got approved: same rows
+            previous.version = catalog.version
+            index = previous
+    _indexes[group_id] = index
+    _indexes.move_to_end(group_id)
+    while len(_indexes) > QUESTION_CATALOG_MAX_GROUPS:
+        _indexes.popitem(last=False)
+    return index
+
+
+async def get_group_vector_index(session, group_id: int) -> GroupVectorIndex:
+    catalog = await get_group_catalog(group_id, session)
+    index = _indexes.get(group_id)
+    if index is not None and index.version == catalog.version and index.kind == current_kind():
+        _indexes.move_to_end(group_id)
+        return index
+    return await build_group_vector_index(session, group_id, catalog, index)
+
+
+async def find_semantic_neighbours(session, group_id: int, text: str, k: int = 5, exclude: Optional[int] = None) -> List[Tuple[int, float]]:
+    """(question_id, cosine) of the k questions of the group closest to text."""
+    index = await get_group_vector_index(session, group_id)
+    _, matrix = embed_texts([text])
+    return index.search(matrix[0], k=k, exclude=exclude)
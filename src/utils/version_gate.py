@@ -0,0 +1,117 @@
+"""
+In-process bot version gate
+The deployed version (Redis `bot_version`) is kept in memory: read once at startup and updated from
+the `bot_version:changes` channel when a deploy publishes a new one. The middleware compares it with
+the version stamped in the user's FSM data on every update without extra I/O (the FSM record is
+loaded for the update anyway): users whose state predates the version are asked to /start again.
+"""
+import asyncio
+import logging
+from typing import Optional
+
+from aiogram import BaseMiddleware
+
+VERSION_KEY = "bot_version"
+VERSION_CHANNEL = "bot_version:changes"
+NEW_VERSION_NOTICE = "A new version of the bot has been released. Please click /start to update."
+
+_current_version: Optional[str] = None
+
+
+def _redis():
+    from src.utils.redis import redis
+    return redis
+
+
+def current_version() -> Optional[str]:
+    return _current_version
+
+
+def _set_current(version: Optional[str]) -> None:
+    global _current_version
+    if version and version != _current_version:
+        logging.info(f"[version_gate] Bot version {_current_version} -> {version}")
+        _current_version = version
+
+
+async def load_bot_version(redis=None) -> Optional[str]:
+    """Reads the deployed version into memory, keeps the known one if Redis is unavailable."""
+    redis = redis or _redis()
+    try:
+        _set_current(await redis.get(VERSION_KEY))
+    except Exception as e:
+        logging.warning(f"[load_bot_version] Read failed, keeping {_current_version}: {e}")
+    return _current_version
+
+
+async def publish_bot_version(version: str, redis=None) -> None:
+    """Stores the deployed version and notifies every running process."""
+    redis = redis or _redis()
+    _set_current(version)
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.set(VERSION_KEY, version)
+        pipe.publish(VERSION_CHANNEL, version)
+        await pipe.execute()
+
+
+def is_outdated(user_version: Optional[str]) -> bool:
+    return bool(user_version and _current_version and user_version != _current_version)
+
+
+async def listen_for_version_changes(redis=None, stop_event: Optional[asyncio.Event] = None) -> None:
+    """Follows version bumps published by other processes, reconnects on errors."""
+    redis = redis or _redis()
+    while not (stop_event and stop_event.is_set()):
+        pubsub = redis.pubsub()
+        try:
+            await pubsub.subscribe(VERSION_CHANNEL)
+            # A bump published while we were not subscribed is unknown: read it once subscribed
+            await load_bot_version(redis)
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                data = message["data"].decode() if isinstance(message["data"], bytes) else message["data"]
+                _set_current(data)
+                if stop_event and stop_event.is_set():
+                    break
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.warning(f"[listen_for_version_changes] Subscription lost: {e}")
+            await asyncio.sleep(1)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+
+
+def start_version_listener() -> asyncio.Task:
+    return asyncio.create_task(listen_for_version_changes(), name="bot-version-listener")
+
+
+class VersionGateMiddleware(BaseMiddleware):
+    """
+    Update outer middleware (after FSMContextMiddleware, which provides `state`): an update of a user
+    stamped with an older version resets their state to the current version and stops there.
+    /start stamps the version for users that have none yet.
+    """
+
+    async def __call__(self, handler, event, data):
+        state = data.get("state")
+        if state is None or not _current_version:
+            return await handler(event, data)
+        user_data = await state.get_data()
+        if not is_outdated(user_data.get("bot_version")):
+            return await handler(event, data)
+        chat = data.get("event_chat")
+        try:
+            if event.callback_query:
+                await event.callback_query.answer()
+            if chat:
+                await data["bot"].send_message(chat.id, NEW_VERSION_NOTICE)
+        except Exception as e:
+            logging.warning(f"[VersionGateMiddleware] Notice not delivered to chat {chat and chat.id}: {e}")
+        await state.clear()
+        await state.update_data(bot_version=_current_version)
+        return None
@@ -0,0 +1,76 @@
+"""
+Update worker processes
+Each worker runs its own event loop and consumes one partition stream of the shared update queue.
+Run standalone with `python -m src.worker` or let `src.bot` spawn the pool (UPDATE_WORKERS > 0).
+"""
+import asyncio
+import logging
+import multiprocessing
+import time
+
+from src.utils.update_queue import UPDATE_WORKERS, consume_partition
+
+RESTART_DELAY_SECONDS = 2
+
+
+async def run_worker_loop(partition: int):
+    # Importing src.bot registers all routers on the dispatcher of this process
+    from src.bot import bot, dp
+    from src.loader import redis
+    from src.utils.question_catalog import start_catalog_listener
+    from src.utils.version_gate import load_bot_version, start_version_listener
+    await load_bot_version(redis)
+    catalog_listener = start_catalog_listener()
+    version_listener = start_version_listener()
+    logging.info(f"[run_worker_loop] Worker {partition} started")
+    try:
+        await consume_partition(redis, dp, bot, partition, consumer=f"worker-{partition}")
+    finally:
+        catalog_listener.cancel()
+        version_listener.cancel()
+        await bot.session.close()
+
+
+def run_worker(partition: int):
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_worker_loop(partition))
+
+
+def start_worker_pool(count: int):
+    """Starts `count` worker processes and restarts the ones that die."""
+    ctx = multiprocessing.get_context("spawn")
+    processes = {}
+    for partition in range(count):
+        processes[partition] = ctx.Process(target=run_worker, args=(partition,), name=f"update-worker-{partition}", daemon=True)
+        processes[partition].start()
+    return ctx, processes
+
+
+async def supervise_worker_pool(ctx, processes: dict):
+    """Keeps the pool alive: a crashed worker is restarted and replays its unacked updates."""
+    while True:
+        await asyncio.sleep(RESTART_DELAY_SECONDS)
+        for partition, process in list(processes.items()):
+            if not process.is_alive():
+                logging.warning(f"[supervise_worker_pool] Worker {partition} exited with {process.exitcode}, restarting")
+                processes[partition] = ctx.Process(target=run_worker, args=(partition,), name=f"update-worker-{partition}", daemon=True)
+                processes[partition].start()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    if not UPDATE_WORKERS:
+        # Partition count must match the webhook process, so it's never guessed here
+        logging.error("[main] UPDATE_WORKERS is not set, nothing to consume")
+        return
+    ctx, processes = start_worker_pool(UPDATE_WORKERS)
+    try:
+        asyncio.run(supervise_worker_pool(ctx, processes))
+    except KeyboardInterrupt:
+        for process in processes.values():
+            process.terminate()
+        time.sleep(RESTART_DELAY_SECONDS)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,10 +12,15 @@ if PROJECT_ROOT not in sys.path:
 import pytest
 import pytest_asyncio
 import asyncio
+import typing
+from datetime import datetime
 from testcontainers.postgres import PostgresContainer
+from sqlalchemy import delete, select, text, update
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
-from src.models import Base
+from aiogram.client.session.base import BaseSession
+from aiogram.types import InlineKeyboardMarkup, Message, Update, User as TelegramUser
+from src.models import AnswerEvent, Base, GroupCreator, User
 
 @pytest_asyncio.fixture(scope="session")
 def event_loop():
@@ -41,4 +46,192 @@ async def async_session(pg_url):
     Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
     async with Session() as session:
         yield session
-    await engine.dispose() 
\ No newline at end of file
+    await engine.dispose() 
+
+# --- Query budgets: handlers fed through the dispatcher against seeded datasets of two sizes ---
+
+# (members, questions, id base, invite code prefix) per size; ids are offset so both datasets share the test database
+BUDGET_SIZES = {"small": (25, 40, 700_000, "S"), "large": (100, 160, 800_000, "L")}
+
+
+class RecordingSession(BaseSession):
+    """Bot API session without network: records requests, send/edit return a message, the rest True."""
+
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+        self.message_ids = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        self.requests.append(method)
+        returning = method.__returning__
+        if returning is TelegramUser:
+            return TelegramUser(id=bot.id, is_bot=True, first_name="Allkinds", username="allkinds_test_bot")
+        if returning is Message or Message in typing.get_args(returning):
+            self.message_ids += 1
+            chat_id = getattr(method, "chat_id", None) or 0
+            markup = getattr(method, "reply_markup", None)
+            return Message.model_validate(
+                {"message_id": self.message_ids, "date": datetime.now(), "chat": {"id": chat_id, "type": "private"},
+                 "text": getattr(method, "text", None),
+                 "reply_markup": markup if isinstance(markup, InlineKeyboardMarkup) else None},
+                context={"bot": bot},
+            )
+        return True
+
+    def find_button(self, prefix):
+        """(callback_data, keyboard) of the most recently sent inline button starting with prefix."""
+        for method in reversed(self.requests):
+            markup = getattr(method, "reply_markup", None)
+            for row in getattr(markup, "inline_keyboard", None) or []:
+                for button in row:
+                    if (button.callback_data or "").startswith(prefix):
+                        return button.callback_data, markup
+        raise AssertionError(f"No {prefix!r} button was sent")
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        """File downloads are recorded and come back empty."""
+        self.requests.append(url)
+        yield b""
+
+
+class BudgetContext:
+    """One test user of a seeded dataset and helpers building their updates."""
+
+    def __init__(self, bot, user_id, group_id, unanswered, admin_id=None):
+        self.bot = bot
+        self.user_id = user_id
+        self.telegram_id = user_id
+        self.group_id = group_id
+        self.unanswered = unanswered
+        self.admin_id = admin_id
+        self.update_ids = 0
+        self.message_ids = 0
+
+    def _next_ids(self):
+        self.update_ids += 1
+        self.message_ids += 1
+        return self.update_ids, self.message_ids
+
+    def _message(self, message_id, **fields):
+        return {
+            "message_id": message_id, "date": datetime.now(), "chat": {"id": self.telegram_id, "type": "private"},
+            "from": {"id": self.telegram_id, "is_bot": False, "first_name": "Budget", "language_code": "en"}, **fields,
+        }
+
+    def message(self, text):
+        update_id, message_id = self._next_ids()
+        return Update.model_validate({"update_id": update_id, "message": self._message(message_id, text=text)}, context={"bot": self.bot})
+
+    def callback(self, data, markup=None):
+        """Press of a button with data on a bot message carrying markup (just that button by default)."""
+        update_id, message_id = self._next_ids()
+        markup = markup or InlineKeyboardMarkup(inline_keyboard=[[{"text": "·", "callback_data": data}]])
+        return Update.model_validate({"update_id": update_id, "callback_query": {
+            "id": str(update_id), "chat_instance": str(self.telegram_id), "data": data,
+            "from": {"id": self.telegram_id, "is_bot": False, "first_name": "Budget", "language_code": "en"},
+            "message": {**self._message(message_id, text="card", reply_markup=markup),
+                        "from": {"id": self.bot.id, "is_bot": True, "first_name": "Allkinds"}},
+        }}, context={"bot": self.bot})
+
+    def button(self, prefix):
+        return self.callback(*self.bot.session.find_button(prefix))
+
+
+@pytest_asyncio.fixture(scope="session")
+async def budget_datasets(pg_url):
+    """
+    Both BUDGET_SIZES loaded once; the test user is the second member of the dataset's group, the first
+    one created it. Pending questions wait in the review queue. Rows and Redis mappings are removed afterwards.
+    """
+    from benchmarks.synthetic import LOAD_ORDER, Tier, generate, load
+    from src.utils.redis import redis
+    engine = create_async_engine(pg_url, future=True)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    datasets = {}
+    for size, (members, questions, id_base, code_prefix) in BUDGET_SIZES.items():
+        data = generate(Tier(size, 1, members, questions, 0.6), seed=7, id_base=id_base, code_prefix=code_prefix)
+        for member in data["group_members"]:
+            member["looking_for"] = "all"  # everyone is a candidate, so there are always matches to navigate
+        for question in data["questions"]:
+            question["moderation_flags"] = "review" if question["status"] == "pending" else None
+        user_id = data["group_members"][1]["user_id"]
+        data["group_members"][1]["balance"] = 100_000
+        answered = {a["question_id"] for a in data["answers"] if a["user_id"] == user_id}
+        unanswered = [q["id"] for q in data["questions"] if q["status"] == "approved" and q["id"] not in answered]
+        async with Session() as session:
+            await load(session, data)
+        async with redis.pipeline(transaction=False) as pipe:
+            for row in data["users"]:
+                pipe.set(f"tg2int:{row['id']}", row["id"])
+                pipe.set(f"int2tg:{row['id']}", row["id"])
+            await pipe.execute()
+        group = data["groups"][0]
+        datasets[size] = (user_id, group["id"], unanswered, group["creator_user_id"])
+    yield engine, Session, datasets
+    # The serial sequences were moved past the offsets, so every row from there on exists because of the
+    # datasets (seeded, or written by the handlers and tests that used them): remove it and rewind the sequences
+    first_id = min(id_base for _, _, id_base, _ in BUDGET_SIZES.values())
+    async with Session() as session:
+        user_ids = await session.execute(select(User.id).where(User.id >= first_id))
+        user_ids = user_ids.scalars().all()
+        await session.execute(update(User).where(User.current_group_id >= first_id).values(current_group_id=None))
+        await session.execute(delete(AnswerEvent).where(AnswerEvent.user_id >= first_id))
+        await session.execute(delete(GroupCreator).where(GroupCreator.user_id >= first_id))
+        for model, _ in reversed(LOAD_ORDER):
+            await session.execute(delete(model).where(model.id >= first_id))
+        for _, table in LOAD_ORDER:
+            await session.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), coalesce(max(id), 1)) FROM {table}"))
+        await session.commit()
+    keys = [f"{prefix}:{uid}" for uid in user_ids for prefix in ("int2tg", "tg2int")]
+    keys += [f"tg2int:{telegram_id}" for telegram_id in await redis.mget(keys[::2]) if telegram_id]
+    if keys:
+        await redis.delete(*keys)
+    await engine.dispose()
+
+
+@pytest.fixture
+def count_handler_queries(budget_datasets, monkeypatch):
+    """
+    run(size, make_update, prepare=None, admin=False, fsm_state=None, fsm_data=None) -> SQL statements of
+    one update fed through the dispatcher. The update is fed twice (warm caches, fresh FSM data each time)
+    and the second run is counted; prepare(ctx) updates are fed before each run without counting.
+    admin sends the updates as the group's creator; fsm_state and fsm_data(ctx) are set before prepare.
+    """
+    from aiogram import Bot
+    from src.utils.query_counter import count_queries, install
+    import src.bot  # noqa: F401  (includes the routers)
+    from src.loader import dp
+    engine, Session, datasets = budget_datasets
+    install(engine)
+    for name, module in list(sys.modules.items()):
+        if (name == "src" or name.startswith("src.")) and hasattr(module, "AsyncSessionLocal"):
+            monkeypatch.setattr(module, "AsyncSessionLocal", Session)
+
+    async def run(size, make_update, prepare=None, admin=False, fsm_state=None, fsm_data=None):
+        user_id, group_id, unanswered, admin_id = datasets[size]
+        if admin:
+            user_id = admin_id
+        bot = Bot("42:BUDGET", session=RecordingSession())
+        ctx = BudgetContext(bot, user_id, group_id, unanswered, admin_id)
+        state = dp.fsm.get_context(bot=bot, chat_id=ctx.telegram_id, user_id=ctx.telegram_id)
+        counts = []
+        for attempt in range(2):
+            await state.clear()
+            await state.update_data(internal_user_id=user_id, **(fsm_data(ctx) if fsm_data else {}))
+            if fsm_state:
+                await state.set_state(fsm_state)
+            for update in (prepare(ctx) if prepare else []):
+                await dp.feed_update(bot, update)
+            update = make_update(ctx, attempt)
+            with count_queries() as counter:
+                await dp.feed_update(bot, update)
+            counts.append(counter.total)
+        await state.clear()
+        return counts[-1]
+    return run
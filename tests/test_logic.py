@@ -3,10 +3,14 @@ from sqlalchemy import select
 from src.models import User, Group, GroupMember, GroupCreator, Question, Answer, Match, MatchStatus
 import random, string
 import types as pytypes
+import time
+from unittest.mock import AsyncMock
 from src.handlers.system import instructions, my_groups
 from src.services.questions import get_next_unanswered_question
 from src.handlers.questions import send_question_to_user
 from src.utils.redis import get_or_restore_internal_user_id, set_telegram_mapping, redis
+from src.fsm.states import Onboarding
+from src.utils.callback_codec import ReviewPageCallback
 # from aiogram.fsm.storage.memory import MemoryStorage, MemoryStorageProxy
 # from aiogram.fsm.context import FSMContext
 
@@ -259,6 +263,23 @@ async def test_load_answered_questions_pagination(async_session):
     page2 = page2.scalars().all()
     assert len(page2) == 5
 
+async def test_answered_history_keyset_pages(async_session):
+    """История отвеченных: страницы по курсору (created_at, id) и точный COUNT."""
+    from src.services.questions import get_answered_history_page, count_answered_history, decode_history_cursor
+    user = await create_user(async_session, 2010)
+    group, _ = await create_group(async_session, user, "GKeyset", "Desc")
+    questions = [await create_question(async_session, group, user, f"QK{i}?") for i in range(15)]
+    for i, q in enumerate(questions):
+        q.status = "approved"
+        await answer_question(async_session, user, q, (i % 5) - 2)
+    page1, cursor = await get_answered_history_page(async_session, user.id, group.id)
+    assert [q.id for q, _ in page1] == [q.id for q in questions[:10]]
+    assert cursor is not None
+    page2, cursor2 = await get_answered_history_page(async_session, user.id, group.id, after=decode_history_cursor(cursor))
+    assert [q.id for q, _ in page2] == [q.id for q in questions[10:]]
+    assert cursor2 is None
+    assert await count_answered_history(async_session, user.id, group.id) == 15
+
 async def test_delete_answered_question(async_session):
     user = await create_user(async_session, 2004)
     group, _ = await create_group(async_session, user, "GDel", "Desc")
@@ -292,6 +313,61 @@ async def test_balance_not_incremented_on_reanswer(async_session):
     member2 = member2.scalar()
     assert member2.balance == member.balance
 
+async def test_atomic_balance_charge(async_session):
+    """Списание баланса атомарное и не уходит в минус."""
+    from src.services.groups import add_to_balance, charge_balance
+    user = await create_user(async_session, 2006)
+    group, _ = await create_group(async_session, user, "GAtomic", "Desc")
+    assert await add_to_balance(async_session, user.id, group.id, 7) == 7
+    assert await charge_balance(async_session, user.id, group.id, 5) == 2
+    # Недостаточно баллов — строка не меняется
+    assert await charge_balance(async_session, user.id, group.id, 5) is None
+    await async_session.commit()
+    balance = await async_session.execute(select(GroupMember.balance).where(GroupMember.user_id == user.id, GroupMember.group_id == group.id))
+    assert balance.scalar() == 2
+
+async def test_commit_answer_upsert_and_next_question(async_session):
+    """Ответ одним запросом: новый ответ начисляет баллы, повтор не меняет, следующий вопрос предзагружен."""
+    from src.services.questions import commit_answer
+    user = await create_user(async_session, 2007)
+    group, _ = await create_group(async_session, user, "GCommit", "Desc")
+    q1 = await create_question(async_session, group, user, "QC1?")
+    q2 = await create_question(async_session, group, user, "QC2?")
+    q1.status = q2.status = "approved"
+    await async_session.commit()
+    first = await commit_answer(async_session, user.id, q1, 1, 1)
+    assert first["is_new"] and not first["unchanged"]
+    assert first["balance"] == 1
+    assert first["next_question"].id == q2.id
+    assert first["unanswered"] == 1
+    same = await commit_answer(async_session, user.id, q1, 1, 1)
+    assert same["unchanged"] and same["balance"] == 1
+    changed = await commit_answer(async_session, user.id, q1, -2, 1)
+    assert not changed["is_new"] and not changed["unchanged"]
+    assert changed["balance"] == 1
+    ans = await async_session.execute(select(Answer.value).where(Answer.user_id == user.id, Answer.question_id == q1.id))
+    assert ans.scalar() == -2
+
+async def test_answer_events_logged(async_session):
+    """Ответ, изменение и удаление пишут события answered/changed/deleted в answer_events."""
+    from src.models import AnswerEvent
+    from src.services.questions import commit_answer, delete_answers_logged
+    user = await create_user(async_session, 2011)
+    group, _ = await create_group(async_session, user, "GEvents", "Desc")
+    q = await create_question(async_session, group, user, "QE?")
+    q.status = "approved"
+    await async_session.commit()
+    first = await commit_answer(async_session, user.id, q, 1, 1)
+    await commit_answer(async_session, user.id, q, 1, 1)
+    changed = await commit_answer(async_session, user.id, q, 2, 1)
+    deleted = await delete_answers_logged(async_session, Answer.question_id == q.id)
+    await async_session.commit()
+    assert [e["event_type"] for e in first["events"] + changed["events"] + deleted] == ["answered", "changed", "deleted"]
+    assert (changed["events"][0]["old_value"], changed["events"][0]["new_value"]) == (1, 2)
+    assert deleted[0]["old_value"] == 2 and deleted[0]["group_id"] == group.id
+    rows = await async_session.execute(select(AnswerEvent.event_type).where(AnswerEvent.question_id == q.id).order_by(AnswerEvent.id))
+    assert rows.scalars().all() == ["answered", "changed", "deleted"]
+
 async def test_questions_isolation_between_groups(async_session):
     """Вопросы одной группы не видны в другой (строгая изоляция по group_id)."""
     user = await create_user(async_session, 3001)
@@ -672,4 +748,514 @@ async def test_two_stage_matching_logic(async_session):
     ))
     reverse_check = reverse_check.scalar()
     assert reverse_check is not None
-    assert reverse_check.status == "hidden" 
\ No newline at end of file
+    assert reverse_check.status == "hidden" 
+
+async def test_geo_prefilter_and_batch_distance():
+    """Пакетный haversine совпадает со скалярным, а соседние ячейки geohash покрывают радиус."""
+    from types import SimpleNamespace
+    from src.utils.distance import calculate_distance_km
+    from src.utils.geo import encode_geohash, geohash_prefixes_within, member_distances_km
+    me = SimpleNamespace(geolocation_lat=55.75, geolocation_lon=37.61)
+    near = SimpleNamespace(geolocation_lat=55.80, geolocation_lon=37.70)
+    far = SimpleNamespace(geolocation_lat=59.93, geolocation_lon=30.31)
+    nowhere = SimpleNamespace(geolocation_lat=None, geolocation_lon=None)
+    distances = member_distances_km(me, [near, far, nowhere])
+    assert distances[0] == calculate_distance_km(55.75, 37.61, 55.80, 37.70)
+    assert distances[1] == calculate_distance_km(55.75, 37.61, 59.93, 30.31)
+    assert distances[2] is None
+    prefixes = geohash_prefixes_within(55.75, 37.61, 20)
+    assert any(encode_geohash(55.80, 37.70).startswith(p) for p in prefixes)
+    assert not any(encode_geohash(59.93, 30.31).startswith(p) for p in prefixes)
+
+async def test_gazetteer_resolves_aliases_to_same_city():
+    """Разные написания города дают один canonical id и координаты."""
+    from src.utils.gazetteer import resolve_location
+    ids = {resolve_location(text).id for text in ["Moscow", "moscow ", "Москва", "Москва, Россия", "moscow russia"]}
+    assert len(ids) == 1
+    assert resolve_location("St Petersburg, USA").country == "United States"
+    assert resolve_location("Питер").name == "Saint Petersburg"
+    assert resolve_location("Nowhere town") is None
+
+async def test_question_catalog_lru_and_versions():
+    """Каталог вопросов: LRU по группам, устаревшая версия не кэшируется после инвалидации."""
+    from src.utils.question_catalog import QuestionCatalogCache, GroupCatalog, CatalogQuestion
+    cache = QuestionCatalogCache(max_groups=2, ttl=60)
+    for group_id in (1, 2, 3):
+        cache.put(GroupCatalog(group_id, 0, [CatalogQuestion(group_id, "Q?", "approved", 1, 1, None)]))
+    assert cache.get(1) is None and cache.get(3).approved_ids == [3]
+    cache.invalidate(3, version=2)
+    assert cache.get(3) is None
+    cache.put(GroupCatalog(3, 1, []))  # loaded before the invalidation
+    assert cache.get(3) is None
+    cache.put(GroupCatalog(3, 2, []))
+    assert cache.get(3) is not None
+    for group_id in range(10, 20):
+        cache.invalidate(group_id, version=1)
+    assert len(cache._seen_versions) == 2 and list(cache._seen_versions) == [18, 19]
+
+async def test_near_duplicate_index_finds_reworded_question():
+    """MinHash/LSH индекс находит переформулированный вопрос и забывает удалённый."""
+    from src.utils.near_duplicates import NearDuplicateIndex, minhash_signature, signature_from_bytes, signature_to_bytes
+    index = NearDuplicateIndex(version=0)
+    index.add(1, minhash_signature("Do you believe in God?"))
+    index.add(2, minhash_signature("Is pineapple ok on pizza?"))
+    signature = minhash_signature("do you believe in a god")
+    assert [qid for qid, _ in index.query(signature)] == [1]
+    assert (signature_from_bytes(signature_to_bytes(signature)) == signature).all()
+    index.remove(1)
+    assert index.query(signature) == []
+    assert not index.buckets or all(1 not in bucket for bucket in index.buckets.values())
+
+async def test_near_duplicate_index_follows_moderation_versions():
+    """Одобрение только сдвигает версию индекса, отклонение убирает вопросы без перестройки."""
+    from src.utils import near_duplicates
+    from src.utils.near_duplicates import NearDuplicateIndex, follow_group_version, minhash_signature, unindex_questions
+    index = NearDuplicateIndex(version=4)
+    index.add(1, minhash_signature("Do you believe in God?"))
+    index.add(2, minhash_signature("Is pineapple ok on pizza?"))
+    near_duplicates._indexes[-1] = index
+    follow_group_version(-1, 5)
+    unindex_questions(-1, [2], 6)
+    assert near_duplicates._indexes[-1] is index and index.version == 6 and list(index.signatures) == [1]
+    follow_group_version(-1, 8)  # another replica changed the group in between
+    assert -1 not in near_duplicates._indexes
+
+async def test_embeddings_pack_and_group_vector_search():
+    """Эмбеддинги хранятся в int8 и находят переформулированный вопрос в индексе группы."""
+    import numpy as np
+    from src.utils.embeddings import embed_texts, pack_embedding, unpack_embedding
+    from src.utils.vector_index import GroupVectorIndex
+    texts = ["Do you believe in God?", "Is pineapple ok on pizza?", "Would you move abroad for love?"]
+    kind, matrix = embed_texts(texts)
+    stored = np.stack([unpack_embedding(pack_embedding(vector, kind))[1] for vector in matrix])
+    assert np.abs(stored - matrix).max() < 0.01
+    index = GroupVectorIndex(0, kind, [10, 20, 30], stored)
+    _, query = embed_texts(["do you believe in a god"])
+    assert index.search(query[0], k=1)[0][0] == 10
+    assert 10 not in [qid for qid, _ in index.search(query[0], k=3, exclude=10)]
+    # Catalog change: one question removed, one added, the rest reuse the kept raw vectors
+    _, added = embed_texts(["Do you believe in a higher power?"])
+    changed = index.with_changes(1, {20}, [40], [added[0]])
+    assert changed.ids.tolist() == [10, 30, 40] and changed.raw.shape[0] == 3
+    assert [qid for qid, _ in changed.search(query[0], k=3)][:2] in ([10, 40], [40, 10])
+    assert index.with_changes(2, {10, 20, 30}, [], []).search(query[0]) == []
+
+async def test_moderation_rules_verdicts():
+    """Бан-слова ищутся целыми словами, чистый вопрос одобряется, мягкие флаги идут на проверку."""
+    from src.utils.moderation_rules import BannedWordAutomaton, decide, spam_flags
+    automaton = BannedWordAutomaton(["casino", "free money", "he"])
+    assert automaton.find("Best CASINO and free money here") == {"casino", "free money"}
+    assert automaton.find("Do you like cheese?") == set()
+    assert decide(spam_flags("Do you like cheese?")).decision == "approve"
+    assert decide(spam_flags("Join t.me/somechannel now")).decision == "review"
+    assert decide(["banned_word:casino"]).decision == "reject"
+    assert decide(["banned_word:casino"], auto_reject=False).decision == "review"
+    assert decide([], auto_approve=False).decision == "review"
+
+async def test_question_rate_limit_sliding_window():
+    """Лимитер пропускает limit событий в окне, дальше отказывает и считает отказы."""
+    from src.utils.rate_limit import hit, get_rate_limit_stats, parse_limit
+    assert parse_limit("5/3600") == (5, 3600) and parse_limit("") is None
+    keys = ["ratelimit:test:3005", "ratelimit:test:3005:g"]
+    await redis.delete(*keys)
+    before = await get_rate_limit_stats()
+    scopes = {"test_user": (keys[0], (2, 60)), "test_group": (keys[1], (5, 60))}
+    assert (await hit(scopes)).allowed
+    assert (await hit(scopes)).allowed
+    blocked = await hit(scopes)
+    assert not blocked.allowed and blocked.scope == "test_user" and 0 < blocked.retry_after <= 60
+    # Blocked attempts are not recorded
+    assert await redis.zcard(keys[1]) == 2
+    after = await get_rate_limit_stats()
+    assert after["test_user:blocked"] - before.get("test_user:blocked", 0) == 1
+    await redis.delete(*keys)
+
+async def test_question_rate_limit_before_db(monkeypatch):
+    """Лимит вопросов проверяется по группе из данных FSM до любого обращения к БД."""
+    from unittest.mock import AsyncMock
+    from src.handlers import questions
+    from src.texts.messages import get_message, QUESTION_RATE_LIMITED
+    from src.utils.rate_limit import RateLimitResult
+    checked, answers = [], []
+
+    async def blocked(user_id, group_id):
+        checked.append((user_id, group_id))
+        return RateLimitResult(False, "user", 90)
+
+    async def answer(text):
+        answers.append(text)
+
+    def no_session():
+        raise AssertionError("a DB session was opened for a throttled submission")
+
+    monkeypatch.setattr(questions, "check_question_submission", blocked)
+    monkeypatch.setattr(questions, "AsyncSessionLocal", no_session)
+    state = pytypes.SimpleNamespace(get_data=AsyncMock(return_value={
+        "internal_user_id": 3018, "question_group_id": 5, "question_language": "ru",
+    }))
+    await questions.handle_new_question(pytypes.SimpleNamespace(text="Do you like cats?", answer=answer), state)
+    assert checked == [(3018, 5)]
+    assert answers == [get_message(QUESTION_RATE_LIMITED, user=pytypes.SimpleNamespace(language="ru"), minutes=2)]
+
+async def test_question_keyboard_cache_and_catalog():
+    """Клавиатура карточки кешируется по (вопрос, ответ, язык), каталог сообщений с фолбэком на en."""
+    from src.keyboards.questions import get_question_keyboard
+    from src.texts.messages import CATALOG, get_message, QUESTION_DELETE
+    user_ru = pytypes.SimpleNamespace(language="ru")
+    assert get_message(QUESTION_DELETE, user=user_ru) == CATALOG["ru"][QUESTION_DELETE]
+    assert get_message("NO_SUCH_KEY", user=user_ru) == "NO_SUCH_KEY"
+    assert set(CATALOG["en"]) <= set(CATALOG["ru"])
+    kb = get_question_keyboard(42, None, True, "ru")
+    assert kb is get_question_keyboard(42, None, True, "ru")
+    assert [b.callback_data for b in kb.inline_keyboard[0]] == [f"a1:42:{v}" for v in (-2, -1, 0, 1, 2)]
+    assert kb.inline_keyboard[1][0].text == CATALOG["ru"][QUESTION_DELETE]
+    selected = get_question_keyboard(42, 1, False, "en")
+    assert [b.callback_data for row in selected.inline_keyboard for b in row] == ["a1:42:1"]
+
+async def test_callback_codec_and_legacy_buttons():
+    """Новые и старые callback_data декодируются в одни и те же схемы, пачка id влезает в 64 байта."""
+    from src.utils.callback_codec import (
+        callback_table, pack_ints, unpack_ints, AnswerCallback, HistoryMoreCallback, MatchActionCallback, ReviewDecisionCallback
+    )
+    assert callback_table.decode("a1:12:-1") == AnswerCallback(question_id=12, value=-1)
+    assert callback_table.decode("answer_12_-1") == AnswerCallback(question_id=12, value=-1)
+    assert callback_table.decode("load_answered_questions_more_a123_45") == HistoryMoreCallback(cursor="a123_45")
+    assert callback_table.decode("match_hide_7") == MatchActionCallback(action="h", user_id=7)
+    assert callback_table.decode("got_it_instructions") is None
+    ids = [1000001, 1000005, 1000042, 1000100, 1000777]
+    packed = ReviewDecisionCallback(approve=True, page=3, ids=pack_ints(ids)).pack()
+    assert len(packed.encode()) <= 64
+    assert unpack_ints(callback_table.decode(packed).ids) == ids
+    assert unpack_ints(callback_table.decode("modq_r_0_5.3").ids) == [3, 5]
+
+async def test_pending_requests_pair_similarities():
+    """Похожесть входящих запросов считается пачкой по общим ответам."""
+    from src.services.match_requests import pair_similarities
+    mine = {1: 2, 2: -2, 3: 0, 4: 1}
+    others = {10: {1: 2, 2: -2, 3: 0}, 20: {1: -2, 2: 2, 3: 0, 9: 1}, 30: {}}
+    scores = pair_similarities(mine, others, [10, 20, 30])
+    assert scores[10] == (100, 3)
+    assert scores[20] == (33, 3)
+    assert scores[30] == (0, 0)
+
+async def test_pending_replay_dedup_only_when_queued(async_session):
+    """Ключ дедупликации повтора запросов ставится, только когда есть что отправить."""
+    from unittest.mock import AsyncMock
+    from src.services.match_requests import replay_pending_requests
+    await create_user(async_session, 3019)
+    await async_session.commit()
+    await redis.delete("pending_replay:3019")
+    assert await replay_pending_requests(AsyncMock(), 3019) is False
+    assert not await redis.exists("pending_replay:3019")
+
+async def test_moderation_sweeper_scores_missed_batches(async_session):
+    """Вопросы, чья пачка модерации не запустилась, подбирает периодический обход."""
+    from datetime import UTC, datetime, timedelta
+    from unittest.mock import AsyncMock
+    from src.handlers.moderation import SWEEP_LOCK_KEY, sweep_unscored_questions
+    admin = await create_user(async_session, 3017)
+    group, _ = await create_group(async_session, admin, "Sweep", "Desc")
+    old = Question(group_id=group.id, author_id=admin.id, text="Do you like long walks?", created_at=datetime.now(UTC) - timedelta(hours=1))
+    async_session.add(old)
+    await async_session.commit()
+    await redis.delete(SWEEP_LOCK_KEY)
+    assert group.id in await sweep_unscored_questions(AsyncMock())
+    await async_session.refresh(old)
+    assert old.moderation_flags is not None
+    assert await sweep_unscored_questions(AsyncMock()) == []  # another replica holds this round
+    await redis.delete(SWEEP_LOCK_KEY)
+
+async def test_stale_moderation_buttons_are_ignored(async_session):
+    """Старые кнопки одобрения/отклонения не трогают уже решённый вопрос."""
+    from unittest.mock import AsyncMock
+    from src.handlers.questions import cb_approve_question, cb_reject_question
+    admin = await create_user(async_session, 3021)
+    group, _ = await create_group(async_session, admin, "Stale", "Desc")
+    q = await create_question(async_session, group, admin, "Auto-rejected?")
+    q.status = "rejected"
+    await async_session.commit()
+    for handler, data in ((cb_approve_question, f"approve_question_{q.id}"), (cb_reject_question, f"reject_question_{q.id}")):
+        callback = pytypes.SimpleNamespace(data=data, answer=AsyncMock(), from_user=pytypes.SimpleNamespace(id=3021), bot=AsyncMock(), message=AsyncMock())
+        state = pytypes.SimpleNamespace(get_data=AsyncMock(return_value={"internal_user_id": 3021}), update_data=AsyncMock())
+        await handler(callback, state)
+        assert "already moderated" in callback.answer.call_args.args[0]
+        callback.bot.send_message.assert_not_called()
+    await async_session.refresh(q)
+    assert q.status == "rejected"
+
+async def test_analytics_export_encoding():
+    """Экспорт кодируется пачками: заголовок CSV один раз, NDJSON построчно, gzip на лету."""
+    import gzip
+    import json
+    from datetime import datetime
+    from src.analytics.exports import EXPORTS, encode_export, gzip_chunks
+    spec = EXPORTS["matches"]
+
+    async def batches():
+        yield [(1, 5, 10, 11, "active", datetime(2026, 1, 1))]
+        yield [(2, 5, 10, 12, "closed", None)]
+
+    csv_body = gzip.decompress(b"".join([chunk async for chunk in gzip_chunks(encode_export(spec, "csv", batches()))]))
+    assert csv_body.decode().splitlines() == [
+        "id,group_id,user1_id,user2_id,status,created_at", "1,5,10,11,active,2026-01-01T00:00:00", "2,5,10,12,closed,",
+    ]
+    ndjson_body = b"".join([chunk async for chunk in encode_export(spec, "ndjson", batches())])
+    assert [json.loads(line)["status"] for line in ndjson_body.splitlines()] == ["active", "closed"]
+
+async def test_analytics_export_watermark_lags_recent_rows(async_session):
+    """Водяной знак экспорта ответов не включает свежие события; изменяемые таблицы — только полный снимок."""
+    from datetime import UTC, datetime, timedelta
+    from src.analytics.exports import EXPORTS, export_watermark
+    from src.models import AnswerEvent
+    old = AnswerEvent(question_id=1, user_id=3020, group_id=3020, event_type="answered", new_value=1,
+                      created_at=datetime.now(UTC) - timedelta(hours=1))
+    recent = AnswerEvent(question_id=2, user_id=3020, group_id=3020, event_type="answered", new_value=2)
+    async_session.add_all([old, recent])
+    await async_session.commit()
+    assert await export_watermark(async_session, EXPORTS["answers"], 3020, 0) == old.id
+    assert await export_watermark(async_session, EXPORTS["answers"], 3020, old.id) == old.id
+    assert EXPORTS["answers"].incremental
+    assert not any(EXPORTS[name].incremental for name in ("members", "matches", "match_statuses"))
+
+async def test_analytics_export_requires_token(monkeypatch):
+    """Экспорт сырых строк закрыт токеном; без настроенного токена он выключен."""
+    from fastapi import HTTPException
+    from src.analytics import routers
+    monkeypatch.setattr(routers, "EXPORT_TOKEN", None)
+    with pytest.raises(HTTPException) as denied:
+        await routers.require_export_token("anything")
+    assert denied.value.status_code == 403
+    monkeypatch.setattr(routers, "EXPORT_TOKEN", "s3cret")
+    for token in (None, "wrong"):
+        with pytest.raises(HTTPException) as denied:
+            await routers.require_export_token(token)
+        assert denied.value.status_code == 401
+    await routers.require_export_token("s3cret")
+
+async def test_fsm_snapshot_is_per_update():
+    """Снимок FSM живёт одно обновление: следующее обновление в той же задаче читает Redis заново."""
+    from datetime import datetime
+    from aiogram import Bot, types
+    from aiogram.fsm.context import FSMContext
+    from src.utils.fsm_storage import CompactRedisStorage, SnapshotDispatcher
+    from src.utils.redis_manager import binary_redis
+    storage = CompactRedisStorage(binary_redis, ttl=60)
+    dp = SnapshotDispatcher(storage=storage)
+    bot = Bot("42:SNAPSHOT")
+    seen = []
+
+    @dp.message()
+    async def record(message: types.Message, state: FSMContext):
+        seen.append((await state.get_data()).get("step"))
+
+    def update(update_id):
+        user = types.User(id=3015, is_bot=False, first_name="Snap")
+        message = types.Message(message_id=update_id, date=datetime.now(), chat=types.Chat(id=3015, type="private"), from_user=user, text="hi")
+        return types.Update(update_id=update_id, message=message)
+
+    state = dp.fsm.get_context(bot=bot, chat_id=3015, user_id=3015)
+    await state.set_data({"step": 1})
+    await dp.feed_update(bot, update(1))
+    await storage.redis.hset(storage._key(state.key), "d", b"\x81\xa4step\x02")  # written by another replica
+    await dp.feed_update(bot, update(2))
+    await state.clear()
+    await bot.session.close()
+    assert seen == [1, 2]
+
+async def test_user_lock_timeout_drops_update():
+    """Если Redis-лок пользователя занят дольше ожидания, обновление не выполняется без лока, а отвечает «занято»."""
+    from src.texts.messages import CATALOG, USER_BUSY
+    from src.utils.user_lock import UserLockMiddleware
+    handled, answers = [], []
+
+    async def handler(event, data):
+        handled.append(event)
+
+    async def answer(text):
+        answers.append(text)
+
+    user = pytypes.SimpleNamespace(id=3016)
+    event = pytypes.SimpleNamespace(callback_query=pytypes.SimpleNamespace(answer=answer), message=None)
+    middleware = UserLockMiddleware(redis, backend="redis", wait=0.2)
+    holder = redis.lock("user_lock:3016", timeout=5)
+    assert await holder.acquire()
+    try:
+        assert await middleware(handler, event, {"event_from_user": user}) is None
+    finally:
+        await holder.release()
+    assert not handled and answers == [CATALOG["en"][USER_BUSY]]
+    await middleware(handler, event, {"event_from_user": user})
+    assert handled == [event]
+
+async def test_version_gate_middleware():
+    """Устаревшее состояние сбрасывается без обращения к Redis, актуальное пропускается к хендлеру."""
+    from aiogram.fsm.context import FSMContext
+    from aiogram.fsm.storage.base import StorageKey
+    from aiogram.fsm.storage.memory import MemoryStorage
+    from src.utils import version_gate
+    sent, handled = [], []
+
+    async def handler(event, data):
+        handled.append(event)
+
+    async def send_message(chat_id, text):
+        sent.append((chat_id, text))
+
+    bot = pytypes.SimpleNamespace(send_message=send_message)
+    state = FSMContext(MemoryStorage(), StorageKey(bot_id=1, chat_id=3010, user_id=3010))
+    event = pytypes.SimpleNamespace(callback_query=None)
+    data = {"state": state, "bot": bot, "event_chat": pytypes.SimpleNamespace(id=3010)}
+    middleware = version_gate.VersionGateMiddleware()
+    previous = version_gate._current_version
+    try:
+        version_gate._current_version = "2"
+        await state.update_data(bot_version="2", internal_user_id=3010)
+        await middleware(handler, event, data)
+        assert handled == [event] and not sent
+        await state.update_data(bot_version="1")
+        await middleware(handler, event, data)
+        assert handled == [event] and sent == [(3010, version_gate.NEW_VERSION_NOTICE)]
+        assert await state.get_data() == {"bot_version": "2"}
+    finally:
+        version_gate._current_version = previous
+
+async def test_invite_code_pool_allocation():
+    """Коды выдаются из пула атомарно и без повторов, выданные помечаются до сохранения группы."""
+    from src.utils import invite_code
+    await redis.delete(invite_code.POOL_KEY, invite_code.ISSUED_KEY, invite_code.REFILL_LOCK_KEY)
+    added = await invite_code.refill_invite_code_pool(target=20)
+    assert 0 < added <= 20 and await redis.scard(invite_code.POOL_KEY) == added
+    codes = [await invite_code.generate_unique_invite_code() for _ in range(added + 5)]
+    assert len(set(codes)) == len(codes)
+    assert all(len(code) == invite_code.CODE_LENGTH for code in codes)
+    assert await redis.zscore(invite_code.ISSUED_KEY, codes[0]) is not None
+    await redis.delete(invite_code.POOL_KEY, invite_code.ISSUED_KEY)
+
+async def test_invite_code_refill_skips_issued_and_group_retries(async_session, monkeypatch):
+    """Выданный код не возвращается в пул, а занятый код при создании группы заменяется новым."""
+    from src.utils import invite_code
+    import src.services.groups as groups_service
+    await redis.delete(invite_code.POOL_KEY, invite_code.ISSUED_KEY, invite_code.REFILL_LOCK_KEY)
+    await redis.zadd(invite_code.ISSUED_KEY, {"ZZZZ1": time.time()})
+    monkeypatch.setattr(invite_code, "random_codes", lambda count: {"ZZZZ1", "ZZZZ2"})
+    assert await invite_code.refill_invite_code_pool(target=2) == 1
+    assert await redis.smembers(invite_code.POOL_KEY) == {"ZZZZ2"}
+    await redis.delete(invite_code.POOL_KEY, invite_code.ISSUED_KEY)
+    admin = await create_user(async_session, 3024)
+    _, taken = await create_group(async_session, admin, "Taken", "Desc")
+    await async_session.commit()
+    fresh = random_code()
+    monkeypatch.setattr(groups_service, "generate_unique_invite_code", AsyncMock(side_effect=[taken, fresh]))
+    created = await groups_service.create_group_service(3024, "Retry", "Desc")
+    assert created["invite_code"] == fresh
+
+async def test_join_fast_path_queries(budget_datasets, monkeypatch):
+    """Вступление по коду при тёплом кеше — один SQL-запрос, повторное и забаненное — без записи."""
+    import src.services.groups as groups_service
+    from src.models import BannedUser
+    from src.utils.join_cache import invalidate_banned_users, invalidate_invite_code
+    from src.utils.query_counter import count_queries, install
+    engine, Session, _ = budget_datasets
+    install(engine)
+    monkeypatch.setattr(groups_service, "AsyncSessionLocal", Session)
+    code = random_code()
+    async with Session() as session:
+        for user_id in (3011, 3012, 3013, 3014):
+            await create_user(session, user_id)
+        group = Group(name="Burst", description="Shared link", invite_code=code, creator_user_id=3011)
+        session.add(group)
+        await session.flush()
+        session.add(BannedUser(user_id=3013, group_id=group.id, banned_by=3011))
+        await session.commit()
+    try:
+        joined = await groups_service.join_group_by_code_service(3012, code)
+        assert joined == {"id": group.id, "name": "Burst", "description": "Shared link", "needs_onboarding": True}
+        with count_queries() as counter:
+            joined = await groups_service.join_group_by_code_service(3014, code)
+        assert joined["needs_onboarding"] and counter.total == 1
+        assert not (await groups_service.join_group_by_code_service(3012, code))["needs_onboarding"]
+        assert (await groups_service.join_group_by_code_service(3013, code))["error"] == "banned"
+        async with Session() as session:
+            user = await session.get(User, 3014)
+            assert user.current_group_id == group.id
+        # Cached code of a group deleted meanwhile: no join, the entry is dropped
+        stale = random_code()
+        await redis.set(f"invite:{stale}", '{"id": 2147483000, "name": "Gone", "description": ""}')
+        assert await groups_service.join_group_by_code_service(3012, stale) is None
+        assert not await redis.exists(f"invite:{stale}")
+    finally:
+        await invalidate_invite_code(code)
+        await invalidate_banned_users(group.id)
+
+async def test_banned_cache_fill_does_not_drop_concurrent_ban(async_session):
+    """Новый бан попадает в загруженный кеш, а загрузка, начатая до бана, кеш не восстанавливает."""
+    from src.utils import join_cache
+    admin = await create_user(async_session, 3022)
+    await create_user(async_session, 3023)
+    group, _ = await create_group(async_session, admin, "Ban race", "Desc")
+    await async_session.commit()
+    keys = [f"group_banned:{group.id}", f"group_banned_gen:{group.id}"]
+    try:
+        assert not await join_cache.is_banned(async_session, group.id, 3023)
+        await join_cache.add_banned_user(group.id, 3023)
+        assert await join_cache.is_banned(async_session, group.id, 3023)
+        # A fill that queried banned_users before the ban: stale generation, nothing is written
+        await redis.delete(keys[0])
+        fill = join_cache._get_script(redis, join_cache._FILL_SCRIPT)
+        assert await fill(keys=keys, args=["", 60, join_cache._LOADED_MARKER]) == 0
+        assert not await redis.exists(keys[0])
+    finally:
+        await redis.delete(*keys)
+
+async def test_redis_manager_batch_cache_and_metrics():
+    """Пакет выполняется за один раунд, горячие ключи читаются из локального кеша и сбрасываются при записи."""
+    from src.utils.redis_manager import batch, cached_get, render_metrics
+    keys = ["tg2int:3006", "int2tg:3007", "int2tg:3009", "redis_manager:test:3006"]
+    await set_telegram_mapping(3006, 3007)
+    assert await cached_get("tg2int:3006") == "3007"
+    await redis.set("tg2int:3006", 3008)  # written by another process
+    assert await cached_get("tg2int:3006") == "3007"
+    await set_telegram_mapping(3006, 3009)
+    assert await cached_get("tg2int:3006") == "3009"
+    async with batch() as pipe:
+        pipe.set(keys[3], "x")
+        pipe.get(keys[3])
+    assert pipe.results == [True, "x"]
+    metrics = await render_metrics()
+    assert 'allkinds_redis_command_seconds_count{command="PIPELINE"}' in metrics and "allkinds_redis_up 1" in metrics
+    await redis.delete(*keys)
+
+# Statements per update, the same for both dataset sizes (per-row queries show up as a difference)
+# handler: (make_update, prepare, budget[, run options: admin, fsm_state, fsm_data])
+HANDLER_QUERY_BUDGETS = {
+    "/start": (lambda ctx, attempt: ctx.message("/start"), None, 21),
+    "/mygroups": (lambda ctx, attempt: ctx.message("/mygroups"), None, 7),
+    "/instructions": (lambda ctx, attempt: ctx.message("/instructions"), None, 1),
+    "switch_to_group": (lambda ctx, attempt: ctx.callback(f"switch_to_group_{ctx.group_id}"), None, 13),
+    "answer": (lambda ctx, attempt: ctx.callback(f"a1:{ctx.unanswered[attempt]}:1"), None, 2),
+    "load_answered_questions": (lambda ctx, attempt: ctx.callback("load_answered_questions"), None, 4),
+    "load_answered_questions_more": (
+        lambda ctx, attempt: ctx.button("h1:"), lambda ctx: [ctx.callback("load_answered_questions")], 4),
+    "load_unanswered": (lambda ctx, attempt: ctx.callback("load_unanswered"), None, 4),
+    "find_match": (lambda ctx, attempt: ctx.callback(f"find_match_{ctx.group_id}"), None, 11),
+    "match_nav": (
+        lambda ctx, attempt: ctx.button("mn1:"), lambda ctx: [ctx.callback(f"find_match_{ctx.group_id}")], 3),
+    "connect": (
+        lambda ctx, attempt: ctx.button("ma1:c:"), lambda ctx: [ctx.callback(f"find_match_{ctx.group_id}")], 12),
+    "onboarding_location": (
+        lambda ctx, attempt: ctx.message("Berlin"), None, 10,
+        {"fsm_state": Onboarding.location, "fsm_data": lambda ctx: {"group_id": ctx.group_id}}),
+    "moderation_review_page": (
+        lambda ctx, attempt: ctx.callback(ReviewPageCallback(group_id=ctx.group_id, page=0).pack()), None, 6,
+        {"admin": True}),
+}
+
+@pytest.mark.parametrize("handler", list(HANDLER_QUERY_BUDGETS))
+async def test_handler_query_budget(handler, count_handler_queries):
+    """Число SQL-запросов хендлера ограничено бюджетом и не зависит от размера группы."""
+    make_update, prepare, budget, *options = HANDLER_QUERY_BUDGETS[handler]
+    options = options[0] if options else {}
+    small = await count_handler_queries("small", make_update, prepare, **options)
+    large = await count_handler_queries("large", make_update, prepare, **options)
+    assert small == large, f"{handler}: {small} statements on the small dataset, {large} on the large one"
+    assert large <= budget, f"{handler}: {large} statements, budget {budget}"